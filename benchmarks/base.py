@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from .stats import compare_to_baseline, environment, load_report, write_report
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Base for benchmark commands: subclasses implement add_benchmark_arguments()
+    and run_benchmark(), which returns a JSON-serializable report. The report is
+    printed (and optionally written to --output) and compared with --baseline.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--baseline', help="Compare against a report written by an earlier run.")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed regression against the baseline, as a fraction (default 0.2).")
+        self.add_benchmark_arguments(parser)
+
+    def add_benchmark_arguments(self, parser):
+        pass
+
+    def run_benchmark(self, **options):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        report = self.run_benchmark(**options)
+        report['environment'] = environment()
+
+        regressions = []
+        if options['baseline']:
+            regressions = compare_to_baseline(report, load_report(options['baseline']), options['tolerance'])
+            report['regressions'] = regressions
+
+        write_report(report, options['output'], self.stdout)
+        if regressions:
+            raise CommandError(f"{len(regressions)} metric(s) regressed beyond {options['tolerance']:.0%} of the baseline.")
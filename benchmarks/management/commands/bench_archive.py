@@ -0,0 +1,90 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from benchmarks.base import BenchmarkCommand
+from benchmarks.stats import summarize
+from tickets.archive import archive_sold_tickets
+from tickets.models import ArchivedTicket, Ticket
+from tickets.utils import MAX_TICKETS_PER_AGENT, assign_tickets_to_agent
+
+User = get_user_model()
+
+
+class Command(BenchmarkCommand):
+    help = "Grow sold-ticket history step by step and measure the agent hot paths, with and without archival."
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=20)
+        parser.add_argument('--steps', type=int, default=4)
+        parser.add_argument('--step-size', type=int, default=20000, help="Sold tickets added per step.")
+        parser.add_argument('--samples', type=int, default=200, help="Timed calls per hot path and step.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-archive', action='store_true',
+                            help="Leave history in the hot table, to compare against an archiving run.")
+        parser.add_argument('--prefix', default='archive-bench')
+
+    def run_benchmark(self, **options):
+        prefix = options['prefix']
+        admin, _ = User.objects.get_or_create(username=f'{prefix}-admin', defaults={'role': 'admin'})
+        User.objects.bulk_create(
+            [User(username=f'{prefix}-agent-{i}', role='agent') for i in range(options['agents'])],
+            ignore_conflicts=True,
+        )
+        agents = list(User.objects.filter(username__startswith=f'{prefix}-agent-').order_by('id'))
+
+        # Give every agent a full open batch so fetch-tickets takes its steady-state path.
+        Ticket.objects.bulk_create([
+            Ticket(subject='open', description='open', created_by=admin, assigned_to=agent, assigned_at=timezone.now())
+            for agent in agents
+            for _ in range(MAX_TICKETS_PER_AGENT - Ticket.objects.filter(assigned_to=agent, is_sold=False).count())
+        ], batch_size=options['batch_size'])
+
+        steps = []
+        for step in range(options['steps']):
+            self.add_history(admin, agents, options['step_size'], options['batch_size'])
+            archive = None
+            if not options['no_archive']:
+                archive = archive_sold_tickets(timezone.now(), options['batch_size'])
+            steps.append({
+                'history': (step + 1) * options['step_size'],
+                'hot_rows': Ticket.objects.count(),
+                'archived_rows': ArchivedTicket.objects.count(),
+                'archive': archive,
+                'fetch': self.measure(agents, options['samples'], assign_tickets_to_agent),
+                'agent_list': self.measure(agents, options['samples'], self.agent_list_page),
+            })
+            self.stderr.write(f"step {step + 1}/{options['steps']} done", ending='\r')
+        self.stderr.write('')
+
+        first, last = steps[0], steps[-1]
+        return {
+            'config': {key: options[key] for key in ('agents', 'steps', 'step_size', 'samples', 'no_archive')},
+            'steps': steps,
+            # Last step p50 over first step p50: close to 1.0 means flat as history grows.
+            'growth': {
+                name: round(last[name]['p50_ms'] / first[name]['p50_ms'], 2) if first[name]['p50_ms'] else None
+                for name in ('fetch', 'agent_list')
+            },
+        }
+
+    def add_history(self, admin, agents, count, batch_size):
+        now = timezone.now()
+        for start in range(0, count, batch_size):
+            Ticket.objects.bulk_create([
+                Ticket(subject='sold', description='sold', created_by=admin, assigned_to=agents[i % len(agents)], assigned_at=now, is_sold=True)
+                for i in range(start, min(start + batch_size, count))
+            ])
+
+    def agent_list_page(self, agent):
+        # First page of GET /api/tickets/ for an agent.
+        return list(Ticket.objects.filter(assigned_to=agent).select_related('created_by').order_by('created_at', 'creation_order')[:50])
+
+    def measure(self, agents, samples, func):
+        latencies = []
+        for i in range(samples):
+            started = time.perf_counter()
+            func(agents[i % len(agents)])
+            latencies.append(time.perf_counter() - started)
+        return summarize(latencies)
@@ -0,0 +1,175 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmarks.base import BenchmarkCommand
+from benchmarks.stats import summarize
+from tickets.utils import SOLD, assign_tickets_to_agent, sell_tickets
+
+User = get_user_model()
+
+
+class InProcessClient:
+    def fetch(self, agent):
+        return [ticket.id for ticket in assign_tickets_to_agent(agent)]
+
+    def sell(self, agent, ticket_id):
+        return sell_tickets(agent, [ticket_id])[ticket_id] == SOLD
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.tokens = {}
+
+    def request(self, agent, method, path):
+        if agent.id not in self.tokens:
+            self.tokens[agent.id] = str(AccessToken.for_user(agent))
+        request = urllib.request.Request(
+            f'{self.base_url}{path}',
+            method=method,
+            headers={'Authorization': f'Bearer {self.tokens[agent.id]}', 'Accept': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def fetch(self, agent):
+        status, data = self.request(agent, 'GET', '/api/tickets/fetch-tickets/')
+        if status != 200:
+            raise RuntimeError(f"fetch-tickets returned HTTP {status}")
+        return [ticket['id'] for ticket in data]
+
+    def sell(self, agent, ticket_id):
+        status, _ = self.request(agent, 'POST', f'/api/tickets/{ticket_id}/sell/')
+        return status == 200
+
+
+class Recorder:
+    """Collects latencies and checks that no ticket is ever handed to two agents."""
+
+    def __init__(self, max_tickets):
+        self.max_tickets = max_tickets
+        self.lock = threading.Lock()
+        self.fetch_latencies = []
+        self.sell_latencies = []
+        self.owners = {}
+        self.assigned = 0
+        self.sold = 0
+        self.errors = 0
+        self.overlaps = 0
+        self.oversized_batches = 0
+
+    def record_fetch(self, agent, ticket_ids, elapsed):
+        with self.lock:
+            self.fetch_latencies.append(elapsed)
+            if len(ticket_ids) > self.max_tickets:
+                self.oversized_batches += 1
+            for ticket_id in ticket_ids:
+                owner = self.owners.setdefault(ticket_id, agent.id)
+                if owner != agent.id:
+                    self.overlaps += 1
+            self.assigned = len(self.owners)
+
+    def record_sell(self, ok, elapsed):
+        with self.lock:
+            self.sell_latencies.append(elapsed)
+            self.sold += ok
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+
+class Command(BenchmarkCommand):
+    help = "Drive concurrent simulated agents through fetch/sell cycles and report latency and throughput."
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=100, help="Number of simulated agents (existing agent users).")
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help="Worker threads driving the agents (default: one per agent).")
+        parser.add_argument('--cycles', type=int, default=5, help="fetch/sell cycles per agent.")
+        parser.add_argument('--sell-fraction', type=float, default=1.0,
+                            help="Fraction of each fetched batch the agent sells before fetching again.")
+        parser.add_argument('--max-tickets', type=int, default=15)
+        parser.add_argument('--url', help="Benchmark a running server over HTTP, e.g. http://127.0.0.1:8000. "
+                                          "Raise the user throttle rate on that server first.")
+
+    def run_benchmark(self, **options):
+        agents = list(User.objects.filter(role='agent', is_active=True).order_by('id')[:options['agents']])
+        if len(agents) < options['agents']:
+            raise CommandError(f"Only {len(agents)} active agents exist; run seed_tickets first.")
+
+        recorder = Recorder(options['max_tickets'])
+        concurrency = max(1, min(options['concurrency'] or len(agents), len(agents)))
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            client = self.make_client(options)
+            for agent in agents:
+                self.run_agent(client, agent, options, recorder)
+        else:
+            local = threading.local()
+
+            def run(agent):
+                if not hasattr(local, 'client'):
+                    local.client = self.make_client(options)
+                try:
+                    self.run_agent(local.client, agent, options, recorder)
+                finally:
+                    # Each worker thread has its own connection; don't leave them open.
+                    connection.close()
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(run, agents))
+        elapsed = time.perf_counter() - started
+
+        return {
+            'config': {
+                'mode': 'http' if options['url'] else 'in-process',
+                'agents': len(agents),
+                'concurrency': concurrency,
+                'cycles': options['cycles'],
+                'sell_fraction': options['sell_fraction'],
+                'assignment_engine': getattr(settings, 'TICKET_ASSIGNMENT_ENGINE', 'auto'),
+            },
+            'seconds': round(elapsed, 3),
+            'fetch': summarize(recorder.fetch_latencies),
+            'sell': summarize(recorder.sell_latencies),
+            'tickets_assigned': recorder.assigned,
+            'tickets_sold': recorder.sold,
+            'tickets_assigned_per_second': round(recorder.assigned / elapsed, 1) if elapsed else None,
+            'violations': {
+                'overlapping_assignments': recorder.overlaps,
+                'oversized_batches': recorder.oversized_batches,
+                'errors': recorder.errors,
+            },
+        }
+
+    def make_client(self, options):
+        return HttpClient(options['url']) if options['url'] else InProcessClient()
+
+    def run_agent(self, client, agent, options, recorder):
+        for _ in range(options['cycles']):
+            try:
+                started = time.perf_counter()
+                ticket_ids = client.fetch(agent)
+                recorder.record_fetch(agent, ticket_ids, time.perf_counter() - started)
+
+                for ticket_id in ticket_ids[:int(len(ticket_ids) * options['sell_fraction'])]:
+                    started = time.perf_counter()
+                    ok = client.sell(agent, ticket_id)
+                    recorder.record_sell(ok, time.perf_counter() - started)
+            except Exception:
+                recorder.record_error()
@@ -0,0 +1,90 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from benchmarks.base import BenchmarkCommand
+from benchmarks.stats import summarize
+from tickets.models import Ticket
+from tickets.utils import assign_tickets_to_agent
+from tickets.views import TicketViewSet
+
+User = get_user_model()
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Response bytes and latency of the agent ticket list and fetch-tickets rendered in full, "
+        "with ?fields= and (fetch-tickets) with the compact default, and whether the description column is read."
+    )
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--fields', default='id,subject,lane', help="Field list for the sparse variants.")
+        parser.add_argument('--description-bytes', type=int, default=0,
+                            help="Rewrite the benchmark agent's ticket descriptions to this size first (0 keeps them).")
+
+    def run_benchmark(self, **options):
+        agent = User.objects.filter(role='agent', is_active=True).order_by('id').first()
+        if agent is None:
+            raise CommandError("No active agent exists; run seed_tickets first.")
+        assign_tickets_to_agent(agent)
+        tickets = Ticket.objects.filter(assigned_to=agent)
+        if options['description_bytes'] > 0:
+            tickets.update(description='x' * options['description_bytes'])
+
+        # Throttling is off: it would cap the loop at the per-user rate.
+        views = {
+            'list': TicketViewSet.as_view({'get': 'list'}, throttle_classes=()),
+            'fetch': TicketViewSet.as_view({'get': 'fetch_tickets'}, throttle_classes=()),
+        }
+        paths = {'list': '/api/tickets/', 'fetch': '/api/tickets/fetch-tickets/'}
+        variants = {
+            'list_full': ('list', {}),
+            'list_sparse': ('list', {'fields': options['fields']}),
+            'fetch_full': ('fetch', {'omit': ''}),
+            'fetch_compact': ('fetch', {}),
+            'fetch_sparse': ('fetch', {'fields': options['fields']}),
+        }
+
+        report = {
+            'iterations': options['iterations'],
+            'fields': options['fields'],
+            'tickets': tickets.count(),
+        }
+        # The list builds absolute pagination links, so the request needs a host the site accepts.
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        factory = APIRequestFactory(HTTP_HOST=host)
+        for name, (view, params) in variants.items():
+            def call():
+                request = factory.get(paths[view], params)
+                force_authenticate(request, user=agent)
+                response = views[view](request)
+                response.render()
+                if response.status_code != 200:
+                    raise CommandError(f"{name} returned HTTP {response.status_code}")
+                return response
+
+            with CaptureQueriesContext(connection) as queries:
+                response = call()
+            latencies = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - started)
+            report[name] = {
+                'bytes': len(response.content),
+                'queries': len(queries),
+                'reads_description': any('"description"' in query['sql'] for query in queries),
+                'latency': summarize(latencies),
+            }
+
+        for view, baseline in (('list', 'list_full'), ('fetch', 'fetch_full')):
+            for name in variants:
+                if name.startswith(view) and name != baseline and report[name]['bytes']:
+                    report[f'{name}_bytes_ratio'] = round(report[baseline]['bytes'] / report[name]['bytes'], 2)
+        return report
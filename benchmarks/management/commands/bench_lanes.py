@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+
+from benchmarks.base import BenchmarkCommand
+from benchmarks.stats import summarize
+from tickets.batch_cache import evict_batch_versions
+from tickets.events import change_type, record_events
+from tickets.lanes import DEFAULT_LANE, LANES
+from tickets.models import Ticket
+from tickets.stats import record_ticket_changes
+from tickets.utils import assign_tickets_to_agent
+from users.authentication import full_user_cache
+
+User = get_user_model()
+
+
+def set_queue_state(tickets, states):
+    """
+    Move open tickets to {ticket_id: (lane, assigned_to_id, assigned_at)}. The
+    counters, the event outbox and the batch versions of every agent involved are
+    updated as for any other change, so feed consumers and cached fetches see it.
+    """
+    with transaction.atomic():
+        current = {
+            ticket_id: (lane, agent_id, assigned_at)
+            for ticket_id, lane, agent_id, assigned_at in tickets.filter(is_sold=False).select_for_update()
+            .values_list('id', 'lane', 'assigned_to_id', 'assigned_at').iterator(chunk_size=5000)
+        }
+        changed = {ticket_id: state for ticket_id, state in states.items() if current.get(ticket_id, state) != state}
+        Ticket.objects.bulk_update(
+            [Ticket(id=ticket_id, lane=lane, assigned_to_id=agent_id, assigned_at=assigned_at)
+             for ticket_id, (lane, agent_id, assigned_at) in changed.items()],
+            ['lane', 'assigned_to', 'assigned_at'],
+            batch_size=1000,
+        )
+        moves = [((current[ticket_id][1], False), (state[1], False)) for ticket_id, state in changed.items()]
+        record_ticket_changes(moves)
+        record_events(
+            (change_type(before, after), ticket_id, after[0] or before[0])
+            for ticket_id, (before, after) in zip(changed, moves)
+        )
+        evict_batch_versions(*{agent_id for move in moves for agent_id, _ in move})
+
+
+def set_agent_lanes(lanes_by_agent):
+    """Set {agent_id: queue_lanes}, dropping their cached rows and batch versions."""
+    for agent_id, lanes in lanes_by_agent.items():
+        User.objects.filter(id=agent_id).update(queue_lanes=lanes)
+    full_user_cache.evict(*lanes_by_agent)
+    evict_batch_versions(*lanes_by_agent)
+
+
+def lane_layout(ticket_ids, agents, lanes):
+    """
+    Tickets (in queue order) spread round-robin over `lanes` and unassigned, and agent
+    i given the single lane lanes[i % len(lanes)] (no lanes when there is only one).
+    """
+    tickets = {ticket_id: (lanes[index % len(lanes)], None, None) for index, ticket_id in enumerate(ticket_ids)}
+    agent_lanes = {agent.id: [lanes[index % len(lanes)]] if len(lanes) > 1 else [] for index, agent in enumerate(agents)}
+    return tickets, agent_lanes
+
+
+def queue_ranks():
+    """
+    {ticket_id: (lane, position in that lane's FIFO)} for the unassigned queue, and
+    the reverse {(lane, position): ticket_id}.
+    """
+    ranks, at, positions = {}, {}, defaultdict(int)
+    rows = Ticket.objects.filter(assigned_to__isnull=True, is_sold=False).order_by('created_at', 'creation_order').values_list('id', 'lane')
+    for ticket_id, lane in rows.iterator(chunk_size=5000):
+        ranks[ticket_id] = (lane, positions[lane])
+        at[lane, positions[lane]] = ticket_id
+        positions[lane] += 1
+    return ranks, at
+
+
+def skipped_rows(claims, ranks, at):
+    """
+    Rows each claim passed over because another transaction held them. A claim
+    takes the first free rows of its lanes, so a row inside the span of positions
+    it took but not claimed by it was skipped, unless another claim that had
+    already committed before this one started took it (that row was gone, not
+    locked). Claims are (started, finished, ticket_ids).
+    """
+    owner = {ticket_id: index for index, (_, _, ticket_ids) in enumerate(claims) for ticket_id in ticket_ids}
+    skipped = 0
+    for started, _, ticket_ids in claims:
+        positions = defaultdict(set)
+        for ticket_id in ticket_ids:
+            if ticket_id in ranks:
+                lane, position = ranks[ticket_id]
+                positions[lane].add(position)
+        for lane, taken in positions.items():
+            for position in range(min(taken), max(taken)):
+                if position in taken:
+                    continue
+                other = owner.get(at[lane, position])
+                if other is None or claims[other][1] > started:
+                    skipped += 1
+    return skipped
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Compare one queue lane with several under many concurrent agents claiming at once. "
+        "Uses the agents and tickets made by seed_tickets (same --prefix) and puts their lanes, "
+        "assignments and agent lanes back afterwards."
+    )
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=2000, help="Agents that each claim one batch.")
+        parser.add_argument('--lanes', type=int, default=len(LANES), help=f"Lanes in the multi-lane run (at most {len(LANES)}).")
+        parser.add_argument('--concurrency', type=int, default=64, help="Worker threads claiming at the same time.")
+        parser.add_argument('--max-tickets', type=int, default=15)
+        parser.add_argument('--prefix', default='bench', help="The seed_tickets --prefix of the agents and tickets to use.")
+        parser.add_argument('--i-understand-this-resets-the-queue', action='store_true', dest='reset_queue',
+                            help="Run even though open tickets not made by seed_tickets are waiting; they are "
+                                 "re-laned and claimed too, then put back.")
+
+    def run_benchmark(self, **options):
+        prefix = options['prefix']
+        agents = list(
+            User.objects.filter(username__startswith=f'{prefix}-agent-', role='agent', is_active=True).order_by('id')[:options['agents']]
+        )
+        if len(agents) < options['agents']:
+            raise CommandError(f"Only {len(agents)} active {prefix}-agent-* users exist; run seed_tickets first.")
+        if not 1 <= options['lanes'] <= len(LANES):
+            raise CommandError(f"--lanes must be between 1 and {len(LANES)}.")
+
+        tickets = Ticket.objects.filter(is_sold=False)
+        foreign = tickets.filter(assigned_to__isnull=True).exclude(created_by__username=f'{prefix}-admin').count()
+        if foreign and not options['reset_queue']:
+            raise CommandError(
+                f"{foreign} open tickets not made by seed_tickets are in the queue and the benchmark agents would claim them. "
+                "Run it against a benchmark database, or pass --i-understand-this-resets-the-queue."
+            )
+        if not foreign:
+            tickets = tickets.filter(created_by__username=f'{prefix}-admin')
+
+        original = {
+            ticket_id: (lane, agent_id, assigned_at)
+            for ticket_id, lane, agent_id, assigned_at in tickets.order_by('created_at', 'creation_order')
+            .values_list('id', 'lane', 'assigned_to_id', 'assigned_at').iterator(chunk_size=5000)
+        }
+        original_lanes = {agent.id: agent.queue_lanes for agent in agents}
+
+        report = {'config': {
+            'agents': len(agents),
+            'lanes': options['lanes'],
+            'concurrency': options['concurrency'],
+            'max_tickets': options['max_tickets'],
+            'open_tickets': len(original),
+        }}
+        try:
+            for name, lanes in (('single_lane', [DEFAULT_LANE]), ('multi_lane', list(LANES[:options['lanes']]))):
+                ticket_states, agent_lanes = lane_layout(list(original), agents, lanes)
+                set_queue_state(tickets, ticket_states)
+                set_agent_lanes(agent_lanes)
+                agents = list(User.objects.filter(id__in=[agent.id for agent in agents]).order_by('id'))
+                report[name] = self.run_claims(agents, options)
+        finally:
+            set_queue_state(tickets, original)
+            set_agent_lanes(original_lanes)
+
+        if report['multi_lane']['fetch'].get('p95_ms'):
+            report['speedup_p95'] = round(report['single_lane']['fetch']['p95_ms'] / report['multi_lane']['fetch']['p95_ms'], 2)
+        return report
+
+    def run_claims(self, agents, options):
+        ranks, at = queue_ranks()
+        lock = threading.Lock()
+        latencies, claims, errors = [], [], [0]
+
+        def claim(agent):
+            try:
+                started = time.perf_counter()
+                tickets = assign_tickets_to_agent(agent, options['max_tickets'])
+                finished = time.perf_counter()
+                with lock:
+                    latencies.append(finished - started)
+                    claims.append((started, finished, [ticket.id for ticket in tickets]))
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            finally:
+                if threading.current_thread() is not threading.main_thread():
+                    connection.close()
+
+        started = time.perf_counter()
+        concurrency = max(1, min(options['concurrency'], len(agents)))
+        if concurrency == 1:
+            for agent in agents:
+                claim(agent)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                list(executor.map(claim, agents))
+        elapsed = time.perf_counter() - started
+
+        claimed = sum(1 for _, _, ticket_ids in claims for ticket_id in ticket_ids if ticket_id in ranks)
+        skipped = skipped_rows(claims, ranks, at)
+        return {
+            'seconds': round(elapsed, 3),
+            'fetch': summarize(latencies),
+            'tickets_claimed': claimed,
+            'skipped_rows': skipped,
+            'skip_rate': round(skipped / (skipped + claimed), 4) if claimed else 0.0,
+            'tickets_claimed_per_second': round(claimed / elapsed, 1) if elapsed else None,
+            'errors': errors[0],
+        }
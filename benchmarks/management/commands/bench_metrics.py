@@ -0,0 +1,58 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.base import BenchmarkCommand
+from benchmarks.stats import summarize
+from support_system.metrics import MetricsMiddleware
+from tickets.serializers import TicketSerializer
+from tickets.utils import assign_tickets_to_agent
+from tickets.views import TicketViewSet
+
+User = get_user_model()
+
+
+class Command(BenchmarkCommand):
+    help = "Measure MetricsMiddleware overhead on the fetch-tickets path."
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def run_benchmark(self, **options):
+        agent = User.objects.filter(role='agent', is_active=True).order_by('id').first()
+        if agent is None:
+            raise CommandError("No active agent exists; run seed_tickets first.")
+
+        def fetch(request):
+            tickets = assign_tickets_to_agent(agent)
+            return HttpResponse(JSONRenderer().render(TicketSerializer(tickets, many=True).data), content_type='application/json')
+
+        # Label the stand-in view like the real fetch-tickets action.
+        view_func = TicketViewSet.as_view({'get': 'fetch_tickets'})
+        request = RequestFactory().get('/api/tickets/fetch-tickets/')
+        middleware = MetricsMiddleware(fetch)
+
+        fetch(request)
+        bare, instrumented = [], []
+        for _ in range(options['iterations']):
+            started = time.perf_counter()
+            fetch(request)
+            bare.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            middleware.process_view(request, view_func, (), {})
+            middleware(request)
+            instrumented.append(time.perf_counter() - started)
+
+        bare_summary, instrumented_summary = summarize(bare), summarize(instrumented)
+        return {
+            'iterations': options['iterations'],
+            'bare': bare_summary,
+            'instrumented': instrumented_summary,
+            'overhead_p50_ms': round(instrumented_summary['p50_ms'] - bare_summary['p50_ms'], 4),
+            'overhead_mean_ms': round(instrumented_summary['mean_ms'] - bare_summary['mean_ms'], 4),
+        }
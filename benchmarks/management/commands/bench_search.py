@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import CommandError
+from django.db.models import Q
+
+from benchmarks.base import BenchmarkCommand
+from benchmarks.stats import summarize
+from tickets.models import Ticket
+from tickets.search import search_tickets
+
+
+def ilike_page(q, page_size):
+    # The previous admin search: ILIKE '%q%' on subject and description.
+    queryset = Ticket.objects.filter(Q(subject__icontains=q) | Q(description__icontains=q))
+    return list(queryset.order_by('created_at', 'creation_order')[:page_size])
+
+
+def search_page(q, page_size):
+    # First page of GET /api/tickets/?q=..., best match first.
+    return list(search_tickets(Ticket.objects.all(), q).order_by('-rank', 'created_at', 'creation_order')[:page_size])
+
+
+class Command(BenchmarkCommand):
+    help = "Compare first-page latency of the ILIKE search with the indexed full-text search. Seed with seed_tickets first."
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries',
+                            help="Search term; repeat for several (default: a few common and rare words).")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query and path.")
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def run_benchmark(self, **options):
+        rows = Ticket.objects.count()
+        if not rows:
+            raise CommandError("No tickets; run seed_tickets first.")
+        queries = options['queries'] or ['system', 'customer account', 'quickly', 'xylophone']
+
+        report = {'config': {'rows': rows, 'queries': queries, 'repeat': options['repeat'], 'page_size': options['page_size']}}
+        for name, page in (('ilike', ilike_page), ('full_text', search_page)):
+            samples, hits = [], {}
+            for q in queries:
+                hits[q] = len(page(q, options['page_size']))  # warm-up
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    page(q, options['page_size'])
+                    samples.append(time.perf_counter() - started)
+            report[name] = summarize(samples)
+            report[name]['first_page_hits'] = hits
+
+        if report['full_text']['p50_ms']:
+            report['speedup_p50'] = round(report['ilike']['p50_ms'] / report['full_text']['p50_ms'], 1)
+        return report
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import CommandError
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.base import BenchmarkCommand
+from support_system.renderers import FastJSONRenderer
+from tickets.models import Ticket
+from tickets.serializers import TicketReadSerializer, TicketSerializer
+
+
+class Command(BenchmarkCommand):
+    help = "Compare rows/sec of the generic and lean ticket read paths (query + serialize + render)."
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help="Tickets per response.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def run_benchmark(self, **options):
+        rows = options['rows']
+        if Ticket.objects.count() < rows:
+            raise CommandError(f"Fewer than {rows} tickets exist; run seed_tickets first.")
+
+        variants = {
+            'generic': (lambda: Ticket.objects.all(), TicketSerializer, JSONRenderer),
+            'lean': (lambda: Ticket.objects.select_related('created_by'), TicketReadSerializer, FastJSONRenderer),
+        }
+        report = {'rows': rows, 'repeat': options['repeat']}
+        outputs = {}
+        for name, (queryset, serializer_class, renderer_class) in variants.items():
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                tickets = list(queryset().order_by('created_at', 'creation_order')[:rows])
+                outputs[name] = renderer_class().render(serializer_class(tickets, many=True).data)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            report[name] = {'best_ms': round(best * 1000, 3), 'rows_per_second': round(rows / best, 1)}
+
+        report['speedup'] = round(report['lean']['rows_per_second'] / report['generic']['rows_per_second'], 2)
+        report['identical_output'] = outputs['generic'] == outputs['lean']
+        return report
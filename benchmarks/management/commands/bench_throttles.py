@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from rest_framework import throttling
+
+from benchmarks.base import BenchmarkCommand
+from benchmarks.stats import summarize
+from support_system.throttling import MemoryThrottleStore, RedisThrottleStore, SQLiteThrottleStore, UserRateThrottle
+
+
+def gcra_throttle(store, rate):
+    return type('BenchUserRateThrottle', (UserRateThrottle,), {'rate': rate, 'get_store': lambda self: store})
+
+
+class Command(BenchmarkCommand):
+    help = "Measure per-request throttle overhead of the stock DRF throttle against the GCRA stores."
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=50, help="Distinct throttle keys the requests cycle through.")
+        parser.add_argument('--rate', default='100/min',
+                            help="Throttle rate. The stock throttle keeps up to that many timestamps per key.")
+        parser.add_argument('--redis-url', help="Also measure the Redis store against this server.")
+
+    def run_benchmark(self, **options):
+        rate = options['rate']
+        requests = [SimpleNamespace(user=SimpleNamespace(is_authenticated=True, pk=i), META={}) for i in range(options['users'])]
+
+        with tempfile.TemporaryDirectory() as directory:
+            candidates = {
+                'drf_cache': type('StockUserRateThrottle', (throttling.UserRateThrottle,), {'rate': rate}),
+                'gcra_memory': gcra_throttle(MemoryThrottleStore(), rate),
+                'gcra_sqlite': gcra_throttle(SQLiteThrottleStore(os.path.join(directory, 'throttle.sqlite3')), rate),
+            }
+            if options['redis_url']:
+                candidates['gcra_redis'] = gcra_throttle(RedisThrottleStore(options['redis_url'], prefix='bench-throttle:'), rate)
+
+            report = {'config': {'iterations': options['iterations'], 'users': options['users'], 'rate': rate}}
+            for name, throttle_class in candidates.items():
+                cache.clear()
+                report[name] = self.measure(throttle_class, requests, options['iterations'])
+
+        baseline = report['drf_cache']['p50_ms']
+        # Deltas, not latencies: kept out of the *_ms baseline comparison.
+        report['p50_delta_vs_drf'] = {
+            name: round(report[name]['p50_ms'] - baseline, 4) for name in candidates if name != 'drf_cache'
+        }
+        return report
+
+    def measure(self, throttle_class, requests, iterations):
+        samples = []
+        allowed = 0
+        for i in range(iterations):
+            request = requests[i % len(requests)]
+            started = time.perf_counter()
+            throttle = throttle_class()
+            allowed += throttle.allow_request(request, None)
+            samples.append(time.perf_counter() - started)
+        summary = summarize(samples)
+        summary['allowed'] = allowed
+        summary['requests_per_second'] = round(iterations / sum(samples), 1) if samples else None
+        return summary
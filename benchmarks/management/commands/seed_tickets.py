@@ -0,0 +1,73 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from faker import Faker
+
+from benchmarks.base import BenchmarkCommand
+from tickets.models import Ticket
+
+User = get_user_model()
+
+
+class Command(BenchmarkCommand):
+    help = "Seed agents and tickets in bulk for benchmarks."
+
+    def add_benchmark_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=100000)
+        parser.add_argument('--agents', type=int, default=1000)
+        parser.add_argument('--sold-fraction', type=float, default=0.0,
+                            help="Fraction of the tickets created as sold history, assigned to random agents.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--password', default='Bench#Pass1')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def run_benchmark(self, **options):
+        Faker.seed(options['seed'])
+        fake = Faker()
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+
+        started = time.perf_counter()
+        admin, _ = User.objects.get_or_create(username=f'{prefix}-admin', defaults={'role': 'admin'})
+        # Hash once: every seeded agent shares the password, so PBKDF2 runs one time, not per user.
+        password = make_password(options['password'])
+        User.objects.bulk_create(
+            [User(username=f'{prefix}-agent-{i}', role='agent', password=password) for i in range(options['agents'])],
+            batch_size=options['batch_size'],
+            ignore_conflicts=True,
+        )
+        agent_ids = list(User.objects.filter(username__startswith=f'{prefix}-agent-').values_list('id', flat=True))
+        agents_seconds = time.perf_counter() - started
+
+        # Faker is slow per call; draw from a fixed pool of generated texts instead.
+        subjects = [fake.sentence(nb_words=6)[:255] for _ in range(500)]
+        descriptions = [fake.paragraph(nb_sentences=5) for _ in range(500)]
+
+        started = time.perf_counter()
+        created, now = 0, timezone.now()
+        while created < options['tickets']:
+            batch = []
+            for _ in range(min(options['batch_size'], options['tickets'] - created)):
+                ticket = Ticket(subject=rng.choice(subjects), description=rng.choice(descriptions), created_by=admin)
+                if agent_ids and rng.random() < options['sold_fraction']:
+                    ticket.assigned_to_id = rng.choice(agent_ids)
+                    ticket.assigned_at = now
+                    ticket.is_sold = True
+                batch.append(ticket)
+            Ticket.objects.bulk_create(batch)
+            created += len(batch)
+            self.stderr.write(f"seeded {created}/{options['tickets']} tickets", ending='\r')
+        self.stderr.write('')
+        tickets_seconds = time.perf_counter() - started
+
+        return {
+            'agents': len(agent_ids),
+            'agents_seconds': round(agents_seconds, 3),
+            'tickets': created,
+            'tickets_seconds': round(tickets_seconds, 3),
+            'tickets_per_second': round(created / tickets_seconds, 1) if tickets_seconds else None,
+        }
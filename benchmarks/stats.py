@@ -0,0 +1,79 @@
+import json
+import math
+import platform
+import time
+
+from django.db import connection
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    values = sorted(sample * 1000 for sample in samples)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3),
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3),
+    }
+
+
+def environment():
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Compare every *_ms metric (lower is better) and *_per_second metric (higher is
+    better) present in both reports. Returns a list of regressions beyond `tolerance`
+    (a fraction, e.g. 0.2 for 20%).
+    """
+    regressions = []
+    for path, current, previous in _shared_metrics(report, baseline):
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        if path.endswith('_ms') and change > tolerance:
+            regressions.append({'metric': path, 'baseline': previous, 'current': current, 'change': round(change, 3)})
+        elif path.endswith('_per_second') and -change > tolerance:
+            regressions.append({'metric': path, 'baseline': previous, 'current': current, 'change': round(change, 3)})
+    return regressions
+
+
+def _shared_metrics(report, baseline, prefix=''):
+    for key, value in report.items():
+        if key not in baseline:
+            continue
+        path = f'{prefix}{key}'
+        if isinstance(value, dict) and isinstance(baseline[key], dict):
+            yield from _shared_metrics(value, baseline[key], f'{path}.')
+        elif isinstance(value, (int, float)) and isinstance(baseline[key], (int, float)):
+            yield path, value, baseline[key]
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_report(report, path=None, stream=None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+    if stream is not None:
+        stream.write(text)
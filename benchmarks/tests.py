@@ -0,0 +1,138 @@
+import io
+import json
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from tickets.models import Ticket, TicketEvent
+from tickets.stats import queue_depth
+
+from .management.commands.bench_lanes import skipped_rows
+from .stats import compare_to_baseline, summarize
+
+User = get_user_model()
+
+
+class BenchmarkCommandTests(TestCase):
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command(*args, stdout=out, stderr=io.StringIO())
+        return json.loads(out.getvalue())
+
+    def test_seed_and_bench_assignment(self):
+        seeded = self.run_command('seed_tickets', '--tickets', '200', '--agents', '5', '--sold-fraction', '0.5', '--batch-size', '50')
+        self.assertEqual(seeded['agents'], 5)
+        self.assertEqual(Ticket.objects.count(), 200)
+        self.assertTrue(Ticket.objects.filter(is_sold=True).exists())
+
+        report = self.run_command('bench_assignment', '--agents', '5', '--concurrency', '1', '--cycles', '2')
+        self.assertEqual(report['fetch']['count'], 10)
+        self.assertEqual(report['violations'], {'overlapping_assignments': 0, 'oversized_batches': 0, 'errors': 0})
+        self.assertEqual(report['tickets_sold'], report['sell']['count'])
+        self.assertIn('p99_ms', report['fetch'])
+
+    def test_baseline_regression_fails_the_run(self):
+        self.run_command('seed_tickets', '--tickets', '50', '--agents', '2')
+        baseline = {'fetch': {'p95_ms': 0.0001}, 'tickets_assigned_per_second': 10 ** 9}
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump(baseline, f)
+            f.flush()
+            with self.assertRaises(CommandError):
+                self.run_command('bench_assignment', '--agents', '2', '--concurrency', '1', '--cycles', '1', '--baseline', f.name)
+
+    def test_bench_metrics_reports_overhead(self):
+        self.run_command('seed_tickets', '--tickets', '20', '--agents', '1')
+        report = self.run_command('bench_metrics', '--iterations', '20')
+        self.assertEqual(report['instrumented']['count'], 20)
+        self.assertIn('overhead_p50_ms', report)
+
+    def test_bench_serializers_output_matches(self):
+        self.run_command('seed_tickets', '--tickets', '30', '--agents', '1')
+        report = self.run_command('bench_serializers', '--rows', '30', '--repeat', '1')
+        self.assertTrue(report['identical_output'])
+
+    def test_bench_throttles_compares_stores(self):
+        report = self.run_command('bench_throttles', '--iterations', '50', '--users', '5', '--rate', '5/min')
+        for name in ('drf_cache', 'gcra_memory', 'gcra_sqlite'):
+            # 5 keys x 5 requests allowed per minute by every implementation.
+            self.assertEqual(report[name]['allowed'], 25)
+        self.assertIn('gcra_sqlite', report['p50_delta_vs_drf'])
+
+    def test_bench_archive_keeps_hot_table_small(self):
+        report = self.run_command('bench_archive', '--agents', '2', '--steps', '2', '--step-size', '20', '--samples', '2')
+        self.assertEqual([step['archived_rows'] for step in report['steps']], [20, 40])
+        self.assertEqual(report['steps'][-1]['hot_rows'], 30)
+        self.assertIn('agent_list', report['growth'])
+
+    def test_bench_search_compares_paths(self):
+        self.run_command('seed_tickets', '--tickets', '50', '--agents', '1')
+        report = self.run_command('bench_search', '--query', 'the', '--repeat', '1')
+        self.assertEqual(report['config']['rows'], 50)
+        self.assertIn('p50_ms', report['ilike'])
+        self.assertIn('the', report['full_text']['first_page_hits'])
+
+    def test_summary_and_comparison(self):
+        summary = summarize([0.001 * i for i in range(1, 101)])
+        self.assertEqual(summary['p50_ms'], 50.0)
+        self.assertEqual(summary['p99_ms'], 99.0)
+
+        regressions = compare_to_baseline({'fetch': {'p95_ms': 13.0}}, {'fetch': {'p95_ms': 10.0}}, 0.2)
+        self.assertEqual([r['metric'] for r in regressions], ['fetch.p95_ms'])
+
+    def test_bench_lanes_reports_skip_rates_and_restores_the_queue(self):
+        self.run_command('seed_tickets', '--tickets', '80', '--agents', '4')
+        agent = User.objects.get(username='bench-agent-0')
+        User.objects.filter(pk=agent.pk).update(queue_lanes=['billing'])
+        urgent = Ticket.objects.order_by('id')[0]
+        Ticket.objects.filter(pk=urgent.pk).update(lane='urgent')
+        assigned = Ticket.objects.order_by('id')[1]
+        assigned.assign_to_agent(agent)
+        before = list(Ticket.objects.order_by('id').values_list('id', 'lane', 'assigned_to_id', 'assigned_at'))
+        events = TicketEvent.objects.count()
+
+        report = self.run_command('bench_lanes', '--agents', '4', '--lanes', '4', '--concurrency', '1', '--max-tickets', '5')
+        for name in ('single_lane', 'multi_lane'):
+            self.assertEqual(report[name]['tickets_claimed'], 20)
+            # One claim at a time never skips a locked row.
+            self.assertEqual(report[name]['skipped_rows'], 0)
+            self.assertEqual(report[name]['errors'], 0)
+        self.assertEqual(list(Ticket.objects.order_by('id').values_list('id', 'lane', 'assigned_to_id', 'assigned_at')), before)
+        self.assertEqual(User.objects.get(pk=agent.pk).queue_lanes, ['billing'])
+        self.assertFalse(User.objects.exclude(pk=agent.pk).exclude(queue_lanes=[]).exists())
+        # Every reset went through the outbox and the counters.
+        self.assertGreater(TicketEvent.objects.count(), events)
+        self.assertEqual(queue_depth(), Ticket.objects.filter(assigned_to__isnull=True, is_sold=False).count())
+
+    def test_bench_lanes_leaves_foreign_tickets_alone(self):
+        self.run_command('seed_tickets', '--tickets', '10', '--agents', '2')
+        admin = User.objects.create_user(username='real-admin', password='adminpass', role='admin')
+        Ticket.objects.create(subject="Real", description="desc", created_by=admin)
+        with self.assertRaisesMessage(CommandError, '--i-understand-this-resets-the-queue'):
+            self.run_command('bench_lanes', '--agents', '2', '--concurrency', '1')
+        report = self.run_command('bench_lanes', '--agents', '2', '--concurrency', '1', '--i-understand-this-resets-the-queue')
+        self.assertEqual(report['config']['open_tickets'], 11)
+        self.assertFalse(Ticket.objects.filter(assigned_to__isnull=False).exists())
+
+    def test_skip_rate_ignores_rows_taken_by_earlier_claims(self):
+        ranks = {ticket_id: ('general', ticket_id) for ticket_id in range(6)}
+        at = {('general', ticket_id): ticket_id for ticket_id in range(6)}
+        claims = [
+            (0.0, 1.0, [1]),       # committed before the next claim started
+            (2.0, 3.0, [0, 2]),    # row 1 was gone, not locked
+            (2.5, 4.0, [4]),
+            (2.6, 3.5, [3, 5]),    # row 4 was held by an overlapping claim
+        ]
+        self.assertEqual(skipped_rows(claims, ranks, at), 1)
+
+    def test_bench_fields_reports_bytes_and_columns(self):
+        self.run_command('seed_tickets', '--tickets', '30', '--agents', '1')
+        report = self.run_command('bench_fields', '--iterations', '3', '--description-bytes', '5000')
+        self.assertTrue(report['fetch_full']['reads_description'])
+        for name in ('list_sparse', 'fetch_compact', 'fetch_sparse'):
+            self.assertFalse(report[name]['reads_description'], name)
+        self.assertGreater(report['fetch_compact_bytes_ratio'], 10)
+        self.assertGreater(report['list_sparse_bytes_ratio'], 10)
+        self.assertEqual(report['list_full']['latency']['count'], 3)
@@ -14,3 +14,16 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'support_system.settings')
 
 application = get_asgi_application()
+
+# Long-polling fetch-tickets requests (/api/tickets/fetch-tickets/long-poll/?wait=<seconds>)
+# and event feed requests (/api/events/?wait=<seconds>) share one LISTEN connection
+# per notifier per process; start them before the first request arrives.
+from tickets.notify import event_notifier, ticket_notifier  # noqa: E402
+
+ticket_notifier.start_listener()
+event_notifier.start_listener()
+
+# Periodic stale-assignment reaper, enabled by TICKET_REAPER_INTERVAL.
+from tickets.reaper import stale_assignment_reaper  # noqa: E402
+
+stale_assignment_reaper.start()
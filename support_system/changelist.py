@@ -0,0 +1,178 @@
+"""
+Admin changelists that load in bounded time on tables with millions of rows:
+estimated counts, keyset page navigation and filters that don't enumerate
+related rows. The templates live in tickets/templates/admin/.
+"""
+import json
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .pagination import decode_position, encode_position, flip, seek_filter
+
+CURSOR_VAR = 'cursor'
+
+
+def planner_estimate(queryset):
+    """The planner's row estimate for `queryset` on PostgreSQL (from table statistics), else None."""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts exactly up to ADMIN_EXACT_COUNT_LIMIT rows (a COUNT over a LIMITed
+    subquery, so it stops early) and uses the planner's estimate above that.
+    `estimated` tells whether `count` is approximate.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+        counted = self.object_list.order_by()[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        estimate = planner_estimate(self.object_list)
+        if estimate is None:
+            return self.object_list.count()
+        self.estimated = True
+        return max(estimate, counted)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages with an opaque ?cursor= holding the last row's ordering values instead
+    of ?p=<page>, so every page is an index range scan and deep pages cost the
+    same as the first. The ordering must end in a unique field (Django adds the
+    pk otherwise); orderings through relations fall back to numbered pages.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, search and sort links start again from the first page.
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or ()), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def get_ordering_field(self, field_name):
+        # The admin only hides the sort links of columns outside sortable_by; ignore ?o= for them too.
+        if self.sortable_by is not None and field_name not in self.sortable_by:
+            return None
+        return super().get_ordering_field(field_name)
+
+    def keyset_ordering(self):
+        """The ordering as plain field names, or None when it can't be seeked (expressions, relations, nullable columns)."""
+        keys = []
+        for key in self.queryset.query.order_by:
+            if not isinstance(key, str):
+                return None
+            name = key.lstrip('-')
+            if name == 'pk':
+                name = self.opts.pk.name
+            try:
+                field = self.opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            # NULLs never compare greater or less than the cursor, so they would drop out of every page.
+            if field.is_relation or field.null:
+                return None
+            keys.append(f'-{name}' if key.startswith('-') else name)
+        return keys or None
+
+    def get_results(self, request):
+        keys = self.keyset_ordering()
+        if keys is None or self.show_all:
+            super().get_results(request)
+            self.keyset = False
+            return
+        self.keyset = True
+
+        position, reverse = None, False
+        if request.GET.get(CURSOR_VAR):
+            try:
+                position, reverse = decode_position(request.GET[CURSOR_VAR], keys, self.model)
+            except ValueError:
+                position = None
+        queryset = self.queryset.order_by(*[flip(key) if reverse else key for key in keys])
+        if position is not None:
+            queryset = queryset.filter(seek_filter(keys, position, reverse))
+        rows = list(queryset[:self.list_per_page + 1])
+        has_more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if reverse:
+            rows.reverse()
+        has_next, has_previous = (position is not None, has_more) if reverse else (has_more, position is not None)
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.result_count_estimated = getattr(self.paginator, 'estimated', False)
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_next or has_previous
+        self.first_url = self.get_query_string() if position is not None else None
+        self.next_url = self.get_query_string({CURSOR_VAR: encode_position(rows[-1], keys)}) if has_next and rows else None
+        self.previous_url = self.get_query_string({CURSOR_VAR: encode_position(rows[0], keys, reverse=True)}) if has_previous and rows else None
+
+
+class ScalableAdminMixin:
+    """
+    ModelAdmin settings for very large tables: keyset navigation, estimated
+    counts and no unfiltered total. Combine with list_select_related for
+    foreign keys in list_display and raw_id_fields (or UserInputFilter) instead
+    of widgets and filters that list every related row.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+class InputFilter(admin.SimpleListFilter):
+    """A free-text list filter: a small form instead of one link per possible value."""
+    template = 'admin/input_filter.html'
+    placeholder = ''
+
+    def lookups(self, request, model_admin):
+        # Any non-empty value makes the admin render the filter.
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        # Carry the other filters, the search and the sort into the form's GET.
+        all_choice['query_parts'] = [
+            (key, value)
+            for key, values in changelist.filter_params.items() if key not in (self.parameter_name, CURSOR_VAR)
+            for value in values
+        ]
+        yield all_choice
+
+
+class UserInputFilter(InputFilter):
+    """Filter a foreign key to users by id or exact username; both are unique indexes."""
+    field_name = None
+    placeholder = 'ID or username'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(**{f'{self.field_name}_id': int(value)})
+        return queryset.filter(**{f'{self.field_name}__username': value})
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local(alias):
+    """True when the cache alias is private to this process (LocMemCache, DummyCache)."""
+    return isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def shared_cache_errors(setting, default, error_id, purpose):
+    """
+    Error for a cache setting that must name a cache shared by every worker, unless
+    DEBUG is on or the test runner is running (one process, nothing to share).
+    """
+    if settings.DEBUG or getattr(settings, 'TESTING', False):
+        return []
+    alias = getattr(settings, setting, default)
+    if alias not in settings.CACHES:
+        return [checks.Error(f"{setting} names the cache alias {alias!r}, which is not in CACHES.", id=error_id)]
+    if not is_process_local(alias):
+        return []
+    return [checks.Error(
+        f"{setting} ({alias!r}) is a per-process cache, so {purpose} would not reach the other workers.",
+        hint="Set REDIS_URL, or point the setting at a cache alias shared by all workers.",
+        id=error_id,
+    )]
+
+
+def check_replica_pin_cache(app_configs, **kwargs):
+    if not getattr(settings, 'DATABASE_REPLICAS', ()):
+        return []
+    return shared_cache_errors(
+        'DATABASE_REPLICA_PIN_CACHE', 'default', 'support_system.E001', "read-your-writes pins (PrimaryPinningMiddleware)",
+    )
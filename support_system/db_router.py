@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Per request (or per thread outside requests): {'pinned': bool, 'wrote': bool}.
+# A mutable dict so writes recorded in sync_to_async threads are seen by the middleware.
+_state = ContextVar('db_routing_state', default=None)
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def _current_state():
+    state = _state.get()
+    if state is None:
+        state = {'pinned': False, 'wrote': False}
+        _state.set(state)
+    return state
+
+
+# Leading keywords of statements that change data. WITH is a write only when one of
+# its parts is (a data-modifying CTE), ignoring SELECT ... FOR [NO KEY] UPDATE.
+WRITE_KEYWORDS = {'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'COPY', 'TRUNCATE'}
+ROW_LOCK = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b', re.IGNORECASE)
+WRITE_IN_CTE = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE)\b', re.IGNORECASE)
+
+
+def is_write(sql):
+    if not isinstance(sql, str):
+        # A composed (psycopg.sql) statement can't be classified; assume it writes.
+        return True
+    words = sql.split(None, 1)
+    keyword = words[0].upper() if words else ''
+    if keyword == 'WITH':
+        return bool(WRITE_IN_CTE.search(ROW_LOCK.sub('', sql)))
+    return keyword in WRITE_KEYWORDS
+
+
+def record_writes(execute, sql, params, many, context):
+    """
+    execute_wrapper for the primary: a statement that changes data pins the rest
+    of the request (and, through PrimaryPinningMiddleware, the client) to it.
+    """
+    if is_write(sql):
+        state = _current_state()
+        state['pinned'] = state['wrote'] = True
+    return execute(sql, params, many, context)
+
+
+def track_writes(sender, connection, **kwargs):
+    """connection_created receiver installing record_writes on primary connections when replicas are configured."""
+    if connection.alias != DEFAULT_DB_ALIAS or not getattr(settings, 'DATABASE_REPLICAS', ()):
+        return
+    # Fires again on every reconnect, possibly inside an execute_wrapper() block
+    # (which pops the last wrapper on exit), so go first and only once.
+    if record_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_writes)
+
+
+def pin_primary():
+    """Send every later read in this request (or thread) to the primary."""
+    _current_state()['pinned'] = True
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, e.g. right after a write made elsewhere."""
+    state = _current_state()
+    previous, state['pinned'] = state['pinned'], True
+    try:
+        yield
+    finally:
+        state['pinned'] = previous
+
+
+class ReplicaHealth:
+    """
+    Remembers which replicas answered their last health check. Each replica is
+    checked at most once per DATABASE_REPLICA_CHECK_INTERVAL seconds per process:
+    it must accept a connection and, on PostgreSQL, be less than
+    DATABASE_REPLICA_MAX_LAG seconds behind the primary. Unhealthy replicas get
+    no reads until a later check passes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        status = self._status.get(alias)
+        if status is not None and now - status[1] < getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5.0):
+            return status[0]
+        with self._lock:
+            status = self._status.get(alias)
+            if status is not None and now - status[1] < getattr(settings, 'DATABASE_REPLICA_CHECK_INTERVAL', 5.0):
+                return status[0]
+            # Claim the slot first so concurrent requests don't all run the check.
+            self._status[alias] = (status[0] if status else True, now)
+        healthy = self.check(alias)
+        self._status[alias] = (healthy, time.monotonic())
+        return healthy
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            if connection.vendor != 'postgresql':
+                return True
+            with connection.cursor() as cursor:
+                cursor.execute(REPLICA_LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+        except DatabaseError:
+            logger.warning("Database replica %s is unreachable; reading from the primary", alias, exc_info=True)
+            return False
+        if lag > getattr(settings, 'DATABASE_REPLICA_MAX_LAG', 10.0):
+            logger.warning("Database replica %s is %.1fs behind; reading from the primary", alias, lag)
+            return False
+        return True
+
+    def mark_down(self, alias):
+        self._status[alias] = (False, time.monotonic())
+
+    def reset(self):
+        self._status.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary ('default'); reads go to a random healthy alias from
+    DATABASE_REPLICAS, unless the request is pinned to the primary (unsafe
+    method, a write statement earlier in the request or a recent write by the
+    same client, see record_writes and PrimaryPinningMiddleware) or a
+    transaction is open on the primary. With no replicas configured every query uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', ())
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        state = _current_state()
+        if state['pinned'] or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        healthy = [alias for alias in replicas if replica_health.is_healthy(alias)]
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Only picks the alias: helpers call this without writing, so pinning
+        # waits for a write statement to run (record_writes).
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'DATABASE_REPLICAS', ())}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication.
+        return db not in getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def _pin_cache():
+    return caches[getattr(settings, 'DATABASE_REPLICA_PIN_CACHE', 'default')]
+
+
+def _client_key(request):
+    # The bearer token or session cookie identifies the client without authenticating it here.
+    credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'db:pin:' + hashlib.sha1(credential.encode()).hexdigest()
+
+
+class PrimaryPinningMiddleware:
+    """
+    Read-your-writes for replica routing. Unsafe requests read from the primary,
+    and a client whose request wrote keeps reading from the primary for
+    DATABASE_REPLICA_PIN_SECONDS, long enough for the replicas to catch up.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state, token, key = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.finish(state, key)
+        return response
+
+    async def __acall__(self, request):
+        state, token, key = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.finish(state, key)
+        return response
+
+    def start(self, request):
+        key = None
+        pinned = request.method not in SAFE_METHODS
+        if getattr(settings, 'DATABASE_REPLICAS', ()):
+            key = _client_key(request)
+            if not pinned and key is not None:
+                pinned = bool(_pin_cache().get(key))
+        state = {'pinned': pinned, 'wrote': False}
+        return state, _state.set(state), key
+
+    def finish(self, state, key):
+        if state['wrote'] and key is not None:
+            _pin_cache().set(key, 1, getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5))
@@ -0,0 +1,317 @@
+import fcntl
+import glob
+import hmac
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+HELP = {
+    'http_requests_total': ('counter', "Requests by view, action, method and status."),
+    'http_request_duration_seconds': ('histogram', "Request latency."),
+    'http_response_size_bytes': ('histogram', "Response body size."),
+    'db_queries_per_request': ('histogram', "Database queries executed per request."),
+    'db_query_duration_seconds_total': ('counter', "Time spent in database queries."),
+}
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms, keyed by (metric name, label values).
+
+    Recording takes one short uncontended lock. When a directory is configured each
+    process periodically snapshots its own samples to <directory>/metrics_<pid>.json
+    (write-then-rename, no cross-process locking) and collect() merges the files of
+    every worker, so one scrape covers all gunicorn workers on the host. Files of
+    workers that have exited are folded into metrics_dead.json and removed, so
+    counters keep their totals while the directory stays one file per live worker.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[(name, labels)] += value
+
+    def observe(self, name, labels, value, buckets):
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return as_snapshot(self._counters, self._histograms)
+
+    def maybe_flush(self):
+        if not self.directory or time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temp_path, path)
+
+    def collect(self):
+        snapshots = [self.snapshot()]
+        if self.directory:
+            self.prune_dead()
+            own = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                if path == own:
+                    continue
+                snapshot = _read_snapshot(path)
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+        return merge_snapshots(snapshots)
+
+    def prune_dead(self):
+        """Fold the snapshots of exited worker processes into metrics_dead.json."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        dead_path = os.path.join(self.directory, 'metrics_dead.json')
+        # Scrapes in different workers may prune at once; only one folds a file.
+        with open(os.path.join(self.directory, 'metrics.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = {}
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                match = PID_FILE.search(path)
+                if match is None or _pid_alive(int(match.group(1))):
+                    continue
+                dead[path] = _read_snapshot(path)
+            if not dead:
+                return
+            snapshots = [snapshot for snapshot in dead.values() if snapshot is not None]
+            previous = _read_snapshot(dead_path)
+            if previous is not None:
+                snapshots.append(previous)
+            temp_path = f'{dead_path}.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(as_snapshot(*merge_snapshots(snapshots)), f)
+            os.replace(temp_path, dead_path)
+            for path in dead:
+                os.remove(path)
+
+    def render(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, text) in HELP.items():
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (sample, labels), value in sorted(counters.items()):
+                if sample == name:
+                    lines.append(f'{name}{_labels(LABEL_NAMES[name], labels)} {value:g}')
+            for (sample, labels), h in sorted(histograms.items()):
+                if sample != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(h['buckets'], h['counts']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(LABEL_NAMES[name] + ("le",), labels + (f"{bound:g}",))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(LABEL_NAMES[name] + ("le",), labels + ("+Inf",))} {h["count"]}')
+                lines.append(f'{name}_sum{_labels(LABEL_NAMES[name], labels)} {h["sum"]:g}')
+                lines.append(f'{name}_count{_labels(LABEL_NAMES[name], labels)} {h["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+PID_FILE = re.compile(r'metrics_(\d+)\.json$')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user.
+        return True
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def merge_snapshots(snapshots):
+    """(counters, histograms) summed over snapshot() dicts."""
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(labels))] += value
+        for name, labels, buckets, counts, total, count in snapshot['histograms']:
+            merged = histograms.setdefault((name, tuple(labels)), {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0})
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], counts)]
+            merged['sum'] += total
+            merged['count'] += count
+    return counters, histograms
+
+
+def as_snapshot(counters, histograms):
+    """The snapshot() form of merged (counters, histograms)."""
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [
+            [name, list(labels), list(h['buckets']), list(h['counts']), h['sum'], h['count']]
+            for (name, labels), h in histograms.items()
+        ],
+    }
+
+
+VIEW_LABELS = ('view', 'action', 'method')
+LABEL_NAMES = {
+    'http_requests_total': VIEW_LABELS + ('status',),
+    'http_request_duration_seconds': VIEW_LABELS,
+    'http_response_size_bytes': VIEW_LABELS,
+    'db_queries_per_request': VIEW_LABELS,
+    'db_query_duration_seconds_total': VIEW_LABELS,
+}
+
+
+def _labels(names, values):
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry(getattr(settings, 'METRICS_DIR', None), getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0))
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def view_labels(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    if view_class is not None:
+        view = view_class.__name__
+        action = actions.get(request.method.lower(), request.method.lower())
+    else:
+        view = getattr(view_func, '__name__', 'unknown')
+        action = ''
+    return view, action, request.method
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status, response size and DB query count/time per view and
+    DRF action. Query counts cover queries run on the request thread, so async
+    views that hand DB work to sync_to_async only report latency and size.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, timer)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_labels = view_labels(request, view_func)
+
+    def record(self, request, response, elapsed, timer):
+        labels = getattr(request, '_metrics_labels', ('unmatched', '', request.method))
+        size = 0 if response.streaming else len(response.content)
+        registry.inc('http_requests_total', labels + (str(response.status_code),))
+        registry.observe('http_request_duration_seconds', labels, elapsed, LATENCY_BUCKETS)
+        registry.observe('http_response_size_bytes', labels, size, SIZE_BUCKETS)
+        registry.observe('db_queries_per_request', labels, timer.count, QUERY_BUCKETS)
+        registry.inc('db_query_duration_seconds_total', labels, timer.duration)
+        registry.maybe_flush()
+
+
+def _is_admin(request):
+    from rest_framework.exceptions import APIException
+    from users.authentication import ClaimsJWTAuthentication
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = ClaimsJWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        user = authenticated[0] if authenticated else None
+    return user is not None and (user.is_superuser or getattr(user, 'role', None) == 'admin')
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Denied unless the request carries METRICS_TOKEN
+    as a bearer token or comes from an admin (session or access token).
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())) and not _is_admin(request):
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,179 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a unique composite ordering. Fields prefixed
+    with '-' sort descending; annotations (e.g. a search rank) may be used too.
+
+    The opaque cursor holds the ordering values of the last row seen, so every
+    page is a bounded index range scan: no OFFSET and no COUNT(*), and deep pages
+    cost the same as the first one.
+    """
+    ordering = ('id',)
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request, queryset.model)
+        self.has_cursor = position is not None
+
+        order = [flip(field) if reverse else field for field in self.keys]
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            queryset = queryset.filter(seek_filter(self.keys, position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = self.has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+
+        self.page = results
+        return results
+
+    def get_ordering(self, queryset):
+        return self.ordering
+
+    def get_page_size(self, request):
+        page_size = self.page_size or 50
+        if self.page_size_query_param in request.query_params:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except ValueError:
+                pass
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            return decode_position(encoded, self.keys, model)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        return replace_query_param(self.base_url, self.cursor_query_param, encode_position(instance, self.keys, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def seek_filter(keys, position, reverse=False):
+    """
+    Q for the rows after `position` (the values of `keys` for one row) in the
+    `keys` ordering, or before it when `reverse`.
+    """
+    # (a, b) > (x, y) written as a >= x AND (a > x OR (a = x AND b > y)); the leading
+    # range condition lets the planner start the index scan at the cursor.
+    names = [field.lstrip('-') for field in keys]
+    ops = ['lt' if field.startswith('-') != reverse else 'gt' for field in keys]
+    condition = Q()
+    for index in range(len(names)):
+        equal = {name: position[i] for i, name in enumerate(names[:index])}
+        condition |= Q(**equal, **{f'{names[index]}__{ops[index]}': position[index]})
+    return Q(**{f'{names[0]}__{ops[0]}e': position[0]}) & condition
+
+
+def encode_position(instance, keys, reverse=False):
+    """Opaque cursor for the position of `instance` in the `keys` ordering."""
+    values = []
+    for field in keys:
+        value = getattr(instance, field.lstrip('-'))
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    data = {'p': values}
+    if reverse:
+        data['r'] = 1
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('ascii')).decode('ascii')
+
+
+def decode_position(encoded, keys, model):
+    """(position, reverse) from a cursor made by encode_position(); ValueError if it is invalid."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        values = data['p']
+        if len(values) != len(keys):
+            raise ValueError
+        position = [_to_python(model, field.lstrip('-'), value) for field, value in zip(keys, values)]
+        return position, bool(data.get('r'))
+    except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error, DjangoValidationError):
+        raise ValueError("Invalid cursor")
+
+
+def flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _to_python(model, name, value):
+    try:
+        return model._meta.get_field(name).to_python(value)
+    except FieldDoesNotExist:
+        # Annotations are stored as their JSON value.
+        if not isinstance(value, (int, float, str)):
+            raise ValueError
+        return value
+
+
+class TicketPagination(KeysetPagination):
+    ordering = ('created_at', 'creation_order')
+
+    def get_ordering(self, queryset):
+        # Search results (see tickets.search) come best match first.
+        if 'rank' in queryset.query.annotations:
+            return ('-rank',) + self.ordering
+        return self.ordering
+
+
+class TicketCounterPagination(KeysetPagination):
+    # Per-agent counter rows; agents have exactly one row (shard 0) each.
+    ordering = ('scope',)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import os
+import sys
 import environ
 from pathlib import Path
 
@@ -30,6 +31,9 @@ SECRET_KEY = 'django-insecure-_98#1f748(b71nmk%m5r1r@%%#=d5%p-fk)o@$yid!&y%jfdsi
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# True under "manage.py test"; picks test-friendly defaults below
+TESTING = sys.argv[1:2] == ['test']
+
 SECURE_HSTS_SECONDS = 31536000
 SECURE_HSTS_INCLUDE_SUBDOMAINS = True
 SECURE_HSTS_PRELOAD = True
@@ -58,33 +62,62 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'benchmarks',
 ]
 
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'support_system.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        'support_system.throttling.UserRateThrottle',
+        'support_system.throttling.AnonRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '100/min',
         'anon': '10/min',
-    }
+    },
+    'DEFAULT_PAGINATION_CLASS': 'support_system.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Where throttle state lives: 'sqlite' (a file in /dev/shm shared by the workers on
+# this host), 'redis' (shared across hosts) or 'memory' (per process; test runs)
+THROTTLE_STORE = env('THROTTLE_STORE', default='memory' if TESTING else 'redis' if env('REDIS_URL', default=None) else 'sqlite')
+# Defaults to a per-deployment file in /dev/shm (see throttling.default_sqlite_path)
+THROTTLE_SQLITE_PATH = env('THROTTLE_SQLITE_PATH', default=None)
+# Requests allowed back to back, as a fraction of the rate's limit. An idle client
+# can send about (1 + fraction) x the limit in its first period; lower it to cap that.
+THROTTLE_BURST_FRACTION = env.float('THROTTLE_BURST_FRACTION', default=1.0)
+THROTTLE_REDIS_URL = env('THROTTLE_REDIS_URL', default=env('REDIS_URL', default=None))
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.ClaimsTokenRefreshSerializer',
+}
+
+# Cache holding token revocation markers; must be shared by all workers in production
+AUTH_REVOCATION_CACHE = env('AUTH_REVOCATION_CACHE', default='default')
+# Per-process cache of full user rows for views that need more than the token claims (0 disables)
+AUTH_USER_CACHE_SIZE = env.int('AUTH_USER_CACHE_SIZE', default=1024)
+AUTH_USER_CACHE_TTL = env.int('AUTH_USER_CACHE_TTL', default=60)
+
+# Upper bound for ?page_size= on paginated list endpoints
+API_MAX_PAGE_SIZE = env.int('API_MAX_PAGE_SIZE', default=200)
+
 
 MIDDLEWARE = [
+    'support_system.metrics.MetricsMiddleware',
+    'support_system.db_router.PrimaryPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -132,9 +165,48 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD'),
         'HOST':     env('DB_HOST'),
         'PORT':     env('DB_PORT'),
+        # Persistent connections: each worker thread reuses its connection for this many
+        # seconds instead of reconnecting per request, pinging it before reuse.
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
+        # Behind PgBouncer in transaction pooling mode named cursors can't survive
+        # between transactions, so exports fall back to client-side chunked reads.
+        'DISABLE_SERVER_SIDE_CURSORS': env.bool('DB_PGBOUNCER_TRANSACTION_POOLING', default=False),
     }
 }
 
+# Read replicas as comma-separated host[:port]; each becomes a `replica_<n>` alias with the
+# primary's credentials. Locally, DB_REPLICAS=<DB_HOST> adds a second alias on the same server.
+for index, replica in enumerate(env.list('DB_REPLICAS', default=[]), 1):
+    replica_host, _, replica_port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['support_system.db_router.PrimaryReplicaRouter']
+# After a write, the same client reads from the primary for this many seconds. The pin lives
+# in this cache alias, which must be shared by all workers (checked at startup with DEBUG off)
+DATABASE_REPLICA_PIN_SECONDS = env.int('DATABASE_REPLICA_PIN_SECONDS', default=5)
+DATABASE_REPLICA_PIN_CACHE = env('DATABASE_REPLICA_PIN_CACHE', default='default')
+# Replicas are re-checked this often and skipped while unreachable or lagging more than DATABASE_REPLICA_MAX_LAG seconds
+DATABASE_REPLICA_CHECK_INTERVAL = env.float('DATABASE_REPLICA_CHECK_INTERVAL', default=5.0)
+DATABASE_REPLICA_MAX_LAG = env.float('DATABASE_REPLICA_MAX_LAG', default=10.0)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if env('REDIS_URL', default=None):
+    # Shared across workers and hosts: throttles and fetch-tickets batch versions.
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('REDIS_URL'),
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -176,3 +248,68 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Ticket creation_order values are reserved from a Postgres sequence in blocks of this size
+TICKET_CREATION_ORDER_BLOCK_SIZE = env.int('TICKET_CREATION_ORDER_BLOCK_SIZE', default=50)
+
+# POST /api/tickets/bulk/ validates and inserts uploads in chunks of this many rows
+TICKET_BULK_CHUNK_SIZE = env.int('TICKET_BULK_CHUNK_SIZE', default=1000)
+TICKET_BULK_MAX_ERRORS = env.int('TICKET_BULK_MAX_ERRORS', default=1000)
+TICKET_BULK_USE_COPY = env.bool('TICKET_BULK_USE_COPY', default=True)
+# Longest NDJSON line or JSON array element accepted, in characters
+TICKET_BULK_MAX_ROW_SIZE = env.int('TICKET_BULK_MAX_ROW_SIZE', default=1024 * 1024)
+
+# GET /api/tickets/export/ reads rows from a server-side cursor this many at a time
+TICKET_EXPORT_CHUNK_SIZE = env.int('TICKET_EXPORT_CHUNK_SIZE', default=2000)
+
+# 'auto' uses the single-statement SQL engine on PostgreSQL and the ORM engine elsewhere
+TICKET_ASSIGNMENT_ENGINE = env('TICKET_ASSIGNMENT_ENGINE', default='auto')
+
+# Global ticket counters (queue depth, sold) are spread over this many rows so writers don't contend on one
+TICKET_COUNTER_SHARDS = env.int('TICKET_COUNTER_SHARDS', default=8)
+# fetch-tickets and dispatch_tickets skip the claim while the queue-depth counter is zero
+TICKET_ASSIGNMENT_USE_COUNTERS = env.bool('TICKET_ASSIGNMENT_USE_COUNTERS', default=True)
+# A zero counter is confirmed against the tickets table at most this often per process
+TICKET_COUNTER_RECHECK_SECONDS = env.float('TICKET_COUNTER_RECHECK_SECONDS', default=10.0)
+
+# Unsold tickets assigned longer than this many seconds are returned to the queue by the reaper
+TICKET_ASSIGNMENT_LEASE = env.int('TICKET_ASSIGNMENT_LEASE', default=14400)
+TICKET_REAPER_BATCH_SIZE = env.int('TICKET_REAPER_BATCH_SIZE', default=500)
+# Run the reaper every this many seconds inside each web process (0 = only via `manage.py reclaim_tickets`)
+TICKET_REAPER_INTERVAL = env.int('TICKET_REAPER_INTERVAL', default=0)
+
+# Fields fetch-tickets renders unless the client passes ?fields= or ?omit= (empty: every field).
+# The default leaves out the description, the creator and updated_at.
+TICKET_FETCH_FIELDS = env.list('TICKET_FETCH_FIELDS', default=[
+    'id', 'subject', 'is_sold', 'created_at', 'assigned_at', 'creation_order', 'lane', 'assigned_to',
+])
+
+# Upper bound for ?wait= on the async long-poll fetch-tickets endpoint (ASGI only)
+TICKET_LONG_POLL_MAX_WAIT = env.int('TICKET_LONG_POLL_MAX_WAIT', default=30)
+
+# GET /api/events/ page size (?limit=) default and maximum
+TICKET_EVENTS_PAGE_SIZE = env.int('TICKET_EVENTS_PAGE_SIZE', default=100)
+TICKET_EVENTS_MAX_PAGE_SIZE = env.int('TICKET_EVENTS_MAX_PAGE_SIZE', default=1000)
+# prune_events drops events older than this many seconds, and compacts superseded events
+# of the same ticket after TICKET_EVENTS_COMPACT_AFTER seconds (0 disables either)
+TICKET_EVENTS_RETENTION = env.int('TICKET_EVENTS_RETENTION', default=7 * 86400)
+TICKET_EVENTS_COMPACT_AFTER = env.int('TICKET_EVENTS_COMPACT_AFTER', default=86400)
+
+# POST /api/users/bulk/ takes at most this many users and hashes their passwords in a pool
+# of this many processes (0: one per CPU). Every web worker keeps its own pool, so keep it
+# small; the provision_users command has no row limit and defaults to one process per CPU
+USER_BULK_MAX_ROWS = env.int('USER_BULK_MAX_ROWS', default=1000)
+USER_BULK_HASH_WORKERS = env.int('USER_BULK_HASH_WORKERS', default=2)
+
+# Admin changelists count matching rows exactly up to this many and show the planner's estimate above it
+ADMIN_EXACT_COUNT_LIMIT = env.int('ADMIN_EXACT_COUNT_LIMIT', default=10000)
+
+# /api/metrics/: per-process samples are merged from this directory (shared by all gunicorn workers on a host)
+METRICS_DIR = env('METRICS_DIR', default=None)
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', default=1.0)
+# Lets non-admin scrapers in with "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = env('METRICS_TOKEN', default=None)
+
+# Cache alias holding per-agent fetch-tickets batch versions (ETag / If-None-Match)
+TICKET_BATCH_CACHE = env('TICKET_BATCH_CACHE', default='default')
+TICKET_BATCH_VERSION_TIMEOUT = env.int('TICKET_BATCH_VERSION_TIMEOUT', default=3600)
@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import throttling
+
+logger = logging.getLogger(__name__)
+
+# Drop expired keys after this many hits on a store.
+PRUNE_EVERY = 1024
+
+
+class ThrottleStoreError(Exception):
+    pass
+
+
+def gcra(tat, now, limit, period, burst=None):
+    """
+    One step of the generic cell rate algorithm. `tat` is the stored theoretical
+    arrival time (None for an unknown key). Returns (allowed, new tat, wait):
+    up to `burst` requests (default `limit`) may go through at once, then one per
+    period / limit. An idle key can therefore pass burst + limit - 1 requests in
+    its first period; the long-run rate is `limit` per period.
+    """
+    interval = period / limit
+    tolerance = interval * (burst or limit)
+    new_tat = max(tat or now, now) + interval
+    if new_tat - now > tolerance:
+        return False, tat, new_tat - tolerance - now
+    return True, new_tat, 0.0
+
+
+class MemoryThrottleStore:
+    """Per-process GCRA state, for tests and single-process development servers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tats = {}
+        self._hits = 0
+
+    def hit(self, key, limit, period, now=None, burst=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            allowed, tat, wait = gcra(self._tats.get(key), now, limit, period, burst)
+            self._tats[key] = tat
+            self._hits += 1
+            if self._hits % PRUNE_EVERY == 0:
+                self._tats = {k: v for k, v in self._tats.items() if v > now}
+        return allowed, wait
+
+    def clear(self):
+        with self._lock:
+            self._tats.clear()
+
+
+def default_sqlite_path():
+    """
+    A file in /dev/shm (else the temp dir) named after this deployment's project
+    directory and database, so two checkouts or environments on one host never
+    share buckets.
+    """
+    database = settings.DATABASES['default']
+    identity = f"{settings.BASE_DIR}|{database.get('HOST', '')}|{database.get('PORT', '')}|{database.get('NAME', '')}"
+    digest = hashlib.sha256(identity.encode()).hexdigest()[:16]
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f'support_system_throttle-{digest}.sqlite3')
+
+
+class SQLiteThrottleStore:
+    """
+    GCRA state in a SQLite file shared by every worker process on the host. The
+    default path (default_sqlite_path) is on /dev/shm, so it lives in shared
+    memory and never hits disk.
+    An allowed hit is a single autocommit UPSERT ... RETURNING; only a rejected hit
+    reads the row back to compute Retry-After.
+    """
+
+    def __init__(self, path=None, timeout=1.0):
+        self.path = path or default_sqlite_path()
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        # Connections must not be shared with a forked child.
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.hits = 0
+        return connection
+
+    def hit(self, key, limit, period, now=None, burst=None):
+        now = time.time() if now is None else now
+        interval = period / limit
+        tolerance = interval * (burst or limit)
+        try:
+            connection = self._connection()
+            # fetchall() steps the statement to completion so the write lock is released.
+            rows = connection.execute(
+                'INSERT INTO throttle (key, tat) VALUES (?1, ?2 + ?3) '
+                'ON CONFLICT (key) DO UPDATE SET tat = max(tat, ?2) + ?3 WHERE max(tat, ?2) + ?3 - ?2 <= ?4 '
+                'RETURNING tat',
+                (key, now, interval, tolerance),
+            ).fetchall()
+            if rows:
+                self._local.hits += 1
+                if self._local.hits % PRUNE_EVERY == 0:
+                    connection.execute('DELETE FROM throttle WHERE tat < ?', (now,))
+                return True, 0.0
+            (tat,) = connection.execute('SELECT tat FROM throttle WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            raise ThrottleStoreError(e) from e
+        return False, max(0.0, tat + interval - tolerance - now)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM throttle')
+
+
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then
+    tat = now
+end
+tat = tat + interval
+if tat - now > tolerance then
+    return {0, tostring(tat - tolerance - now)}
+end
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+class RedisThrottleStore:
+    """
+    GCRA state in Redis, shared across hosts. Each hit is one EVALSHA of a small
+    Lua script, so the read-modify-write is atomic on the server. Keys expire on
+    their own once the bucket is full again.
+    """
+
+    def __init__(self, url=None, client=None, prefix='throttle:'):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    def hit(self, key, limit, period, now=None, burst=None):
+        now = time.time() if now is None else now
+        interval = period / limit
+        try:
+            allowed, wait = self._script(
+                keys=[self.prefix + key], args=[repr(now), repr(interval), repr(interval * (burst or limit))]
+            )
+        except Exception as e:
+            raise ThrottleStoreError(e) from e
+        return bool(int(allowed)), float(wait)
+
+
+_store = None
+_store_lock = threading.Lock()
+# Used while the configured store is failing, so limits still hold per process.
+_fallback_store = MemoryThrottleStore()
+
+
+def get_throttle_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _create_store()
+    return _store
+
+
+def _create_store():
+    backend = getattr(settings, 'THROTTLE_STORE', 'sqlite')
+    if backend == 'memory':
+        return MemoryThrottleStore()
+    if backend == 'sqlite':
+        return SQLiteThrottleStore(getattr(settings, 'THROTTLE_SQLITE_PATH', None))
+    if backend == 'redis':
+        return RedisThrottleStore(getattr(settings, 'THROTTLE_REDIS_URL', None))
+    raise ValueError(f"Unknown THROTTLE_STORE {backend!r}; expected 'sqlite', 'redis' or 'memory'.")
+
+
+@receiver(setting_changed)
+def _reset_store(setting, **kwargs):
+    global _store
+    if setting.startswith('THROTTLE_'):
+        _store = None
+        _fallback_store.clear()
+
+
+class GCRAThrottleMixin:
+    """
+    Replaces SimpleRateThrottle's per-key list of timestamps with a single GCRA
+    value in the shared throttle store. Rates, scopes and keys are unchanged;
+    THROTTLE_BURST_FRACTION sizes the burst as a fraction of the rate's limit. If
+    the store is unavailable (a lock timeout, Redis down) the hit is counted in a
+    per-process store instead, so each worker still enforces the rate on its own.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        burst = max(1, round(self.num_requests * getattr(settings, 'THROTTLE_BURST_FRACTION', 1.0)))
+        try:
+            allowed, self._wait = self.get_store().hit(self.key, self.num_requests, self.duration, burst=burst)
+        except ThrottleStoreError:
+            logger.warning("Throttle store unavailable; limiting per process", exc_info=True)
+            allowed, self._wait = _fallback_store.hit(self.key, self.num_requests, self.duration, burst=burst)
+        return allowed
+
+    def get_store(self):
+        return get_throttle_store()
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class UserRateThrottle(GCRAThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class AnonRateThrottle(GCRAThrottleMixin, throttling.AnonRateThrottle):
+    pass
@@ -22,6 +22,7 @@ from rest_framework.routers import DefaultRouter
 from tickets.views import TicketViewSet
 from users.views import UserViewSet
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from support_system.metrics import metrics_view
 
 router = DefaultRouter()
 router.register('tickets', TicketViewSet, basename='tickets')
@@ -33,4 +34,5 @@ urlpatterns = [
     path('api/', include('users.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'support_system.settings')
 
 application = get_wsgi_application()
+
+# Periodic stale-assignment reaper, enabled by TICKET_REAPER_INTERVAL.
+from tickets.reaper import stale_assignment_reaper  # noqa: E402
+
+stale_assignment_reaper.start()
@@ -1,12 +1,41 @@
 from django.contrib import admin
-from .models import Ticket
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from support_system.changelist import ScalableAdminMixin, UserInputFilter
+from .batch_cache import evict_batch_versions
+from .models import ArchivedTicket, Ticket
+from .search import search_condition
 
-class TicketAdmin(admin.ModelAdmin):
-    list_display = ("id", "subject", "created_by", "assigned_to", "created_at", "updated_at", "creation_order")
-    list_filter = ("assigned_to", "created_at")
+class AssignedToFilter(UserInputFilter):
+    title = "assigned to"
+    parameter_name = "assigned_to"
+    field_name = "assigned_to"
+
+
+# ScalableAdminMixin pages by keyset with estimated counts; only indexed columns are sortable.
+class TicketAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "subject", "created_by", "assigned_to", "created_at", "updated_at", "creation_order", "lane")
+    list_select_related = ("created_by", "assigned_to")
+    list_filter = ("lane", AssignedToFilter, "created_at")
+    sortable_by = ("id", "created_at", "creation_order")
+    raw_id_fields = ("created_by", "assigned_to")
+    # Searches go through the indexed full-text search; see get_search_results().
     search_fields = ("subject", "description", "assigned_to__username")
     ordering = ("-created_at","-creation_order")
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # Resolve matching agents first so the ticket side stays an indexed
+        # assigned_to_id IN (...) rather than an ILIKE across the join.
+        agent_ids = list(
+            get_user_model().objects.filter(username__icontains=search_term.strip()).values_list("pk", flat=True)
+        )
+        condition = search_condition(queryset, search_term)
+        if agent_ids:
+            condition |= Q(assigned_to_id__in=agent_ids)
+        return queryset.filter(condition), False
+
     # Optional: prevent non-admins from editing
     def has_change_permission(self, request, obj=None):
         if request.user.role != "admin":
@@ -21,4 +50,35 @@ class TicketAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return request.user.role == "admin"
 
+    def save_model(self, request, obj, form, change):
+        previous_agent_id = form.initial.get("assigned_to") if change else None
+        super().save_model(request, obj, form, change)
+        evict_batch_versions(previous_agent_id, obj.assigned_to_id)
+
+    def delete_model(self, request, obj):
+        evict_batch_versions(obj.assigned_to_id)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        evict_batch_versions(*queryset.values_list("assigned_to_id", flat=True).distinct())
+        super().delete_queryset(request, queryset)
+
 admin.site.register(Ticket, TicketAdmin)
+
+
+class ArchivedTicketAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ("id", "subject", "created_by", "assigned_to", "created_at", "archived_at", "creation_order")
+    list_select_related = ("created_by", "assigned_to")
+    list_filter = ("archived_at", AssignedToFilter)
+    sortable_by = ("id", "created_at", "creation_order")
+    raw_id_fields = ("created_by", "assigned_to")
+    search_fields = ("subject",)
+    ordering = ("-created_at", "-creation_order")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+admin.site.register(ArchivedTicket, ArchivedTicketAdmin)
@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, pre_delete
 
 
 class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
+
+    def ready(self):
+        from support_system.checks import check_replica_pin_cache
+        from support_system.db_router import track_writes
+
+        from .sequences import create_creation_order_sequence
+        from .stats import release_agent
+        checks.register(check_replica_pin_cache, checks.Tags.caches, checks.Tags.database)
+        post_migrate.connect(create_creation_order_sequence, sender=self)
+        pre_delete.connect(release_agent, sender=settings.AUTH_USER_MODEL)
+        connection_created.connect(track_writes)
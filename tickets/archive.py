@@ -0,0 +1,91 @@
+import time
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .events import record_events
+from .models import ArchivedTicket, Ticket, TicketEvent
+from .utils import _use_sql
+
+ARCHIVE_COLUMNS = (
+    'id', 'subject', 'description', 'created_by_id', 'assigned_to_id',
+    'created_at', 'updated_at', 'assigned_at', 'creation_order', 'lane',
+)
+
+
+def archive_sold_tickets(cutoff, batch_size=1000, max_batches=None, pause=0.0):
+    """
+    Move sold tickets last updated before `cutoff` into the archive table.
+
+    Works in batches of `batch_size` rows, each in its own short transaction, so
+    row locks are held briefly and sellers and fetchers are never blocked for
+    long. Rows locked by a concurrent transaction are skipped and picked up by a
+    later run. Returns a report with the number of batches and tickets moved and
+    the longest batch (transaction) duration.
+    """
+    using = router.db_for_write(Ticket)
+    report = {'batches': 0, 'tickets': 0, 'max_batch_seconds': 0.0}
+    started = time.perf_counter()
+    while max_batches is None or report['batches'] < max_batches:
+        batch_started = time.perf_counter()
+        moved = archive_batch(cutoff, batch_size, using)
+        report['max_batch_seconds'] = max(report['max_batch_seconds'], time.perf_counter() - batch_started)
+        if not moved:
+            break
+        report['batches'] += 1
+        report['tickets'] += moved
+        if moved < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    report['seconds'] = round(time.perf_counter() - started, 4)
+    report['max_batch_seconds'] = round(report['max_batch_seconds'], 4)
+    return report
+
+
+def archive_batch(cutoff, batch_size, using):
+    if _use_sql(using):
+        return _archive_batch_sql(cutoff, batch_size, using)
+    return _archive_batch_orm(cutoff, batch_size, using)
+
+
+def _archive_batch_sql(cutoff, batch_size, using):
+    table = Ticket._meta.db_table
+    archive_table = ArchivedTicket._meta.db_table
+    columns = ', '.join(ARCHIVE_COLUMNS)
+    sql = f"""
+        WITH moved AS (
+            DELETE FROM {table}
+            WHERE id IN (
+                SELECT id FROM {table}
+                WHERE is_sold = true AND updated_at < %(cutoff)s
+                ORDER BY updated_at
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {columns}
+        )
+        INSERT INTO {archive_table} ({columns}, archived_at)
+        SELECT {columns}, %(now)s FROM moved
+        RETURNING id, assigned_to_id
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(sql, {'cutoff': cutoff, 'limit': batch_size, 'now': timezone.now()})
+        rows = cursor.fetchall()
+        record_events([(TicketEvent.ARCHIVED, ticket_id, agent_id) for ticket_id, agent_id in rows], using=using)
+    return len(rows)
+
+
+def _archive_batch_orm(cutoff, batch_size, using):
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        rows = list(
+            Ticket.objects.using(using).select_for_update(skip_locked=True)
+            .filter(is_sold=True, updated_at__lt=cutoff).order_by('updated_at')
+            .values(*ARCHIVE_COLUMNS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ArchivedTicket.objects.using(using).bulk_create([ArchivedTicket(archived_at=now, **row) for row in rows])
+        Ticket.objects.using(using).filter(id__in=[row['id'] for row in rows]).delete(event_type=TicketEvent.ARCHIVED)
+    return len(rows)
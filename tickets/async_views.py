@@ -0,0 +1,164 @@
+import asyncio
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .events import CursorExpired, latest_cursor, parse_cursor, read_events
+from .notify import event_notifier, ticket_notifier
+from .permissions import IsAdmin, IsAgent
+from .serializers import TicketEventSerializer, TicketReadSerializer, parse_ticket_fields, ticket_load_fields
+from .utils import assign_tickets_to_agent
+
+
+def _authenticate(request, permission=IsAgent):
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    if not drf_request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    if not permission().has_permission(drf_request, None):
+        raise exceptions.PermissionDenied()
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(drf_request, None):
+            raise exceptions.Throttled(throttle.wait())
+    return drf_request.user
+
+
+def _fetch_batch(user, fields=None):
+    try:
+        tickets = assign_tickets_to_agent(user, fields=None if fields is None else ticket_load_fields(fields))
+        if fields is None or 'created_by' in fields:
+            prefetch_related_objects(tickets, 'created_by')
+        return TicketReadSerializer(tickets, many=True, fields=fields).data
+    finally:
+        _release_connections()
+
+
+def _release_connections():
+    # Each ASGI request runs its sync code on its own thread, and that thread's
+    # connection would stay open (CONN_MAX_AGE) while the request is parked, so
+    # close it: thousands of idle agents must not hold thousands of connections.
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def _wait_seconds(request):
+    wait = float(request.GET.get('wait', 0))
+    # float() accepts 'nan' and 'inf'; a NaN deadline would never expire.
+    if not math.isfinite(wait):
+        raise ValueError(f"wait must be finite, got {wait!r}")
+    return min(max(wait, 0), getattr(settings, 'TICKET_LONG_POLL_MAX_WAIT', 30))
+
+
+def _json_response(data, status=200):
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(renderer.render(data), status=status, content_type='application/json')
+
+
+async def fetch_tickets_long_poll(request):
+    """
+    Async variant of fetch-tickets for ASGI deployments.
+
+    With ?wait=<seconds> an agent that has no tickets is parked on the ticket
+    notifier instead of polling, and the assignment runs again once new tickets
+    are announced. Idle waiters hold no database connection or transaction.
+    """
+    if request.method != 'GET':
+        return _json_response({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except exceptions.APIException as e:
+        return _json_response({"detail": e.detail}, status=e.status_code)
+
+    try:
+        wait = _wait_seconds(request)
+    except ValueError:
+        return _json_response({"detail": "wait must be a number of seconds."}, status=400)
+    try:
+        fields = parse_ticket_fields(request.GET, getattr(settings, 'TICKET_FETCH_FIELDS', None))
+    except exceptions.ValidationError as e:
+        return _json_response(e.detail, status=400)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        # Read the generation before assigning so a notification that lands in between is not missed.
+        since = ticket_notifier.generation
+        data = await sync_to_async(_fetch_batch)(user, fields)
+        remaining = deadline - loop.time()
+        if data or remaining <= 0:
+            return _json_response(data)
+        ticket_notifier.start_listener()
+        await ticket_notifier.wait(since, remaining)
+
+
+def _read_page(after, limit):
+    try:
+        events, cursor, has_more = read_events(after, limit)
+        return {
+            'events': TicketEventSerializer(events, many=True).data,
+            'next': cursor,
+            'has_more': has_more,
+        }
+    finally:
+        _release_connections()
+
+
+async def ticket_events(request):
+    """
+    Change feed over the ticket outbox for downstream systems (admins only).
+
+    Without ?after= the feed starts at the oldest retained event; pass the
+    returned `next` cursor as the following ?after= to get the events committed
+    since, oldest first, at most ?limit= per page. ?after=latest returns no
+    events and a cursor at the newest one. With ?wait=<seconds> an empty page is
+    held until new events commit or the wait runs out. A cursor older than the
+    event retention gets 410 Gone.
+    """
+    if request.method != 'GET':
+        return _json_response({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+
+    try:
+        await sync_to_async(_authenticate)(request, IsAdmin)
+    except exceptions.APIException as e:
+        return _json_response({"detail": e.detail}, status=e.status_code)
+
+    if request.GET.get('after') == 'latest':
+        return _json_response({'events': [], 'next': await sync_to_async(latest_cursor)(), 'has_more': False})
+    try:
+        after = parse_cursor(request.GET['after']) if request.GET.get('after') else None
+    except ValueError:
+        return _json_response({"detail": "Invalid cursor."}, status=400)
+    except CursorExpired:
+        return _json_response(
+            {"detail": "This cursor is older than the event retention; resync from /api/tickets/ and restart from after=latest."},
+            status=410,
+        )
+    try:
+        limit = int(request.GET.get('limit', getattr(settings, 'TICKET_EVENTS_PAGE_SIZE', 100)))
+        wait = _wait_seconds(request)
+    except ValueError:
+        return _json_response({"detail": "limit and wait must be numbers."}, status=400)
+    if limit < 1:
+        return _json_response({"detail": "limit must be >= 1."}, status=400)
+    limit = min(limit, getattr(settings, 'TICKET_EVENTS_MAX_PAGE_SIZE', 1000))
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        since = event_notifier.generation
+        page = await sync_to_async(_read_page)(after, limit)
+        remaining = deadline - loop.time()
+        if page['events'] or remaining <= 0:
+            return _json_response(page)
+        event_notifier.start_listener()
+        await event_notifier.wait(since, remaining)
+
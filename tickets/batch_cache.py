@@ -0,0 +1,73 @@
+import uuid
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils.http import parse_etags
+
+
+def _cache():
+    return caches[getattr(settings, 'TICKET_BATCH_CACHE', 'default')]
+
+
+def _key(agent_id):
+    return f'tickets:batch:{agent_id}'
+
+
+def _etag(agent_id, token, fields=None):
+    # The same batch rendered with other fields (?fields=/?omit=) is a different body.
+    if fields is not None:
+        return f'"{agent_id}-{token}-{zlib.crc32(",".join(fields).encode()):08x}"'
+    return f'"{agent_id}-{token}"'
+
+
+def matches_current_batch(agent_id, if_none_match, fields=None):
+    """
+    Return the ETag of the agent's cached full batch if the client already has it
+    rendered with `fields`. Costs one cache read and no database queries.
+    """
+    if not if_none_match:
+        return None
+    token = _cache().get(_key(agent_id))
+    if token is None:
+        return None
+    etag = _etag(agent_id, token, fields)
+    client_etags = parse_etags(if_none_match)
+    return etag if etag in client_etags or '*' in client_etags else None
+
+
+def reserve_batch_version(agent_id):
+    """
+    Make sure the agent has a batch version before the batch is read. If the batch
+    changes while it is being read, the version is evicted and batch_etag() returns None.
+    """
+    cache = _cache()
+    token = uuid.uuid4().hex
+    if not cache.add(_key(agent_id), token, getattr(settings, 'TICKET_BATCH_VERSION_TIMEOUT', 3600)):
+        token = cache.get(_key(agent_id))
+    return token
+
+
+def batch_etag(agent_id, token, fields=None):
+    if token is None or _cache().get(_key(agent_id)) != token:
+        return None
+    return _etag(agent_id, token, fields)
+
+
+def evict_batch_versions(*agent_ids, using=None):
+    """
+    Forget the batch version of every given agent. Inside a transaction the versions
+    are evicted again on commit, so a fetch that read the old rows in the meantime
+    cannot leave a stale version behind.
+    """
+    keys = [_key(agent_id) for agent_id in set(agent_ids) if agent_id is not None]
+    if not keys:
+        return
+    from .models import Ticket
+
+    cache = _cache()
+    cache.delete_many(keys)
+    using = using or router.db_for_write(Ticket)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys), using=using)
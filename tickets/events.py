@@ -0,0 +1,154 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from support_system.pagination import decode_position, encode_position, seek_filter
+
+from .models import TicketEvent
+from .notify import notify_events
+
+# Transactions that started before every one still running; their events are final.
+VISIBLE_TXID_SQL = 'txid_snapshot_xmin(txid_current_snapshot())'
+
+
+class CursorExpired(Exception):
+    """The feed cursor is older than the event retention, so events after it may be gone."""
+
+
+def change_type(before, after):
+    """Event type for a ticket going from state `before` to `after`, as in stats.record_ticket_changes."""
+    if before is None:
+        return TicketEvent.CREATED
+    if after is None:
+        return TicketEvent.DELETED
+    if after[1] and not before[1]:
+        return TicketEvent.SOLD
+    if after[0] != before[0]:
+        return TicketEvent.ASSIGNED if after[0] else TicketEvent.RELEASED
+    return TicketEvent.UPDATED
+
+
+def record_events(events, using=None):
+    """
+    Add [(type, ticket_id, agent_id), ...] to the outbox. Call it inside the
+    transaction that changed the tickets so the events commit or roll back with it.
+    """
+    events = list(events)
+    if not events:
+        return
+    using = using or router.db_for_write(TicketEvent)
+    now = timezone.now()
+    TicketEvent.objects.using(using).bulk_create([
+        TicketEvent(type=event_type, ticket_id=ticket_id, agent_id=agent_id, created_at=now)
+        for event_type, ticket_id, agent_id in events
+    ])
+    notify_events(using=using)
+
+
+def _visible(queryset):
+    if connections[queryset.db].vendor == 'postgresql':
+        return queryset.filter(txid__lt=RawSQL(VISIBLE_TXID_SQL, []))
+    # Other backends serialize writers, so id order is commit order.
+    return queryset
+
+
+# Feed cursors hold the (txid, id) of the last event served, for the seek, and a
+# timestamp to tell whether retention may have removed events after it.
+CURSOR_KEYS = ('txid', 'id', 'created_at')
+
+
+def event_cursor(txid, event_id, stamp):
+    return encode_position(TicketEvent(txid=txid, id=event_id, created_at=stamp), CURSOR_KEYS)
+
+
+def parse_cursor(encoded):
+    """
+    (txid, id, stamp) from a feed cursor. Raises ValueError for a malformed one
+    and CursorExpired for one older than TICKET_EVENTS_RETENTION.
+    """
+    txid, event_id, stamp = decode_position(encoded, CURSOR_KEYS, TicketEvent)[0]
+    retention = getattr(settings, 'TICKET_EVENTS_RETENTION', 7 * 86400)
+    if retention and stamp < timezone.now() - timedelta(seconds=retention):
+        raise CursorExpired(encoded)
+    return txid, event_id, stamp
+
+
+def latest_cursor(using=None):
+    """Cursor for a consumer that only wants events from now on."""
+    using = using or router.db_for_read(TicketEvent)
+    newest = _visible(TicketEvent.objects.using(using)).order_by('-txid', '-id').values_list('txid', 'id').first()
+    return event_cursor(*(newest or (0, 0)), timezone.now())
+
+
+def read_events(after=None, limit=100, using=None):
+    """
+    Up to `limit` events following the position `after` (from parse_cursor; None:
+    the oldest retained), in commit order. Returns (events, next cursor, has_more).
+
+    The cursor is seeked to directly, so it stays valid when the event it came
+    from is compacted away or hasn't reached this replica yet.
+    """
+    using = using or router.db_for_read(TicketEvent)
+    events = TicketEvent.objects.using(using)
+    if after is not None:
+        # (txid, id) > (cursor txid, cursor id), written so the feed index serves it as a range scan.
+        events = events.filter(seek_filter(CURSOR_KEYS[:2], after[:2]))
+    rows = list(_visible(events).order_by('txid', 'id')[:limit + 1])
+    page = rows[:limit]
+    if page:
+        cursor = event_cursor(page[-1].txid, page[-1].id, page[-1].created_at)
+    else:
+        # Nothing after the cursor yet: re-stamp it so an idle consumer's cursor doesn't expire.
+        cursor = event_cursor(*(after[:2] if after is not None else (0, 0)), timezone.now())
+    return page, cursor, len(rows) > limit
+
+
+def prune_events(retention=None, compact_after=None, batch_size=1000, max_batches=None, pause=0.0):
+    """
+    Delete events older than `retention`, then compact: events older than
+    `compact_after` that have a newer event for the same ticket are dropped, so
+    the log keeps every ticket's latest state. Both are timedeltas; None reads
+    TICKET_EVENTS_RETENTION / TICKET_EVENTS_COMPACT_AFTER (seconds, 0 disables).
+
+    Works in short batched transactions like archive_tickets. Consumers more
+    than `compact_after` behind skip the compacted events but still see every
+    ticket's latest one; cursors older than the retention are refused
+    (CursorExpired) and have to resync from the ticket list.
+    """
+    if retention is None:
+        retention = timedelta(seconds=getattr(settings, 'TICKET_EVENTS_RETENTION', 7 * 86400))
+    if compact_after is None:
+        compact_after = timedelta(seconds=getattr(settings, 'TICKET_EVENTS_COMPACT_AFTER', 86400))
+    using = router.db_for_write(TicketEvent)
+    now = timezone.now()
+    events = TicketEvent.objects.using(using)
+    report = {'batches': 0, 'expired': 0, 'compacted': 0}
+    started = time.perf_counter()
+
+    stages = []
+    if retention:
+        stages.append(('expired', events.filter(created_at__lt=now - retention)))
+    if compact_after:
+        newer = TicketEvent.objects.using(using).filter(ticket_id=OuterRef('ticket_id'), id__gt=OuterRef('id'))
+        stages.append(('compacted', events.filter(Exists(newer), created_at__lt=now - compact_after)))
+    for key, stale in stages:
+        while max_batches is None or report['batches'] < max_batches:
+            with transaction.atomic(using=using):
+                ids = list(stale.order_by('id').values_list('id', flat=True)[:batch_size])
+                if ids:
+                    TicketEvent.objects.using(using).filter(id__in=ids).delete()
+            if not ids:
+                break
+            report['batches'] += 1
+            report[key] += len(ids)
+            if len(ids) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+    report['seconds'] = round(time.perf_counter() - started, 4)
+    return report
@@ -0,0 +1,119 @@
+import csv
+import io
+import json
+import re
+import zlib
+
+from django.conf import settings
+
+from .serializers import _datetime
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the json module.
+    orjson = None
+
+FLUSH_SIZE = 64 * 1024
+
+CSV_COLUMNS = (
+    ('id', 'id'),
+    ('subject', 'subject'),
+    ('description', 'description'),
+    ('is_sold', 'is_sold'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('assigned_at', 'assigned_at'),
+    ('creation_order', 'creation_order'),
+    ('lane', 'lane'),
+    ('created_by_id', 'created_by_id'),
+    ('created_by_username', 'created_by__username'),
+    ('assigned_to_id', 'assigned_to_id'),
+    ('assigned_to_username', 'assigned_to__username'),
+)
+
+NDJSON_COLUMNS = (
+    'id', 'created_by_id', 'created_by__username', 'subject', 'description', 'is_sold',
+    'created_at', 'updated_at', 'assigned_at', 'creation_order', 'lane', 'assigned_to_id',
+)
+
+gzip_accepted = re.compile(r'\bgzip\b').search
+
+
+def _rows(queryset, columns, chunk_size):
+    # values_list() joins the user table for the usernames, so there is no query
+    # per row, and iterator() reads through a server-side cursor on PostgreSQL.
+    chunk_size = chunk_size or getattr(settings, 'TICKET_EXPORT_CHUNK_SIZE', 2000)
+    return queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if hasattr(value, 'isoformat'):
+        return _datetime(value)
+    return value
+
+
+def export_csv(queryset, chunk_size=None):
+    """Yield the tickets as UTF-8 CSV with a header row, in chunks of about FLUSH_SIZE bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in CSV_COLUMNS])
+    for row in _rows(queryset, [column for _, column in CSV_COLUMNS], chunk_size):
+        writer.writerow([_csv_value(value) for value in row])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def export_ndjson(queryset, chunk_size=None):
+    """
+    Yield the tickets as NDJSON, one object per line in the same shape as the
+    ticket list, in chunks of about FLUSH_SIZE bytes.
+    """
+    lines, size = [], 0
+    for (ticket_id, created_by_id, username, subject, description, is_sold,
+         created_at, updated_at, assigned_at, creation_order, lane, assigned_to_id) in _rows(queryset, NDJSON_COLUMNS, chunk_size):
+        line = _dumps({
+            'id': ticket_id,
+            'created_by': {
+                "id": created_by_id,
+                "username": username,
+            } if created_by_id is not None else None,
+            'subject': subject,
+            'description': description,
+            'is_sold': is_sold,
+            'created_at': _datetime(created_at),
+            'updated_at': _datetime(updated_at),
+            'assigned_at': _datetime(assigned_at),
+            'creation_order': creation_order,
+            'lane': lane,
+            'assigned_to': assigned_to_id,
+        })
+        lines.append(line)
+        size += len(line) + 1
+        if size >= FLUSH_SIZE:
+            yield b'\n'.join(lines) + b'\n'
+            lines, size = [], 0
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def gzip_stream(chunks, level=6):
+    """Compress an iterable of byte chunks into a single gzip member as it is consumed."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
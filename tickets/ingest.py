@@ -0,0 +1,239 @@
+import codecs
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .events import record_events
+from .models import Ticket, TicketEvent
+from .notify import notify_tickets_created
+from .sequences import creation_order_allocator
+from .serializers import TicketSerializer
+from .stats import record_ticket_changes
+
+READ_SIZE = 64 * 1024
+# Characters one row (an NDJSON line or a JSON array element) may take.
+MAX_ROW_SIZE = 1024 * 1024
+
+
+class BulkPayloadError(Exception):
+    pass
+
+
+class MalformedRow:
+    def __init__(self, message):
+        self.message = message
+
+
+def _iter_text(stream, read_size=READ_SIZE):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        chunk = stream.read(read_size)
+        if not chunk:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(chunk)
+
+
+def _max_row_size():
+    return getattr(settings, 'TICKET_BULK_MAX_ROW_SIZE', MAX_ROW_SIZE)
+
+
+def iter_ndjson(stream, read_size=READ_SIZE, max_row_size=None):
+    """
+    Yield one decoded value per non-blank line; bad lines yield a MalformedRow.
+    A line longer than `max_row_size` characters is dropped as it streams in and
+    reported as a MalformedRow, so the buffer never grows past one row.
+    """
+    max_row_size = max_row_size or _max_row_size()
+    too_long = MalformedRow(f"Line is longer than {max_row_size} characters.")
+    pending, oversized = '', False
+    for text in _iter_text(stream, read_size):
+        pending += text
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            if oversized or len(line) > max_row_size:
+                # The first complete line ends the one being dropped.
+                oversized = False
+                yield too_long
+            elif line.strip():
+                yield _decode_line(line)
+        if len(pending) > max_row_size:
+            pending, oversized = '', True
+    if oversized:
+        yield too_long
+    elif pending.strip():
+        yield _decode_line(pending)
+
+
+def _decode_line(line):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return MalformedRow(f"Invalid JSON: {e.msg}.")
+
+
+def iter_json_array(stream, read_size=READ_SIZE, max_row_size=None):
+    """
+    Incrementally decode a top-level JSON array, yielding one element at a time
+    so only the current read buffer and element are held in memory. An element
+    larger than `max_row_size` characters stops the read with BulkPayloadError.
+    """
+    max_row_size = max_row_size or _max_row_size()
+    decoder = json.JSONDecoder()
+    chunks = _iter_text(stream, read_size)
+    buffer, pos, state = '', 0, 'open'
+
+    def fill():
+        nonlocal buffer, pos
+        if len(buffer) - pos > max_row_size:
+            raise BulkPayloadError(f"An array element is longer than {max_row_size} characters.")
+        text = next(chunks, None)
+        if text is None:
+            return False
+        buffer, pos = buffer[pos:] + text, 0
+        return True
+
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos >= len(buffer):
+            if fill():
+                continue
+            if state != 'done':
+                raise BulkPayloadError("Unexpected end of JSON array.")
+            return
+
+        char = buffer[pos]
+        if state == 'open':
+            if char != '[':
+                raise BulkPayloadError("Expected a JSON array.")
+            pos += 1
+            state = 'first'
+        elif state in ('first', 'value'):
+            if state == 'first' and char == ']':
+                pos += 1
+                state = 'done'
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if fill():
+                    continue
+                raise BulkPayloadError(f"Invalid JSON: {e.msg}.")
+            if end == len(buffer) and fill():
+                # A number may continue in the next read; decode again with more input.
+                continue
+            pos = end
+            state = 'separator'
+            yield value
+        elif state == 'separator':
+            if char == ',':
+                state = 'value'
+            elif char == ']':
+                state = 'done'
+            else:
+                raise BulkPayloadError("Expected ',' or ']' in JSON array.")
+            pos += 1
+        else:
+            raise BulkPayloadError("Unexpected data after JSON array.")
+
+
+def ingest_tickets(rows, user, chunk_size=None, max_errors=None, use_copy=None):
+    """
+    Validate rows with TicketSerializer and insert the valid ones chunk by chunk.
+    Invalid rows are reported by their index and never abort the batch; a broken
+    payload stops reading and is reported under 'detail'.
+    """
+    chunk_size = chunk_size or getattr(settings, 'TICKET_BULK_CHUNK_SIZE', 1000)
+    max_errors = max_errors if max_errors is not None else getattr(settings, 'TICKET_BULK_MAX_ERRORS', 1000)
+    if use_copy is None:
+        use_copy = getattr(settings, 'TICKET_BULK_USE_COPY', True)
+
+    result = {'created': 0, 'failed': 0, 'errors': []}
+    validator = TicketSerializer()
+    chunk = []
+
+    try:
+        for index, row in enumerate(rows):
+            try:
+                if isinstance(row, MalformedRow):
+                    raise serializers.ValidationError({'non_field_errors': [row.message]})
+                validated_data = validator.run_validation(row)
+            except serializers.ValidationError as e:
+                result['failed'] += 1
+                if len(result['errors']) < max_errors:
+                    result['errors'].append({'row': index, 'errors': e.detail})
+                continue
+
+            chunk.append(Ticket(created_by=user, **validated_data))
+            if len(chunk) >= chunk_size:
+                result['created'] += insert_tickets(chunk, use_copy=use_copy)
+                chunk = []
+    except BulkPayloadError as e:
+        # Rows decoded before the payload broke are still inserted and reported.
+        result['detail'] = str(e)
+
+    if chunk:
+        result['created'] += insert_tickets(chunk, use_copy=use_copy)
+
+    result['errors_truncated'] = result['failed'] > len(result['errors'])
+    return result
+
+
+def insert_tickets(tickets, use_copy=True):
+    using = router.db_for_write(Ticket)
+    with transaction.atomic(using=using):
+        if use_copy and connections[using].vendor == 'postgresql':
+            orders = _copy_tickets(tickets, using)
+            created = len(orders)
+            # COPY bypasses TicketQuerySet.bulk_create, which keeps the counters and the outbox otherwise.
+            record_ticket_changes([(None, (None, ticket.is_sold)) for ticket in tickets], using=using)
+            ticket_ids = Ticket.objects.using(using).filter(creation_order__in=orders).values_list('id', flat=True)
+            record_events([(TicketEvent.CREATED, ticket_id, None) for ticket_id in ticket_ids], using=using)
+        else:
+            created = len(Ticket.objects.using(using).bulk_create(tickets))
+        notify_tickets_created(created, using=using)
+    return created
+
+
+COPY_COLUMNS = ('subject', 'description', 'is_sold', 'created_by_id', 'created_at', 'updated_at', 'creation_order', 'lane')
+
+
+def _copy_tickets(tickets, using):
+    now = timezone.now()
+    orders = creation_order_allocator.allocate(len(tickets), using=using)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for ticket, order in zip(tickets, orders):
+        writer.writerow([
+            ticket.subject,
+            ticket.description,
+            't' if ticket.is_sold else 'f',
+            ticket.created_by_id if ticket.created_by_id is not None else '',
+            now.isoformat(),
+            now.isoformat(),
+            order,
+            ticket.lane,
+        ])
+    buffer.seek(0)
+
+    sql = (
+        f"COPY {Ticket._meta.db_table} ({', '.join(COPY_COLUMNS)}) "
+        f"FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (subject, description))"
+    )
+    with connections[using].cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            raw_cursor.copy_expert(sql, buffer)
+        else:
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    return orders
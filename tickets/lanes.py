@@ -0,0 +1,23 @@
+"""
+Queue lanes, highest priority first. Every ticket sits in one lane and every lane
+has its own partial queue index (see Ticket.Meta.indexes), so claims in different
+lanes never scan or lock the same index range.
+"""
+URGENT = 'urgent'
+TECHNICAL = 'technical'
+BILLING = 'billing'
+GENERAL = 'general'
+
+LANES = (URGENT, TECHNICAL, BILLING, GENERAL)
+LANE_CHOICES = [(lane, lane.title()) for lane in LANES]
+DEFAULT_LANE = GENERAL
+
+
+def agent_lanes(agent):
+    """The lanes an agent serves, in priority order. Agents without lanes serve every lane."""
+    if 'queue_lanes' in agent.get_deferred_fields():
+        # Token-authenticated users only carry their claims; read the rest from the row cache.
+        from users.authentication import get_full_user
+        agent = get_full_user(agent)
+    lanes = set(agent.queue_lanes or ())
+    return [lane for lane in LANES if lane in lanes] or list(LANES)
@@ -0,0 +1,32 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tickets.archive import archive_sold_tickets
+
+
+class Command(BaseCommand):
+    help = "Move sold tickets older than --days into the archive table in short batched transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=30,
+                            help="Archive sold tickets last updated more than this many days ago.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive.")
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        report = archive_sold_tickets(cutoff, options['batch_size'], options['max_batches'], options['pause'])
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f"archived {report['tickets']} tickets in {report['batches']} batches, {report['seconds']}s "
+            f"(longest batch {report['max_batch_seconds']}s)"
+        )
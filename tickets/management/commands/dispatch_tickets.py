@@ -0,0 +1,74 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from tickets.utils import needy_agents, assign_tickets_to_agent, dispatch_ticket_assignments
+
+
+class Command(BaseCommand):
+    help = "Fill every agent below the ticket cap from the unassigned queue in batched rounds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-tickets', type=int, default=15)
+        parser.add_argument('--agents-per-round', type=int, default=None,
+                            help="Limit how many agents one round (transaction) serves.")
+        parser.add_argument('--mode', choices=['dispatch', 'per-request'], default='dispatch',
+                            help="'per-request' calls assign_tickets_to_agent once per agent, for comparison.")
+        parser.add_argument('--loop', action='store_true', help="Keep dispatching every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=1.0)
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        while True:
+            if options['mode'] == 'dispatch':
+                report = self.dispatch(options)
+            else:
+                report = self.per_request(options)
+            self.print_report(report, options)
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def dispatch(self, options):
+        report = {'mode': 'dispatch', 'rounds': 0, 'transactions': 0, 'tickets': 0, 'agents': 0}
+        started = time.perf_counter()
+        while True:
+            result = dispatch_ticket_assignments(options['max_tickets'], options['agents_per_round'])
+            report['rounds'] += 1
+            report['transactions'] += 1
+            report['tickets'] += result['tickets']
+            report['agents'] += result['agents']
+            # Without a per-round agent limit one round already covers every agent.
+            if not result['tickets'] or not options['agents_per_round']:
+                break
+        return self.finish(report, started)
+
+    def per_request(self, options):
+        report = {'mode': 'per-request', 'rounds': 1, 'transactions': 0, 'tickets': 0, 'agents': 0}
+        started = time.perf_counter()
+        for agent in needy_agents(options['max_tickets'], options['agents_per_round']):
+            before = agent.open_tickets
+            tickets = assign_tickets_to_agent(agent, options['max_tickets'])
+            report['transactions'] += 1
+            if len(tickets) > before:
+                report['tickets'] += len(tickets) - before
+                report['agents'] += 1
+        return self.finish(report, started)
+
+    def finish(self, report, started):
+        elapsed = time.perf_counter() - started
+        report['seconds'] = round(elapsed, 4)
+        report['tickets_per_second'] = round(report['tickets'] / elapsed, 1) if elapsed else 0.0
+        return report
+
+    def print_report(self, report, options):
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f"{report['mode']}: assigned {report['tickets']} tickets to {report['agents']} agents "
+            f"in {report['transactions']} transactions ({report['rounds']} rounds), "
+            f"{report['seconds']}s, {report['tickets_per_second']} tickets/sec"
+        )
@@ -0,0 +1,36 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.events import prune_events
+
+
+class Command(BaseCommand):
+    help = "Drop expired ticket events and compact superseded ones in short batched transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention', type=int, default=None,
+                            help="Drop events older than this many seconds (default: TICKET_EVENTS_RETENTION, 0 keeps them).")
+        parser.add_argument('--compact-after', type=int, default=None,
+                            help="Drop events older than this many seconds that have a newer event for the same ticket "
+                                 "(default: TICKET_EVENTS_COMPACT_AFTER, 0 disables compaction).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive.")
+        retention, compact_after = (
+            None if options[name] is None else timedelta(seconds=options[name]) for name in ('retention', 'compact_after')
+        )
+        report = prune_events(retention, compact_after, options['batch_size'], options['max_batches'], options['pause'])
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f"dropped {report['expired']} expired and {report['compacted']} superseded events "
+            f"in {report['batches']} batches, {report['seconds']}s"
+        )
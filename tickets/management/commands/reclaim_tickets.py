@@ -0,0 +1,46 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.reaper import reclaim_stale_assignments
+
+
+class Command(BaseCommand):
+    help = "Return unsold tickets whose assignment lease expired (or whose agent was deactivated) to the queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lease', type=float, default=None,
+                            help="Lease in seconds (default: TICKET_ASSIGNMENT_LEASE).")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Tickets per transaction (default: TICKET_REAPER_BATCH_SIZE).")
+        parser.add_argument('--max-batches', type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--no-inactive', action='store_true',
+                            help="Only use the lease; leave tickets of deactivated agents alone.")
+        parser.add_argument('--loop', action='store_true', help="Keep reclaiming every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=60.0)
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive.")
+        lease = timedelta(seconds=options['lease']) if options['lease'] is not None else None
+        while True:
+            report = reclaim_stale_assignments(
+                lease, options['batch_size'], options['max_batches'], options['pause'], not options['no_inactive'],
+            )
+            self.print_report(report, options)
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+
+    def print_report(self, report, options):
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f"reclaimed {report['tickets']} tickets from {report['agents']} agents in {report['batches']} batches, "
+            f"{report['seconds']}s (longest batch {report['max_batch_seconds']}s, {report['lock_seconds']}s in transactions)"
+        )
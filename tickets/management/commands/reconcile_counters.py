@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from tickets.stats import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-agent and global ticket counters from the ticket and archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        report = reconcile_counters()
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f"rebuilt {report['scopes']} counters ({report['drifted']} had drifted) in {report['seconds']}s: "
+            f"queue depth {report['queue_depth']}, {report['sold']} sold"
+        )
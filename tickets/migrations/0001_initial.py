@@ -0,0 +1,30 @@
+# Generated by Django 5.0.11 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ticket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('is_sold', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assigned_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('creation_order', models.PositiveIntegerField(db_index=True, editable=False, unique=True)),
+            ],
+            options={
+                'ordering': ['created_at', 'creation_order'],
+            },
+        ),
+    ]
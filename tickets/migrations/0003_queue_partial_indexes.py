@@ -0,0 +1,27 @@
+# Generated by Django 5.0.11 on 2026-10-18 13:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='tickets_tic_assigne_b8bff2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True), ('is_sold', False)), fields=['created_at', 'creation_order'], include=('id',), name='ticket_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('is_sold', False)), fields=['assigned_to', 'created_at', 'creation_order'], name='ticket_agent_open_idx'),
+        ),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.0.11 on 2026-10-18 13:42
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, transaction
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({row}subject, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}description, '')), 'B')"
+)
+
+CREATE_TRIGGER = [
+    f"""
+    CREATE OR REPLACE FUNCTION tickets_ticket_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        -- Only recompute when the text changes, so assignment and sale updates stay cheap.
+        IF TG_OP = 'INSERT' OR NEW.search_vector IS NULL
+           OR NEW.subject IS DISTINCT FROM OLD.subject
+           OR NEW.description IS DISTINCT FROM OLD.description THEN
+            NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tickets_ticket_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON tickets_ticket
+    FOR EACH ROW EXECUTE FUNCTION tickets_ticket_search_vector_update()
+    """,
+]
+
+DROP_TRIGGER = [
+    "DROP TRIGGER IF EXISTS tickets_ticket_search_vector_trigger ON tickets_ticket",
+    "DROP FUNCTION IF EXISTS tickets_ticket_search_vector_update()",
+]
+
+# Built concurrently so writes to the ticket table carry on during the build.
+CREATE_INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ticket_search_idx ON tickets_ticket USING gin (search_vector)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ticket_subject_trgm_idx ON tickets_ticket USING gin (subject gin_trgm_ops)",
+]
+
+DROP_INDEXES = [
+    "DROP INDEX CONCURRENTLY IF EXISTS ticket_subject_trgm_idx",
+    "DROP INDEX CONCURRENTLY IF EXISTS ticket_search_idx",
+]
+
+BACKFILL_BATCH_SIZE = 10000
+
+BACKFILL_BATCH = f"""
+    WITH batch AS (
+        SELECT id FROM tickets_ticket WHERE id > %s ORDER BY id LIMIT %s
+    )
+    UPDATE tickets_ticket SET search_vector = {SEARCH_VECTOR.format(row='')}
+    WHERE id IN (SELECT id FROM batch)
+    RETURNING id
+"""
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+def run_each_on_postgresql(statements):
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block.
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def backfill_search_vector(apps, schema_editor):
+    """
+    Fill search_vector for existing rows in id order, BACKFILL_BATCH_SIZE rows per
+    committed transaction, so no single statement rewrites and locks the whole table.
+    Rows written meanwhile are covered by the trigger, which is already in place.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    last_id = 0
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(BACKFILL_BATCH, [last_id, BACKFILL_BATCH_SIZE])
+            ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return
+        last_id = max(ids)
+
+
+class Migration(migrations.Migration):
+    # The backfill commits per batch and the indexes are built concurrently.
+    atomic = False
+
+    dependencies = [
+        ('tickets', '0004_archived_tickets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Trigger-maintained tsvector with a GIN index, plus a trigram index for subject
+        # substring matches. PostgreSQL only; other backends fall back to LIKE.
+        migrations.RunPython(run_on_postgresql(CREATE_TRIGGER), run_on_postgresql(DROP_TRIGGER)),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        # CREATE EXTENSION pg_trgm needs the CREATE privilege on the database (or a
+        # superuser on PostgreSQL < 13, where pg_trgm is not a trusted extension). If
+        # the migration role lacks it, have a superuser run "CREATE EXTENSION pg_trgm"
+        # first; the operation is skipped when the extension already exists.
+        TrigramExtension(),
+        migrations.RunPython(run_each_on_postgresql(CREATE_INDEXES), run_each_on_postgresql(DROP_INDEXES)),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.0.11 on 2026-10-18 13:52
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    # Start the counters from the existing tickets; reconcile_counters repairs any later drift.
+    # The counting is spelled out here (not imported from tickets.stats) so this migration
+    # keeps working however the app code changes. Scope 0 is the global row: open counts
+    # the unassigned queue, sold every sale; agent rows count their open and sold tickets.
+    using = schema_editor.connection.alias
+    TicketCounter = apps.get_model('tickets', 'TicketCounter')
+    counts = defaultdict(lambda: [0, 0])
+    rows = apps.get_model('tickets', 'Ticket')._base_manager.using(using).values('assigned_to_id', 'is_sold').annotate(n=Count('id')).order_by()
+    for row in rows:
+        agent_id, n = row['assigned_to_id'], row['n']
+        if not row['is_sold']:
+            counts[agent_id or 0][0] += n
+            continue
+        counts[0][1] += n
+        if agent_id:
+            counts[agent_id][1] += n
+    rows = apps.get_model('tickets', 'ArchivedTicket')._base_manager.using(using).values('assigned_to_id').annotate(n=Count('id')).order_by()
+    for row in rows:
+        counts[0][1] += row['n']
+        if row['assigned_to_id']:
+            counts[row['assigned_to_id']][1] += row['n']
+    TicketCounter.objects.using(using).bulk_create([
+        TicketCounter(scope=scope, shard=0, open_tickets=open_tickets, sold_tickets=sold)
+        for scope, (open_tickets, sold) in sorted(counts.items())
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_ticket_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.BigIntegerField()),
+                ('shard', models.SmallIntegerField(default=0)),
+                ('open_tickets', models.BigIntegerField(default=0)),
+                ('sold_tickets', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TicketHourlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('shard', models.SmallIntegerField(default=0)),
+                ('assigned', models.BigIntegerField(default=0)),
+                ('sold', models.BigIntegerField(default=0)),
+                ('sale_latency_seconds', models.FloatField(default=0.0)),
+            ],
+            options={
+                'ordering': ['hour'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ticketcounter',
+            constraint=models.UniqueConstraint(fields=('scope', 'shard'), name='ticket_counter_scope_shard'),
+        ),
+        migrations.AddConstraint(
+            model_name='tickethourlystats',
+            constraint=models.UniqueConstraint(fields=('hour', 'shard'), name='ticket_hourly_stats_hour_shard'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
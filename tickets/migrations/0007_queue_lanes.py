@@ -0,0 +1,46 @@
+# Generated by Django 5.0.11 on 2026-10-18 14:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_ticket_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedticket',
+            name='lane',
+            field=models.CharField(choices=[('urgent', 'Urgent'), ('technical', 'Technical'), ('billing', 'Billing'), ('general', 'General')], default='general', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='lane',
+            field=models.CharField(choices=[('urgent', 'Urgent'), ('technical', 'Technical'), ('billing', 'Billing'), ('general', 'General')], default='general', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True), ('is_sold', False), ('lane', 'urgent')), fields=['created_at', 'creation_order'], include=('id',), name='ticket_queue_urgent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True), ('is_sold', False), ('lane', 'technical')), fields=['created_at', 'creation_order'], include=('id',), name='ticket_queue_technical_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True), ('is_sold', False), ('lane', 'billing')), fields=['created_at', 'creation_order'], include=('id',), name='ticket_queue_billing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True), ('is_sold', False), ('lane', 'general')), fields=['created_at', 'creation_order'], include=('id',), name='ticket_queue_general_idx'),
+        ),
+        # Dropped last so the queue is never without an index.
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_queue_idx',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.11 on 2026-10-18 14:11
+
+import django.utils.timezone
+import tickets.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_queue_lanes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('assigned', 'Assigned'), ('released', 'Released'), ('sold', 'Sold'), ('deleted', 'Deleted'), ('archived', 'Archived')], max_length=16)),
+                ('ticket_id', models.BigIntegerField()),
+                ('agent_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('txid', models.BigIntegerField(db_default=tickets.models.TransactionId(), editable=False)),
+            ],
+            options={
+                'ordering': ['txid', 'id'],
+                'indexes': [models.Index(fields=['txid', 'id'], name='ticket_event_feed_idx'), models.Index(fields=['ticket_id', 'id'], name='ticket_event_ticket_idx')],
+            },
+        ),
+    ]
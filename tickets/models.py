@@ -1,8 +1,52 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, router, transaction
 from django.conf import settings
-from django.db.models import Max
 from django.utils import timezone
 
+from .batch_cache import evict_batch_versions
+from .lanes import DEFAULT_LANE, LANE_CHOICES, LANES
+from .sequences import creation_order_allocator
+
+
+class TicketQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        from .events import record_events
+        from .stats import record_ticket_changes
+
+        objs = list(objs)
+        pending = [obj for obj in objs if not obj.pk and not obj.creation_order]
+        if pending:
+            orders = creation_order_allocator.allocate(len(pending), using=self.db)
+            for obj, order in zip(pending, orders):
+                obj.creation_order = order
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            record_ticket_changes([(None, (obj.assigned_to_id, obj.is_sold)) for obj in created], using=self.db)
+            # ignore_conflicts leaves the pk unset; those rows may not have been inserted.
+            record_events([(TicketEvent.CREATED, obj.pk, obj.assigned_to_id) for obj in created if obj.pk], using=self.db)
+        return created
+
+    def delete(self, event_type=None):
+        """Delete the tickets, recording `event_type` (default TicketEvent.DELETED) for each."""
+        from .events import record_events
+        from .stats import record_ticket_changes
+
+        with transaction.atomic(using=self.db):
+            rows = list(self.values_list('id', 'assigned_to_id', 'is_sold'))
+            # Archived sold tickets stay on record (in the archive table), so they keep their sold counts.
+            archived = event_type == TicketEvent.ARCHIVED
+            record_ticket_changes(
+                [((agent_id, is_sold), None) for _, agent_id, is_sold in rows if not (archived and is_sold)], using=self.db,
+            )
+            record_events([(event_type or TicketEvent.DELETED, ticket_id, agent_id) for ticket_id, agent_id, _ in rows], using=self.db)
+            return super().delete()
+
+
+class TicketManager(models.Manager.from_queryset(TicketQuerySet)):
+    def get_queryset(self):
+        # search_vector is only used in WHERE / ORDER BY; don't ship it with every row.
+        return super().get_queryset().defer('search_vector')
+
 
 class Ticket(models.Model):
     subject = models.CharField(max_length=255)
@@ -14,18 +58,187 @@ class Ticket(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     assigned_at = models.DateTimeField(null=True, blank=True, db_index=True)
     creation_order = models.PositiveIntegerField(editable=False, db_index=True, unique=True)
+    lane = models.CharField(max_length=16, choices=LANE_CHOICES, default=DEFAULT_LANE)
+    # Weighted subject (A) + description (B) tsvector, kept up to date by a PostgreSQL
+    # trigger (migration 0005). Always NULL on other backends.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = TicketManager()
+
+    # Columns raw SQL selects for Ticket instances: everything but search_vector.
+    READ_COLUMNS = (
+        'id', 'subject', 'description', 'created_by_id', 'assigned_to_id', 'is_sold',
+        'created_at', 'updated_at', 'assigned_at', 'creation_order', 'lane',
+    )
 
     class Meta:
         ordering = ['created_at', 'creation_order']
-        indexes = [models.Index(fields=['assigned_to', 'is_sold', 'created_at', 'creation_order'])]
+        indexes = [
+            # Head of each lane's FIFO queue: only unassigned, unsold rows of that lane, so it stays
+            # O(queue) as history grows and claims in different lanes touch different indexes.
+            *[
+                models.Index(fields=['created_at', 'creation_order'], include=['id'], condition=models.Q(assigned_to__isnull=True, is_sold=False, lane=lane), name=f'ticket_queue_{lane}_idx')
+                for lane in LANES
+            ],
+            # An agent's open batch, read on every fetch-tickets call.
+            models.Index(fields=['assigned_to', 'created_at', 'creation_order'], condition=models.Q(is_sold=False), name='ticket_agent_open_idx'),
+            # Oldest sold tickets first, for archive_tickets.
+            models.Index(fields=['updated_at'], condition=models.Q(is_sold=True), name='ticket_sold_idx'),
+            # Every ticket in list order: the admin changelist's keyset pages.
+            models.Index(fields=['created_at', 'creation_order'], name='ticket_order_idx'),
+        ]
 
     def save(self, *args, **kwargs):
+        from .events import change_type, record_events
+        from .stats import record_ticket_changes
+
+        using = kwargs.get('using') or router.db_for_write(Ticket, instance=self)
         if not self.pk and not self.creation_order:
-            max_order = Ticket.objects.aggregate(Max('creation_order'))['creation_order__max'] or 0
-            self.creation_order = max_order + 1
-        super().save(*args, **kwargs)
+            self.creation_order = creation_order_allocator.allocate(using=using)[0]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'assigned_to', 'assigned_to_id', 'is_sold'} & set(update_fields):
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+                record_events([(TicketEvent.UPDATED, self.pk, self.assigned_to_id)], using=using)
+            return
+        with transaction.atomic(using=using):
+            # The counters move from the row's committed state, not from whatever
+            # this instance was loaded with.
+            before = None
+            if not self._state.adding:
+                before = Ticket.objects.using(using).select_for_update().filter(pk=self.pk).values_list('assigned_to_id', 'is_sold').first()
+            super().save(*args, **kwargs)
+            after = (self.assigned_to_id, self.is_sold)
+            if before and update_fields is not None:
+                after = (
+                    self.assigned_to_id if 'assigned_to' in update_fields or 'assigned_to_id' in update_fields else before[0],
+                    self.is_sold if 'is_sold' in update_fields else before[1],
+                )
+            record_ticket_changes([(before, after)], using=using)
+            record_events([(change_type(before, after), self.pk, after[0])], using=using)
+
+    def delete(self, *args, **kwargs):
+        from .events import record_events
+        from .stats import record_ticket_changes
+
+        using = kwargs.get('using') or router.db_for_write(Ticket, instance=self)
+        with transaction.atomic(using=using):
+            before = Ticket.objects.using(using).select_for_update().filter(pk=self.pk).values_list('assigned_to_id', 'is_sold').first()
+            record_ticket_changes([(before, None)], using=using)
+            if before is not None:
+                record_events([(TicketEvent.DELETED, self.pk, before[0])], using=using)
+            return super().delete(*args, **kwargs)
 
     def assign_to_agent(self, agent):
+        previous_agent_id = self.assigned_to_id
         self.assigned_to = agent
         self.assigned_at = timezone.now()
         self.save(update_fields=['assigned_to', 'assigned_at'])
+        evict_batch_versions(previous_agent_id, self.assigned_to_id)
+
+
+class ArchivedTicket(models.Model):
+    """
+    A sold ticket moved out of tickets_ticket by the archive_tickets command, so the
+    hot table and its indexes only hold live history. Keeps the original id and
+    creation_order; rows are never modified.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    subject = models.CharField(max_length=255)
+    description = models.TextField()
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='archived_created_tickets', null=True, blank=True)
+    assigned_to = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='archived_tickets')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    assigned_at = models.DateTimeField(null=True, blank=True)
+    creation_order = models.PositiveIntegerField(unique=True)
+    lane = models.CharField(max_length=16, choices=LANE_CHOICES, default=DEFAULT_LANE)
+    archived_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    # Only sold tickets are archived.
+    is_sold = True
+
+    class Meta:
+        ordering = ['created_at', 'creation_order']
+        indexes = [
+            models.Index(fields=['created_at', 'creation_order'], name='archived_ticket_order_idx'),
+        ]
+
+
+class TicketCounter(models.Model):
+    """
+    Running ticket counts, changed by tickets.stats in the same transaction as the
+    tickets they count. `scope` is an agent id (open: the agent's unsold tickets,
+    sold: tickets the agent sold) or GLOBAL_SCOPE (open: queue depth, sold: all
+    tickets sold). Global counts are spread over TICKET_COUNTER_SHARDS rows so
+    concurrent writers don't queue up on one row; readers sum the shards.
+    """
+    GLOBAL_SCOPE = 0
+
+    scope = models.BigIntegerField()
+    shard = models.SmallIntegerField(default=0)
+    open_tickets = models.BigIntegerField(default=0)
+    sold_tickets = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'shard'], name='ticket_counter_scope_shard'),
+        ]
+
+
+class TicketHourlyStats(models.Model):
+    """Assignments, sales and summed assignment-to-sale latency per hour, sharded like TicketCounter."""
+    hour = models.DateTimeField()
+    shard = models.SmallIntegerField(default=0)
+    assigned = models.BigIntegerField(default=0)
+    sold = models.BigIntegerField(default=0)
+    sale_latency_seconds = models.FloatField(default=0.0)
+
+    class Meta:
+        ordering = ['hour']
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'shard'], name='ticket_hourly_stats_hour_shard'),
+        ]
+
+
+class TransactionId(models.Func):
+    """txid_current() on PostgreSQL: the id of the transaction writing the row. 0 on other backends."""
+    function = 'txid_current'
+    output_field = models.BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return '0', []
+
+
+class TicketEvent(models.Model):
+    """
+    Outbox of ticket changes, written by tickets.events in the same transaction
+    as the change, and read in commit order through GET /api/events/. Rows only
+    hold ids: consumers fetch the ticket itself if they need more. ticket_id is
+    not a foreign key so events outlive deleted and archived tickets.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    ASSIGNED = 'assigned'
+    RELEASED = 'released'
+    SOLD = 'sold'
+    DELETED = 'deleted'
+    ARCHIVED = 'archived'
+    TYPE_CHOICES = [(value, value.title()) for value in (CREATED, UPDATED, ASSIGNED, RELEASED, SOLD, DELETED, ARCHIVED)]
+
+    type = models.CharField(max_length=16, choices=TYPE_CHOICES)
+    ticket_id = models.BigIntegerField()
+    agent_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Readers order by (txid, id) and only see transactions older than every one
+    # still running, so an event can't show up behind a cursor that passed it.
+    txid = models.BigIntegerField(db_default=TransactionId(), editable=False)
+
+    class Meta:
+        ordering = ['txid', 'id']
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='ticket_event_feed_idx'),
+            # Newer events of the same ticket, for compaction.
+            models.Index(fields=['ticket_id', 'id'], name='ticket_event_ticket_idx'),
+        ]
+
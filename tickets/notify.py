@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import select
+import threading
+import time
+
+from django.db import connections, router, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'tickets_available'
+EVENTS_CHANNEL = 'ticket_events'
+
+
+class TicketNotifier:
+    """
+    Parks long-polling requests until new tickets are committed.
+
+    Waiters are coroutines on any event loop in this process. On PostgreSQL one
+    background thread per process holds a single LISTEN connection and relays
+    NOTIFY payloads; other backends are notified in-process after commit.
+    """
+
+    def __init__(self, channel=CHANNEL):
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._waiters = {}
+        self._generation = 0
+        self._listener = None
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def notify(self, count=None):
+        """Wake the `count` longest-waiting requests, or all of them when count is None."""
+        with self._lock:
+            self._generation += 1
+            keys = list(self._waiters)
+            if count is not None:
+                keys = keys[:count]
+            woken = [self._waiters.pop(key) for key in keys]
+        for loop, future in woken:
+            loop.call_soon_threadsafe(_wake, future)
+
+    async def wait(self, since, timeout):
+        """
+        Wait up to `timeout` seconds for a notification newer than generation `since`.
+        Returns True when woken and False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = object()
+        with self._lock:
+            if self._generation != since:
+                return True
+            self._waiters[key] = (loop, future)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.pop(key, None)
+
+    def start_listener(self, using='default'):
+        if connections[using].vendor != 'postgresql':
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, args=(using,), name=f'{self.channel}-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self, using):
+        wrapper = connections[using]
+        while True:
+            try:
+                connection = wrapper.get_new_connection(wrapper.get_connection_params())
+                connection.autocommit = True
+                connection.cursor().execute(f'LISTEN {self.channel}')
+                # Notifications sent while we were disconnected are lost; let everyone re-check.
+                self.notify()
+                if callable(getattr(connection, 'notifies', None)):
+                    for notification in connection.notifies():
+                        self.notify(_payload_count(notification.payload))
+                else:
+                    while True:
+                        if select.select([connection], [], [], 60) == ([], [], []):
+                            continue
+                        connection.poll()
+                        while connection.notifies:
+                            self.notify(_payload_count(connection.notifies.pop(0).payload))
+            except Exception:
+                logger.exception("Ticket notification listener lost its connection; reconnecting.")
+                time.sleep(1)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(True)
+
+
+def _payload_count(payload):
+    try:
+        return int(payload)
+    except (TypeError, ValueError):
+        return None
+
+
+ticket_notifier = TicketNotifier()
+# Wakes GET /api/events/ long-polls when outbox events commit.
+event_notifier = TicketNotifier(EVENTS_CHANNEL)
+
+
+def notify_tickets_created(count=None, using=None):
+    """Announce `count` new unassigned tickets once the current transaction commits."""
+    from .models import Ticket
+
+    using = using or router.db_for_write(Ticket)
+    if connections[using].vendor == 'postgresql':
+        # NOTIFY is transactional: listeners only hear it if the insert commits.
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, '' if count is None else str(count)])
+    else:
+        transaction.on_commit(lambda: ticket_notifier.notify(count), using=using)
+
+
+def notify_events(using=None):
+    """Wake every event feed long-poll once the current transaction commits."""
+    from .models import TicketEvent
+
+    using = using or router.db_for_write(TicketEvent)
+    if connections[using].vendor == 'postgresql':
+        # Repeated identical notifications in one transaction are delivered once.
+        with connections[using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [EVENTS_CHANNEL, ''])
+    else:
+        transaction.on_commit(event_notifier.notify, using=using)
+
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .batch_cache import evict_batch_versions
+from .events import record_events
+from .models import Ticket, TicketEvent
+from .notify import notify_tickets_created
+from .stats import record_reclaimed
+from .utils import _use_sql
+
+logger = logging.getLogger(__name__)
+
+
+def reclaim_stale_assignments(lease=None, batch_size=None, max_batches=None, pause=0.0, include_inactive=True):
+    """
+    Return unsold tickets assigned longer than `lease` ago (and, with
+    include_inactive, every unsold ticket of a deactivated agent) to the queue.
+
+    Tickets keep their created_at and creation_order, so they go back to their
+    original place in the FIFO queue. Each batch is one short transaction that
+    skips rows locked by a concurrent fetch or sell. Returns a report with the
+    tickets reclaimed, the agents they came from and the longest batch duration.
+    """
+    lease = timedelta(seconds=getattr(settings, 'TICKET_ASSIGNMENT_LEASE', 14400)) if lease is None else lease
+    batch_size = batch_size or getattr(settings, 'TICKET_REAPER_BATCH_SIZE', 500)
+    using = router.db_for_write(Ticket)
+    cutoff = timezone.now() - lease
+    report = {'batches': 0, 'tickets': 0, 'agents': 0, 'max_batch_seconds': 0.0, 'lock_seconds': 0.0}
+    agents = set()
+    started = time.perf_counter()
+    while max_batches is None or report['batches'] < max_batches:
+        batch_started = time.perf_counter()
+        agent_ids = reclaim_batch(cutoff, batch_size, include_inactive, using)
+        elapsed = time.perf_counter() - batch_started
+        report['max_batch_seconds'] = max(report['max_batch_seconds'], elapsed)
+        report['lock_seconds'] += elapsed
+        if not agent_ids:
+            break
+        report['batches'] += 1
+        report['tickets'] += len(agent_ids)
+        agents.update(agent_ids)
+        evict_batch_versions(*set(agent_ids), using=using)
+        notify_tickets_created(len(agent_ids), using=using)
+        if len(agent_ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    report['agents'] = len(agents)
+    report['seconds'] = round(time.perf_counter() - started, 4)
+    report['max_batch_seconds'] = round(report['max_batch_seconds'], 4)
+    report['lock_seconds'] = round(report['lock_seconds'], 4)
+    return report
+
+
+def reclaim_batch(cutoff, batch_size, include_inactive, using):
+    """Reclaim one batch; returns the previous agent id of every reclaimed ticket."""
+    if _use_sql(using):
+        return _reclaim_batch_sql(cutoff, batch_size, include_inactive, using)
+    return _reclaim_batch_orm(cutoff, batch_size, include_inactive, using)
+
+
+def _reclaim_batch_sql(cutoff, batch_size, include_inactive, using):
+    table = Ticket._meta.db_table
+    user_table = get_user_model()._meta.db_table
+    inactive = f' OR assigned_to_id IN (SELECT id FROM {user_table} WHERE is_active = false)' if include_inactive else ''
+    # The outer reference to assigned_to_id in RETURNING would read the new (NULL)
+    # value, so the previous owner is carried through the locked subquery.
+    sql = f"""
+        UPDATE {table} t
+        SET assigned_to_id = NULL, assigned_at = NULL, updated_at = %(now)s
+        FROM (
+            SELECT id, assigned_to_id FROM {table}
+            WHERE is_sold = false AND assigned_to_id IS NOT NULL
+              AND (assigned_at < %(cutoff)s{inactive})
+            ORDER BY assigned_at
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        ) stale
+        WHERE t.id = stale.id
+        RETURNING t.id, stale.assigned_to_id
+    """
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(sql, {'cutoff': cutoff, 'limit': batch_size, 'now': timezone.now()})
+        rows = cursor.fetchall()
+        agent_ids = [agent_id for _, agent_id in rows]
+        record_reclaimed(agent_ids, using=using)
+        record_events([(TicketEvent.RELEASED, ticket_id, agent_id) for ticket_id, agent_id in rows], using=using)
+    return agent_ids
+
+
+def _reclaim_batch_orm(cutoff, batch_size, include_inactive, using):
+    stale = Q(assigned_at__lt=cutoff)
+    if include_inactive:
+        stale |= Q(assigned_to__in=get_user_model().objects.filter(is_active=False).values('id'))
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        rows = list(
+            Ticket.objects.using(using).select_for_update(skip_locked=True)
+            .filter(stale, is_sold=False, assigned_to__isnull=False).order_by('assigned_at')
+            .values_list('id', 'assigned_to_id')[:batch_size]
+        )
+        Ticket.objects.using(using).filter(id__in=[ticket_id for ticket_id, _ in rows]).update(assigned_to=None, assigned_at=None, updated_at=now)
+        agent_ids = [agent_id for _, agent_id in rows]
+        record_reclaimed(agent_ids, using=using)
+        record_events([(TicketEvent.RELEASED, ticket_id, agent_id) for ticket_id, agent_id in rows], using=using)
+    return agent_ids
+
+
+class StaleAssignmentReaper:
+    """
+    Runs reclaim_stale_assignments() every `interval` seconds on a daemon thread.
+    Safe to run in every worker process: concurrent runs skip each other's rows.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_report = None
+
+    def start(self, interval=None):
+        interval = getattr(settings, 'TICKET_REAPER_INTERVAL', 0) if interval is None else interval
+        if not interval:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='ticket-reaper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.last_report = reclaim_stale_assignments()
+            except Exception:
+                logger.exception("Stale assignment reaper run failed")
+            finally:
+                # This thread's connections would otherwise stay open between runs.
+                connections.close_all()
+
+
+stale_assignment_reaper = StaleAssignmentReaper()
@@ -0,0 +1,56 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.db.models.lookups import IContains
+
+SEARCH_CONFIG = 'english'
+
+
+class TrigramIContains(IContains):
+    """
+    icontains that PostgreSQL compiles to a bare `column ILIKE '%q%'`. The stock
+    lookup is UPPER(column::text) LIKE UPPER(...), which a gin_trgm_ops index on
+    the column can't serve. Other backends get the stock icontains.
+    """
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = compiler.compile(self.lhs)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} ILIKE {rhs}', (*lhs_params, *rhs_params)
+
+
+def search_tickets(queryset, q):
+    """
+    Filter a Ticket queryset down to matches for the free-text query `q` and
+    annotate every row with a `rank` (higher is better).
+
+    On PostgreSQL this is a websearch_to_tsquery() match on the GIN-indexed
+    search_vector, OR-ed with a subject substring match served by the trigram
+    index. Other backends (SQLite in tests) fall back to LIKE on subject and
+    description, ranking subject matches first.
+    """
+    q = q.strip()
+    condition = search_condition(queryset, q)
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(q, search_type='websearch', config=SEARCH_CONFIG)
+        # ts_rank() is a float4; widen it so cursor values round-trip exactly.
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+    else:
+        rank = Case(When(subject__icontains=q, then=Value(1.0)), default=Value(0.5), output_field=FloatField())
+    return queryset.filter(condition).annotate(rank=rank)
+
+
+def search_condition(queryset, q):
+    """The Q() that search_tickets() filters on, for callers that add their own terms."""
+    q = q.strip()
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(q, search_type='websearch', config=SEARCH_CONFIG)
+        # Both sides are index-backed (ticket_search_idx, ticket_subject_trgm_idx),
+        # so the planner can BitmapOr them instead of filtering every row.
+        return Q(search_vector=query) | Q(TrigramIContains(F('subject'), q))
+
+    condition = Q()
+    for term in q.split():
+        condition &= Q(subject__icontains=term) | Q(description__icontains=term)
+    return condition
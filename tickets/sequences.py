@@ -0,0 +1,133 @@
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+CREATION_ORDER_SEQUENCE = 'tickets_ticket_creation_order_seq'
+
+
+class CreationOrderAllocator:
+    """
+    Hands out Ticket.creation_order values without a MAX() scan per insert.
+
+    On Postgres every nextval() on the sequence reserves a whole block of
+    `block_size` values (the sequence is created with INCREMENT BY block_size),
+    so single inserts are served from memory and bulk paths reserve all the
+    blocks they need in one round trip. Other backends (SQLite in tests) fall
+    back to MAX() + 1 guarded by a process-level high-water mark.
+    """
+
+    def __init__(self, block_size=None):
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._blocks = {}
+        self._high_water = {}
+
+    @property
+    def block_size(self):
+        return self._block_size or getattr(settings, 'TICKET_CREATION_ORDER_BLOCK_SIZE', 50)
+
+    def allocate(self, count=1, using='default'):
+        """Return a list of `count` unused, increasing creation_order values."""
+        if count <= 0:
+            return []
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Blocks reserved before a fork must not be shared by the children.
+                self._blocks.clear()
+                self._high_water.clear()
+                self._pid = os.getpid()
+
+            if connections[using].vendor != 'postgresql':
+                return self._allocate_fallback(count, using)
+            return self._allocate_from_blocks(count, using)
+
+    def _allocate_from_blocks(self, count, using):
+        values = []
+        start, end = self._blocks.get(using, (0, 0))
+
+        while len(values) < count:
+            if start >= end:
+                missing = count - len(values)
+                block_starts = self._reserve_blocks(-(-missing // self.block_size), using)
+                for block_start in block_starts[:-1]:
+                    values.extend(range(block_start, block_start + self.block_size))
+                start, end = block_starts[-1], block_starts[-1] + self.block_size
+                continue
+            take = min(end - start, count - len(values))
+            values.extend(range(start, start + take))
+            start += take
+
+        self._blocks[using] = (start, end)
+        return values[:count]
+
+    def _reserve_blocks(self, blocks, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(%s) FROM generate_series(1, %s)',
+                [CREATION_ORDER_SEQUENCE, blocks],
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+
+    def _allocate_fallback(self, count, using):
+        from .models import ArchivedTicket, Ticket
+
+        # Archived tickets keep their creation_order, so they count too.
+        current = max(
+            model.objects.using(using).order_by('-creation_order').values_list('creation_order', flat=True).first() or 0
+            for model in (Ticket, ArchivedTicket)
+        )
+        start = max(current, self._high_water.get(using, 0)) + 1
+        self._high_water[using] = start + count - 1
+        return list(range(start, start + count))
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+            self._high_water.clear()
+
+
+creation_order_allocator = CreationOrderAllocator()
+
+
+def create_creation_order_sequence(using='default', **kwargs):
+    """
+    Create (or resize) the Postgres sequence backing creation_order.
+
+    Connected to post_migrate, so it also runs when the test database is built.
+    A new sequence starts after the highest creation_order already stored,
+    archived tickets included.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+
+    block_size = int(creation_order_allocator.block_size)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('tickets_ticket')")
+        if cursor.fetchone()[0] is None:
+            return
+        cursor.execute('SELECT COALESCE(MAX(creation_order), 0) + 1 FROM tickets_ticket')
+        start = cursor.fetchone()[0]
+        cursor.execute("SELECT to_regclass('tickets_archivedticket')")
+        if cursor.fetchone()[0] is not None:
+            cursor.execute('SELECT COALESCE(MAX(creation_order), 0) + 1 FROM tickets_archivedticket')
+            start = max(start, cursor.fetchone()[0])
+        cursor.execute(
+            f'CREATE SEQUENCE IF NOT EXISTS {CREATION_ORDER_SEQUENCE} '
+            f'INCREMENT BY {block_size} START WITH {int(start)}'
+        )
+        cursor.execute(
+            'SELECT increment_by, last_value FROM pg_sequences WHERE sequencename = %s',
+            [CREATION_ORDER_SEQUENCE],
+        )
+        increment_by, last_value = cursor.fetchone()
+        if increment_by != block_size:
+            # Skip past the last block handed out so a smaller block size can't overlap it.
+            cursor.execute(f'ALTER SEQUENCE {CREATION_ORDER_SEQUENCE} INCREMENT BY {block_size}')
+            if last_value is not None:
+                cursor.execute('SELECT setval(%s, %s, false)', [CREATION_ORDER_SEQUENCE, last_value + increment_by])
+    creation_order_allocator.reset()
@@ -1,3 +1,4 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Ticket
 
@@ -5,7 +6,7 @@ class TicketSerializer(serializers.ModelSerializer):
     created_by = serializers.SerializerMethodField()
     class Meta:
         model = Ticket
-        fields = '__all__'
+        exclude = ['search_vector']
         read_only_fields = ['created_by', 'assigned_to', 'assigned_at']
 
     def create(self, validated_data):
@@ -20,3 +21,132 @@ class TicketSerializer(serializers.ModelSerializer):
             "id": obj.created_by.id,
             "username": obj.created_by.username,
         } if obj.created_by else None
+
+
+def _datetime(value):
+    # Same output as DRF's DateTimeField (ISO 8601, UTC as 'Z') without the field machinery.
+    if value is None:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _created_by(obj):
+    created_by = obj.created_by
+    return {
+        "id": created_by.id,
+        "username": created_by.username,
+    } if created_by else None
+
+
+# TicketReadSerializer fields, in output order. Each is read from the Ticket field of the same name.
+_FIELD_READERS = {
+    'id': lambda obj: obj.id,
+    'created_by': _created_by,
+    'subject': lambda obj: obj.subject,
+    'description': lambda obj: obj.description,
+    'is_sold': lambda obj: obj.is_sold,
+    'created_at': lambda obj: _datetime(obj.created_at),
+    'updated_at': lambda obj: _datetime(obj.updated_at),
+    'assigned_at': lambda obj: _datetime(obj.assigned_at),
+    'creation_order': lambda obj: obj.creation_order,
+    'lane': lambda obj: obj.lane,
+    'assigned_to': lambda obj: obj.assigned_to_id,
+}
+TICKET_FIELDS = tuple(_FIELD_READERS)
+
+
+class TicketReadSerializer(serializers.BaseSerializer):
+    """
+    Read-only twin of TicketSerializer for list and fetch-tickets responses.
+
+    Produces exactly the same representation, built directly from model
+    attributes. `created_by` must be loaded up front (select_related or
+    prefetch_related_objects) to avoid one query per row.
+
+    `fields` (see parse_ticket_fields) limits the output to those keys and only
+    reads their attributes, so the others can be deferred.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.readers = None if fields is None else [(name, _FIELD_READERS[name]) for name in fields]
+
+    def to_representation(self, obj):
+        if self.readers is not None:
+            return {name: read(obj) for name, read in self.readers}
+        return {
+            'id': obj.id,
+            'created_by': _created_by(obj),
+            'subject': obj.subject,
+            'description': obj.description,
+            'is_sold': obj.is_sold,
+            'created_at': _datetime(obj.created_at),
+            'updated_at': _datetime(obj.updated_at),
+            'assigned_at': _datetime(obj.assigned_at),
+            'creation_order': obj.creation_order,
+            'lane': obj.lane,
+            'assigned_to': obj.assigned_to_id,
+        }
+
+
+def parse_ticket_fields(params, default=None):
+    """
+    The TICKET_FIELDS to render for ?fields=a,b (just those) or ?omit=a,b (all
+    but those), else `default`; None means all of them. Returned in output order.
+    """
+    if 'fields' in params and 'omit' in params:
+        raise serializers.ValidationError({'fields': ["Pass either fields or omit, not both."]})
+    for param in ('fields', 'omit'):
+        if param not in params:
+            continue
+        names = {name.strip() for name in params[param].split(',') if name.strip()}
+        unknown = names - set(TICKET_FIELDS)
+        if unknown:
+            raise serializers.ValidationError({param: [
+                f"Unknown field(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(TICKET_FIELDS)}."
+            ]})
+        if param == 'omit' and not names:
+            return None
+        selected = tuple(name for name in TICKET_FIELDS if (name in names) == (param == 'fields'))
+        if not selected:
+            raise serializers.ValidationError({param: ["Select at least one field."]})
+        return selected
+    if default:
+        return tuple(name for name in TICKET_FIELDS if name in default) or None
+    return None
+
+
+def ticket_load_fields(fields):
+    """Ticket fields to load for rendering `fields`: the pk and the list ordering are always needed."""
+    return tuple(dict.fromkeys(('id', 'created_at', 'creation_order', *fields)))
+
+
+class ArchivedTicketReadSerializer(TicketReadSerializer):
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        data['archived_at'] = _datetime(obj.archived_at)
+        return data
+
+
+class TicketSellSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=100)
+
+
+class AgentCounterSerializer(serializers.BaseSerializer):
+    def to_representation(self, obj):
+        return {'agent': obj.scope, 'open': obj.open_tickets, 'sold': obj.sold_tickets}
+
+
+class TicketEventSerializer(serializers.BaseSerializer):
+    def to_representation(self, obj):
+        return {
+            'id': obj.id,
+            'type': obj.type,
+            'ticket': obj.ticket_id,
+            'agent': obj.agent_id,
+            'created_at': _datetime(obj.created_at),
+        }
+
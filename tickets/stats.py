@@ -0,0 +1,280 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import ArchivedTicket, Ticket, TicketCounter, TicketHourlyStats
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = TicketCounter.GLOBAL_SCOPE
+
+
+def _shards():
+    return max(1, getattr(settings, 'TICKET_COUNTER_SHARDS', 8))
+
+
+def _shard(key=None):
+    # Writers for the same agent reuse a shard; everyone else spreads out.
+    return (key if key is not None else random.randrange(1 << 30)) % _shards()
+
+
+def _state_counts(state):
+    """{scope: (open, sold)} contributed by one ticket in state (assigned_to_id, is_sold)."""
+    if state is None:
+        return {}
+    agent_id, is_sold = state
+    if not is_sold:
+        return {agent_id or GLOBAL: (1, 0)}
+    if agent_id:
+        return {agent_id: (0, 1), GLOBAL: (0, 1)}
+    return {GLOBAL: (0, 1)}
+
+
+def record_ticket_changes(changes, using=None):
+    """
+    Apply [(before, after), ...] ticket state changes to the counters, where a
+    state is (assigned_to_id, is_sold) and None means the row doesn't exist.
+
+    Sold counts are the sold tickets on record, live or archived, which is what
+    reconcile_counters() rebuilds: deleting a sold ticket lowers them. Archiving
+    moves the row rather than deleting it, so it isn't reported here.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for before, after in changes:
+        for scope, (open_tickets, sold) in _state_counts(after).items():
+            deltas[scope][0] += open_tickets
+            deltas[scope][1] += sold
+        for scope, (open_tickets, sold) in _state_counts(before).items():
+            deltas[scope][0] -= open_tickets
+            deltas[scope][1] -= sold
+    record_counts(deltas, using=using)
+
+
+def record_counts(deltas, using=None, shard_key=None):
+    """
+    Add {scope: (open, sold)} to the counters with one upsert. Call it inside the
+    transaction that changed the tickets; a scope of None means GLOBAL.
+    """
+    using = using or router.db_for_write(TicketCounter)
+    shard = _shard(shard_key)
+    rows = defaultdict(lambda: [0, 0])
+    for scope, (open_tickets, sold) in deltas.items():
+        key = (scope or GLOBAL, shard if not scope else 0)
+        rows[key][0] += open_tickets
+        rows[key][1] += sold
+    # Sorted so concurrent writers lock counter rows in the same order.
+    rows = sorted((key, value) for key, value in rows.items() if value != [0, 0])
+    if not rows:
+        return
+    table = TicketCounter._meta.db_table
+    sql = f"""
+        INSERT INTO {table} (scope, shard, open_tickets, sold_tickets)
+        VALUES {', '.join(['(%s, %s, %s, %s)'] * len(rows))}
+        ON CONFLICT (scope, shard) DO UPDATE SET
+            open_tickets = {table}.open_tickets + excluded.open_tickets,
+            sold_tickets = {table}.sold_tickets + excluded.sold_tickets
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [value for (scope, shard), (o, s) in rows for value in (scope, shard, o, s)])
+
+
+def record_hourly(now=None, assigned=0, sold=0, sale_latency_seconds=0.0, using=None, shard_key=None):
+    """Add to the current hour's rollup row; call it in the same transaction as the change."""
+    if not (assigned or sold):
+        return
+    using = using or router.db_for_write(TicketHourlyStats)
+    hour = (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    table = TicketHourlyStats._meta.db_table
+    sql = f"""
+        INSERT INTO {table} (hour, shard, assigned, sold, sale_latency_seconds)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (hour, shard) DO UPDATE SET
+            assigned = {table}.assigned + excluded.assigned,
+            sold = {table}.sold + excluded.sold,
+            sale_latency_seconds = {table}.sale_latency_seconds + excluded.sale_latency_seconds
+    """
+    connection = connections[using]
+    params = [connection.ops.adapt_datetimefield_value(hour), _shard(shard_key), assigned, sold, sale_latency_seconds]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_assigned(claimed, now, using=None):
+    """Queue tickets moved to agents: `claimed` is {agent_id: tickets}."""
+    claimed = {agent_id: count for agent_id, count in claimed.items() if count}
+    if not claimed:
+        return
+    total = sum(claimed.values())
+    shard_key = min(claimed)
+    deltas = {agent_id: (count, 0) for agent_id, count in claimed.items()}
+    deltas[GLOBAL] = (-total, 0)
+    record_counts(deltas, using=using, shard_key=shard_key)
+    record_hourly(now, assigned=total, using=using, shard_key=shard_key)
+
+
+def record_reclaimed(agent_ids, using=None):
+    """Unsold tickets returned to the queue, one agent id per ticket."""
+    if not agent_ids:
+        return
+    deltas = defaultdict(lambda: [0, 0])
+    for agent_id in agent_ids:
+        deltas[agent_id][0] -= 1
+    deltas[GLOBAL][0] += len(agent_ids)
+    record_counts(deltas, using=using)
+
+
+def record_sold(agent_id, assigned_ats, now, using=None):
+    """The agent sold tickets that were assigned at `assigned_ats`."""
+    if not assigned_ats:
+        return
+    sold = len(assigned_ats)
+    latency = sum((now - assigned_at).total_seconds() for assigned_at in assigned_ats if assigned_at is not None)
+    record_counts({agent_id: (-sold, sold), GLOBAL: (0, sold)}, using=using, shard_key=agent_id)
+    record_hourly(now, sold=sold, sale_latency_seconds=latency, using=using, shard_key=agent_id)
+
+
+def release_agent(sender, instance, using, **kwargs):
+    """
+    pre_delete receiver for users. Ticket.assigned_to is SET_NULL, so a deleted
+    agent's open tickets go back to the queue.
+    """
+    open_tickets = Ticket.objects.using(using).filter(assigned_to=instance, is_sold=False).count()
+    record_counts({GLOBAL: (open_tickets, 0)}, using=using)
+    TicketCounter.objects.using(using).filter(scope=instance.pk).delete()
+
+
+def queue_depth(using=None):
+    """Unassigned, unsold tickets according to the counters. One indexed read."""
+    using = using or router.db_for_read(TicketCounter)
+    total = TicketCounter.objects.using(using).filter(scope=GLOBAL).aggregate(n=Sum('open_tickets'))['n']
+    return total or 0
+
+
+class QueueRecheck:
+    """
+    Cross-checks an empty queue-depth counter against the tickets table at most
+    every TICKET_COUNTER_RECHECK_SECONDS per process, reusing the last answer in
+    between. The check is one EXISTS on the queue indexes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._empty = True
+
+    def is_empty(self, using=None):
+        interval = getattr(settings, 'TICKET_COUNTER_RECHECK_SECONDS', 10.0)
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < interval:
+                return self._empty
+            self._checked_at = now
+        using = using or router.db_for_read(Ticket)
+        empty = not Ticket.objects.using(using).filter(assigned_to__isnull=True, is_sold=False).exists()
+        if not empty:
+            logger.warning("The queue-depth counter is zero but unassigned tickets exist; run reconcile_counters")
+        with self._lock:
+            self._empty = empty
+        return empty
+
+    def reset(self):
+        with self._lock:
+            self._checked_at = None
+            self._empty = True
+
+
+queue_recheck = QueueRecheck()
+
+
+def queue_is_empty(using=None):
+    """
+    Whether there is nothing to claim. The counter answers while it is positive;
+    a zero is confirmed against the tickets, so tickets written behind the
+    counters' back (raw SQL, a restore) are still handed out, with a warning.
+    """
+    return queue_depth(using) <= 0 and queue_recheck.is_empty(using)
+
+
+def global_counts(using=None):
+    using = using or router.db_for_read(TicketCounter)
+    totals = TicketCounter.objects.using(using).filter(scope=GLOBAL).aggregate(open=Sum('open_tickets'), sold=Sum('sold_tickets'))
+    return {'queue_depth': totals['open'] or 0, 'sold': totals['sold'] or 0}
+
+
+def hourly_stats(hours=24, using=None):
+    """Rollups for the last `hours` hours (including the current one), oldest first."""
+    using = using or router.db_for_read(TicketHourlyStats)
+    since = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+    rows = (
+        TicketHourlyStats.objects.using(using).filter(hour__gte=since)
+        .values('hour').annotate(assigned=Sum('assigned'), sold=Sum('sold'), latency=Sum('sale_latency_seconds'))
+        .order_by('hour')
+    )
+    return [
+        {
+            'hour': row['hour'],
+            'assigned': row['assigned'],
+            'sold': row['sold'],
+            'avg_sale_latency_seconds': round(row['latency'] / row['sold'], 3) if row['sold'] else None,
+        }
+        for row in rows
+    ]
+
+
+def actual_counts(ticket_model=Ticket, archived_model=ArchivedTicket, using=None):
+    """{scope: [open, sold]} recomputed from the ticket and archive tables."""
+    using = using or router.db_for_read(ticket_model)
+    counts = defaultdict(lambda: [0, 0])
+    rows = ticket_model._base_manager.using(using).values('assigned_to_id', 'is_sold').annotate(n=Count('id')).order_by()
+    for row in rows:
+        for scope, (open_tickets, sold) in _state_counts((row['assigned_to_id'], row['is_sold'])).items():
+            counts[scope][0] += open_tickets * row['n']
+            counts[scope][1] += sold * row['n']
+    rows = archived_model._base_manager.using(using).values('assigned_to_id').annotate(n=Count('id')).order_by()
+    for row in rows:
+        for scope, (_, sold) in _state_counts((row['assigned_to_id'], True)).items():
+            counts[scope][1] += sold * row['n']
+    return counts
+
+
+def reconcile_counters(using=None):
+    """
+    Rebuild the counters from the ticket tables and report how many scopes had drifted.
+
+    Runs in one transaction. On PostgreSQL the counter table is locked first, so
+    writers block until the rebuild commits and then apply their deltas on top of
+    it; nothing they change is counted twice or lost.
+    """
+    using = using or router.db_for_write(TicketCounter)
+    started = time.perf_counter()
+    table = TicketCounter._meta.db_table
+    with transaction.atomic(using=using):
+        if connections[using].vendor == 'postgresql':
+            with connections[using].cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE')
+        current = defaultdict(lambda: [0, 0])
+        for scope, open_tickets, sold in TicketCounter.objects.using(using).values_list('scope', 'open_tickets', 'sold_tickets'):
+            current[scope][0] += open_tickets
+            current[scope][1] += sold
+        actual = actual_counts(using=using)
+        drifted = [scope for scope in set(current) | set(actual) if current.get(scope, [0, 0]) != actual.get(scope, [0, 0])]
+        TicketCounter.objects.using(using).all().delete()
+        TicketCounter.objects.using(using).bulk_create([
+            TicketCounter(scope=scope, shard=0, open_tickets=open_tickets, sold_tickets=sold)
+            for scope, (open_tickets, sold) in sorted(actual.items())
+        ])
+    return {
+        'scopes': len(actual),
+        'drifted': len(drifted),
+        'queue_depth': actual[GLOBAL][0],
+        'sold': actual[GLOBAL][1],
+        'seconds': round(time.perf_counter() - started, 4),
+    }
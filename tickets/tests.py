@@ -1,7 +1,55 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.conf import settings
+from django.core.management import call_command
+from django.apps import apps as django_apps
+from django.db import OperationalError, connection, connections, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from .models import Ticket
+from rest_framework_simplejwt.tokens import AccessToken
+from support_system import db_router
+from support_system.changelist import EstimatedCountPaginator, planner_estimate
+from support_system.checks import check_replica_pin_cache
+from support_system.db_router import PrimaryPinningMiddleware, PrimaryReplicaRouter, ReplicaHealth, record_writes, replica_health, track_writes, use_primary
+from support_system.metrics import MetricsRegistry
+from support_system.renderers import FastJSONRenderer
+from support_system.throttling import (
+    MemoryThrottleStore, RedisThrottleStore, SQLiteThrottleStore, ThrottleStoreError, UserRateThrottle, default_sqlite_path, gcra,
+)
+from .archive import _archive_batch_sql, archive_sold_tickets
+from .async_views import _fetch_batch
+from .events import event_cursor, parse_cursor, prune_events, record_events
+from .export import export_csv
+from .ingest import BulkPayloadError, iter_json_array, iter_ndjson
+from .admin import TicketAdmin
+from .lanes import BILLING, GENERAL, TECHNICAL, URGENT, agent_lanes
+from .models import ArchivedTicket, Ticket, TicketCounter, TicketEvent
+from .notify import CHANNEL as NOTIFY_CHANNEL, ticket_notifier
+from .search import search_condition, search_tickets
+from .reaper import StaleAssignmentReaper, _reclaim_batch_sql, reclaim_stale_assignments
+from .serializers import TICKET_FIELDS, TicketReadSerializer, TicketSerializer
+from .stats import actual_counts, queue_depth, queue_recheck, reconcile_counters
+from .utils import _assign_tickets_orm, _assign_tickets_sql, _dispatch_sql, _read_columns, _sell_tickets_sql, assign_tickets_to_agent, dispatch_ticket_assignments, sell_tickets
 from concurrent.futures import ThreadPoolExecutor
 
 User = get_user_model()
@@ -109,3 +157,1440 @@ class TicketAssignmentTests(TestCase):
         self.assertLessEqual(len(res.data), 15)
 
 
+
+
+class CreationOrderAllocationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+
+    def test_creation_order_is_unique_and_increasing(self):
+        tickets = [Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin) for i in range(5)]
+        orders = [t.creation_order for t in tickets]
+        self.assertEqual(orders, sorted(set(orders)))
+
+    def test_bulk_create_reserves_creation_orders(self):
+        first = Ticket.objects.create(subject="First", description="desc", created_by=self.admin)
+        created = Ticket.objects.bulk_create([Ticket(subject=f"Bulk {i}", description="desc") for i in range(20)])
+        orders = [t.creation_order for t in created]
+
+        self.assertEqual(len(set(orders)), 20)
+        self.assertTrue(all(order > first.creation_order for order in orders))
+        self.assertEqual(Ticket.objects.filter(creation_order__in=orders).count(), 20)
+
+
+class BulkTicketIngestTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_bulk_json_array_reports_row_errors(self):
+        payload = json.dumps([
+            {'subject': 'Ticket 1', 'description': 'desc'},
+            {'description': 'missing subject'},
+            {'subject': 'Ticket 3', 'description': 'desc'},
+        ])
+        res = self.client.post('/api/tickets/bulk/', payload, content_type='application/json')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(res.data['failed'], 1)
+        self.assertEqual(res.data['errors'][0]['row'], 1)
+        self.assertIn('subject', res.data['errors'][0]['errors'])
+        self.assertEqual(Ticket.objects.filter(created_by=self.admin).count(), 2)
+
+    def test_bulk_ndjson(self):
+        lines = [json.dumps({'subject': f'Ticket {i}', 'description': 'desc'}) for i in range(25)]
+        payload = '\n'.join(lines[:10] + ['{not json'] + lines[10:]) + '\n'
+        res = self.client.post('/api/tickets/bulk/', payload, content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['created'], 25)
+        self.assertEqual(res.data['errors'][0]['row'], 10)
+        subjects = list(Ticket.objects.values_list('subject', flat=True))
+        self.assertEqual(subjects, [f'Ticket {i}' for i in range(25)])
+
+    def test_bulk_truncated_array(self):
+        payload = '[{"subject": "Ticket 1", "description": "desc"}, {"subject": "Tick'
+        res = self.client.post('/api/tickets/bulk/', payload, content_type='application/json')
+
+        # The first row is committed before the payload breaks off.
+        self.assertEqual(res.status_code, 207)
+        self.assertEqual(res.data['created'], 1)
+        self.assertIn('detail', res.data)
+
+        res = self.client.post('/api/tickets/bulk/', '[{"subject": "Tick', content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['created'], 0)
+
+    def test_oversized_rows_are_bounded(self):
+        big = json.dumps({'subject': 'Big', 'description': 'x' * 200})
+        small = json.dumps({'subject': 'Small', 'description': 'desc'})
+        payload = f'{small}\n{big}\n{small}\n{big}'.encode()
+        rows = list(iter_ndjson(io.BytesIO(payload), read_size=16, max_row_size=100))
+        self.assertEqual([row if isinstance(row, dict) else 'too long' for row in rows], [json.loads(small), 'too long', json.loads(small), 'too long'])
+
+        payload = f'[{small}, {big}, {small}]'.encode()
+        with self.assertRaisesMessage(BulkPayloadError, 'longer than 100 characters'):
+            list(iter_json_array(io.BytesIO(payload), read_size=16, max_row_size=100))
+
+    def test_json_array_reader_handles_split_reads(self):
+        payload = json.dumps([{'subject': f'Ticket {i}', 'n': i * 1000} for i in range(50)]).encode()
+        rows = list(iter_json_array(io.BytesIO(payload), read_size=7))
+        self.assertEqual(rows, json.loads(payload))
+
+    def test_agent_cannot_bulk_create(self):
+        self.client.force_authenticate(user=self.agent)
+        res = self.client.post('/api/tickets/bulk/', '[]', content_type='application/json')
+        self.assertEqual(res.status_code, 403)
+
+
+class AssignmentEngineTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        for i in range(20):
+            Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin)
+
+    def test_assignment_follows_fifo_order(self):
+        tickets = assign_tickets_to_agent(self.agent)
+        expected = list(Ticket.objects.order_by('created_at', 'creation_order').values_list('id', flat=True)[:15])
+        self.assertEqual([t.id for t in tickets], expected)
+
+    def test_full_agent_takes_read_only_fast_path(self):
+        assign_tickets_to_agent(self.agent)
+        with self.assertNumQueries(1):
+            tickets = assign_tickets_to_agent(self.agent)
+        self.assertEqual(len(tickets), 15)
+
+    def test_partial_batch_is_topped_up(self):
+        first = assign_tickets_to_agent(self.agent)
+        Ticket.objects.filter(id__in=[t.id for t in first[:3]]).update(is_sold=True)
+        tickets = assign_tickets_to_agent(self.agent)
+
+        self.assertEqual(len(tickets), 15)
+        self.assertTrue({t.id for t in first[3:]}.issubset({t.id for t in tickets}))
+        self.assertEqual(Ticket.objects.filter(assigned_to__isnull=True).count(), 2)
+
+    @skipUnless(connection.vendor == 'postgresql', "single-statement engine requires PostgreSQL")
+    def test_sql_engine_matches_orm_engine(self):
+        other = User.objects.create_user(username='agent2', password='agentpass', role='agent')
+        sql_tickets = _assign_tickets_sql(self.agent, 15, 'default')
+        orm_tickets = _assign_tickets_orm(other, 15)
+        orders = [t.creation_order for t in sql_tickets]
+
+        self.assertEqual(len(sql_tickets), 15)
+        self.assertEqual(orders, sorted(orders))
+        self.assertTrue({t.id for t in sql_tickets}.isdisjoint(t.id for t in orm_tickets))
+
+    @skipUnless(connection.vendor == 'postgresql', "single-statement engine requires PostgreSQL")
+    def test_sql_claim_is_capped_at_the_batch_size(self):
+        # URGENT is empty, so GENERAL is claimed by the per-lane top-up statement.
+        for lanes in ([GENERAL], [URGENT, GENERAL]):
+            with self.subTest(lanes=lanes):
+                Ticket.objects.update(assigned_to=None)
+                tickets = _assign_tickets_sql(self.agent, 15, 'default', lanes)
+                self.assertEqual(len(tickets), 15)
+                self.assertEqual(Ticket.objects.filter(assigned_to=self.agent).count(), 15)
+
+                Ticket.objects.filter(id__in=[t.id for t in tickets[:3]]).update(is_sold=True)
+                tickets = _assign_tickets_sql(self.agent, 15, 'default', lanes)
+                self.assertEqual(len(tickets), 15)
+                self.assertEqual(Ticket.objects.filter(assigned_to=self.agent, is_sold=False).count(), 15)
+                Ticket.objects.update(is_sold=False)
+
+
+class DispatcherTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agents = [User.objects.create_user(username=f'agent{i}', password='agentpass', role='agent') for i in range(3)]
+        for i in range(40):
+            Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin)
+
+    def test_dispatch_fills_agents_round_robin(self):
+        result = dispatch_ticket_assignments(max_tickets=15)
+
+        self.assertEqual(result, {'tickets': 40, 'agents': 3})
+        counts = sorted(Ticket.objects.filter(assigned_to=agent).count() for agent in self.agents)
+        self.assertEqual(counts, [13, 13, 14])
+        head = Ticket.objects.order_by('created_at', 'creation_order')[:3]
+        self.assertEqual({t.assigned_to_id for t in head}, {agent.id for agent in self.agents})
+
+    def test_dispatch_skips_full_agents(self):
+        assign_tickets_to_agent(self.agents[0])
+        result = dispatch_ticket_assignments(max_tickets=15)
+
+        self.assertEqual(result['agents'], 2)
+        self.assertEqual(Ticket.objects.filter(assigned_to=self.agents[0]).count(), 15)
+
+    def test_dispatch_command_reports_throughput(self):
+        out = io.StringIO()
+        call_command('dispatch_tickets', '--json', '--agents-per-round', '2', stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['tickets'], 40)
+        self.assertEqual(report['transactions'], report['rounds'])
+        self.assertIn('tickets_per_second', report)
+
+
+class QueueLaneTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        for lane in (GENERAL, URGENT, BILLING):
+            Ticket.objects.bulk_create([Ticket(subject=f"{lane} {i}", description="desc", created_by=self.admin, lane=lane) for i in range(6)])
+
+    def test_batch_is_filled_from_lanes_in_priority_order(self):
+        self.agent.queue_lanes = [GENERAL, URGENT]
+        self.agent.save()
+        tickets = assign_tickets_to_agent(self.agent, 10)
+
+        self.assertEqual(sorted(t.lane for t in tickets), [GENERAL] * 4 + [URGENT] * 6)
+        orders = [(t.created_at, t.creation_order) for t in tickets]
+        self.assertEqual(orders, sorted(orders))
+        self.assertFalse(Ticket.objects.filter(assigned_to=self.agent, lane=BILLING).exists())
+        self.assertEqual(queue_depth(), 8)
+
+    def test_agents_without_lanes_serve_every_lane(self):
+        self.assertEqual(agent_lanes(self.agent), [URGENT, TECHNICAL, BILLING, GENERAL])
+        tickets = assign_tickets_to_agent(self.agent, 15)
+        self.assertEqual([t.lane for t in tickets].count(URGENT), 6)
+        self.assertEqual(len(tickets), 15)
+
+    def test_claims_users_read_lanes_from_the_row(self):
+        User.objects.filter(pk=self.agent.pk).update(queue_lanes=[BILLING])
+        self.client = APIClient()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.agent)}'}
+        res = self.client.get('/api/tickets/fetch-tickets/', **headers)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual({ticket['lane'] for ticket in res.data}, {BILLING})
+
+    def test_dispatch_only_serves_an_agents_lanes(self):
+        other = User.objects.create_user(username='agent2', password='agentpass', role='agent', queue_lanes=[URGENT])
+        result = dispatch_ticket_assignments(max_tickets=15)
+
+        self.assertEqual(result, {'tickets': 18, 'agents': 2})
+        self.assertEqual(set(Ticket.objects.filter(assigned_to=other).values_list('lane', flat=True)), {URGENT})
+        # Urgent tickets went round-robin before the agent without lanes moved on to lower lanes.
+        self.assertEqual(Ticket.objects.filter(assigned_to=other).count(), 3)
+        self.assertEqual(Ticket.objects.filter(assigned_to=self.agent).count(), 15)
+
+    @skipUnless(connection.vendor == 'postgresql', "per-lane claim statements require PostgreSQL")
+    def test_sql_lane_claims_are_capped_at_the_batch_size(self):
+        # Every lane holds 6 tickets, so the top-up statements each have more than they need.
+        tickets = _assign_tickets_sql(self.agent, 10, 'default', [GENERAL, URGENT, BILLING])
+        self.assertEqual(len(tickets), 10)
+        self.assertEqual(Ticket.objects.filter(assigned_to=self.agent).count(), 10)
+
+        other = User.objects.create_user(username='agent2', password='agentpass', role='agent')
+        Ticket.objects.update(assigned_to=None)
+        result = _dispatch_sql(4, 100, 'default')
+        self.assertEqual(result, {'tickets': 8, 'agents': 2})
+        for agent in (self.agent, other):
+            self.assertEqual(Ticket.objects.filter(assigned_to=agent).count(), 4)
+
+
+class LongPollFetchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.agent)}'}
+
+    async def test_returns_immediately_without_wait(self):
+        res = await AsyncClient().get('/api/tickets/fetch-tickets/long-poll/', headers=self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), [])
+
+    async def test_wakes_when_tickets_are_announced(self):
+        async def publish():
+            await asyncio.sleep(0.2)
+            await sync_to_async(Ticket.objects.create)(subject="New", description="desc", created_by=self.admin)
+            ticket_notifier.notify(1)
+
+        publisher = asyncio.create_task(publish())
+        started = time.monotonic()
+        res = await AsyncClient().get('/api/tickets/fetch-tickets/long-poll/?wait=10', headers=self.headers)
+        await publisher
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([t['subject'] for t in res.json()], ["New"])
+        self.assertLess(time.monotonic() - started, 5)
+
+    async def test_long_poll_takes_fields(self):
+        await sync_to_async(Ticket.objects.create)(subject="New", description="desc", created_by=self.admin)
+        res = await AsyncClient().get('/api/tickets/fetch-tickets/long-poll/?fields=id,description', headers=self.headers)
+        self.assertEqual([set(t) for t in res.json()], [{'id', 'description'}])
+        res = await AsyncClient().get('/api/tickets/fetch-tickets/long-poll/?fields=nope', headers=self.headers)
+        self.assertEqual(res.status_code, 400)
+
+    async def test_rejects_non_finite_wait(self):
+        for wait in ('nan', 'inf', '-inf', 'NaN'):
+            res = await AsyncClient().get(f'/api/tickets/fetch-tickets/long-poll/?wait={wait}', headers=self.headers)
+            self.assertEqual(res.status_code, 400, wait)
+
+    async def test_admin_cannot_long_poll(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.admin)}'}
+        res = await AsyncClient().get('/api/tickets/fetch-tickets/long-poll/', headers=headers)
+        self.assertEqual(res.status_code, 403)
+
+    def test_ticket_create_notifies_waiters(self):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        before = ticket_notifier.generation
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            client.post('/api/tickets/', {'subject': 'New Ticket', 'description': 'desc'})
+        if connection.vendor == 'postgresql':
+            # Announced with a transactional NOTIFY, relayed to waiters by the LISTEN thread.
+            notifies = [query['sql'] for query in queries if 'pg_notify' in query['sql'] and NOTIFY_CHANNEL in query['sql']]
+            self.assertEqual(len(notifies), 1, notifies)
+        else:
+            self.assertEqual(ticket_notifier.generation, before + 1)
+
+
+class LongPollConnectionTests(TransactionTestCase):
+    def test_fetch_closes_the_connection_before_the_request_waits(self):
+        agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        with mock.patch.object(connection, 'close', wraps=connection.close) as close:
+            self.assertEqual(_fetch_batch(agent), [])
+        close.assert_called_once_with()
+        # An in-memory SQLite test database ignores close(), since closing would drop it.
+        if connection.vendor == 'postgresql':
+            self.assertIsNone(connection.connection)
+
+
+class TicketEventTests(TransactionTestCase):
+    """
+    The feed serves events in commit order and hides transactions still in
+    progress, so these tests commit for real instead of running in a TestCase
+    transaction.
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.other = User.objects.create_user(username='agent2', password='agentpass', role='agent')
+        self.tickets = [Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin) for i in range(3)]
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.admin)}'}
+
+    def events(self, ticket_id):
+        return list(TicketEvent.objects.filter(ticket_id=ticket_id).values_list('type', 'agent_id'))
+
+    def test_ticket_changes_are_recorded_with_the_change(self):
+        ticket, ticket_id = self.tickets[0], self.tickets[0].id
+        assign_tickets_to_agent(self.agent)
+        ticket.refresh_from_db()
+        ticket.subject = "Renamed"
+        ticket.save(update_fields=['subject'])
+        ticket.assign_to_agent(self.other)
+        sell_tickets(self.other, [ticket.id])
+        ticket.delete()
+
+        self.assertEqual(self.events(ticket_id), [
+            ('created', None), ('assigned', self.agent.id), ('updated', self.agent.id),
+            ('assigned', self.other.id), ('sold', self.other.id), ('deleted', self.other.id),
+        ])
+        Ticket.objects.filter(id=self.tickets[1].id).update(assigned_at=timezone.now() - timedelta(days=1))
+        reclaim_stale_assignments(lease=timedelta(hours=1))
+        self.assertEqual(self.events(self.tickets[1].id)[-1], ('released', self.agent.id))
+
+    def test_rolled_back_changes_leave_no_events(self):
+        count = TicketEvent.objects.count()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            assign_tickets_to_agent(self.agent)
+            raise RuntimeError
+        self.assertEqual(TicketEvent.objects.count(), count)
+
+    def test_feed_pages_through_events_in_order(self):
+        assign_tickets_to_agent(self.agent)
+        seen, after = [], ''
+        while True:
+            res = self.client.get('/api/events/', {'after': after, 'limit': 2}, **self.headers)
+            self.assertEqual(res.status_code, 200)
+            data = res.json()
+            self.assertLessEqual(len(data['events']), 2)
+            seen += data['events']
+            after = data['next']
+            if not data['has_more']:
+                break
+        self.assertEqual([event['id'] for event in seen], list(TicketEvent.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(seen[-1], {
+            'id': TicketEvent.objects.order_by('id').last().id, 'type': 'assigned', 'ticket': self.tickets[-1].id, 'agent': self.agent.id,
+            'created_at': seen[-1]['created_at'],
+        })
+
+    def test_feed_is_for_admins_and_validates_parameters(self):
+        agent_headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.agent)}'}
+        self.assertEqual(self.client.get('/api/events/', **agent_headers).status_code, 403)
+        self.assertEqual(self.client.get('/api/events/?after=x', **self.headers).status_code, 400)
+        self.assertEqual(self.client.get('/api/events/?limit=0', **self.headers).status_code, 400)
+        for wait in ('nan', 'inf'):
+            self.assertEqual(self.client.get(f'/api/events/?wait={wait}', **self.headers).status_code, 400)
+
+    async def test_long_poll_wakes_on_new_events(self):
+        headers = {'Authorization': self.headers['HTTP_AUTHORIZATION']}
+        latest = (await AsyncClient().get('/api/events/?after=latest', headers=headers)).json()
+        self.assertEqual(latest['events'], [])
+        # An idle cursor comes back unchanged in position.
+        idle = (await AsyncClient().get(f"/api/events/?after={latest['next']}", headers=headers)).json()
+        self.assertEqual((idle['events'], parse_cursor(idle['next'])[:2]), ([], parse_cursor(latest['next'])[:2]))
+
+        async def publish():
+            await asyncio.sleep(0.2)
+            # Committed on its own, so the feed's NOTIFY / on_commit wake-up is the real one.
+            await sync_to_async(Ticket.objects.create)(subject="New", description="desc", created_by=self.admin)
+
+        publisher = asyncio.create_task(publish())
+        started = time.monotonic()
+        res = await AsyncClient().get(f"/api/events/?after={latest['next']}&wait=10", headers=headers)
+        await publisher
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([event['type'] for event in res.json()['events']], ['created'])
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_prune_compacts_and_expires_events(self):
+        assign_tickets_to_agent(self.agent)
+        first = TicketEvent.objects.order_by('id').first()
+        TicketEvent.objects.update(created_at=timezone.now() - timedelta(days=2))
+        record_events([(TicketEvent.UPDATED, self.tickets[0].id, self.agent.id)])
+
+        report = prune_events(retention=timedelta(days=7), compact_after=timedelta(days=1), batch_size=2)
+        self.assertEqual(report['compacted'], 4)
+        self.assertEqual(report['expired'], 0)
+        # The latest event of every ticket survives compaction.
+        self.assertEqual(sorted(TicketEvent.objects.values_list('ticket_id', 'type')), [
+            (self.tickets[0].id, 'updated'), (self.tickets[1].id, 'assigned'), (self.tickets[2].id, 'assigned'),
+        ])
+        # A cursor at a compacted event still seeks to the events after it.
+        cursor = event_cursor(first.txid, first.id, timezone.now())
+        res = self.client.get('/api/events/', {'after': cursor}, **self.headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([event['id'] for event in res.json()['events']], list(TicketEvent.objects.order_by('id').values_list('id', flat=True)))
+        # One older than the retention may have missed expired events.
+        stale = event_cursor(first.txid, first.id, timezone.now() - timedelta(days=8))
+        self.assertEqual(self.client.get('/api/events/', {'after': stale}, **self.headers).status_code, 410)
+
+        out = io.StringIO()
+        call_command('prune_events', '--retention', '3600', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['expired'], 2)
+        self.assertEqual(TicketEvent.objects.count(), 1)
+
+
+class TicketPaginationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        Ticket.objects.bulk_create([Ticket(subject=f"Ticket {i}", description="desc", created_by=self.admin, assigned_to=self.agent) for i in range(25)])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.agent)
+
+    def test_cursor_pages_walk_the_whole_queue_in_order(self):
+        seen = []
+        url = '/api/tickets/?page_size=10'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            seen.extend(t['id'] for t in res.data['results'])
+            url = res.data['next']
+
+        expected = list(Ticket.objects.order_by('created_at', 'creation_order').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_prior_page(self):
+        first = self.client.get('/api/tickets/?page_size=10')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual([t['id'] for t in back.data['results']], [t['id'] for t in first.data['results']])
+
+    def test_invalid_cursor(self):
+        res = self.client.get('/api/tickets/?cursor=not-a-cursor')
+        self.assertEqual(res.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'postgresql', "query plans are checked on PostgreSQL only")
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN (ANALYZE, BUFFERS) the hot assignment queries against a table dominated
+    by sold history and fail if a plan regresses to a sequential scan or a sort.
+    """
+    history = 50000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        cls.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        Ticket.objects.bulk_create(
+            (Ticket(subject=f"Sold {i}", description="desc", created_by=cls.admin, assigned_to=cls.agent, is_sold=True) for i in range(cls.history)),
+            batch_size=5000,
+        )
+        Ticket.objects.bulk_create([Ticket(subject=f"Open {i}", description="desc", created_by=cls.admin) for i in range(200)])
+        Ticket.objects.filter(id__in=Ticket.objects.filter(assigned_to__isnull=True).values('id')[:5]).update(assigned_to=cls.agent)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Ticket._meta.db_table}')
+
+    def plan_nodes(self, queryset):
+        plan = json.loads(queryset.explain(format='json', analyze=True, buffers=True))[0]['Plan']
+        nodes, stack = [], [plan]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.get('Plans', []))
+        return nodes
+
+    def assertIndexedPlan(self, queryset, index_name):
+        nodes = self.plan_nodes(queryset)
+        node_types = [node['Node Type'] for node in nodes]
+        self.assertNotIn('Seq Scan', node_types, node_types)
+        self.assertNotIn('Sort', node_types, node_types)
+        self.assertIn(index_name, [node.get('Index Name') for node in nodes], node_types)
+
+    def test_queue_head_uses_partial_index(self):
+        queryset = Ticket.objects.filter(assigned_to__isnull=True, is_sold=False, lane=GENERAL).order_by('created_at', 'creation_order').values_list('id', flat=True)[:15]
+        self.assertIndexedPlan(queryset, 'ticket_queue_general_idx')
+
+    def test_agent_batch_uses_partial_index(self):
+        queryset = Ticket.objects.filter(assigned_to=self.agent, is_sold=False).order_by('created_at', 'creation_order')[:15]
+        self.assertIndexedPlan(queryset, 'ticket_agent_open_idx')
+
+    def test_search_uses_full_text_and_trigram_indexes(self):
+        Ticket.objects.create(subject="Printer jammed", description="desc", created_by=self.admin)
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        queryset = search_tickets(Ticket.objects.all(), 'printer').order_by('-rank', 'created_at', 'creation_order')[:15]
+        nodes = self.plan_nodes(queryset)
+        index_names = [node.get('Index Name') for node in nodes]
+        self.assertIn('ticket_search_idx', index_names, index_names)
+        self.assertIn('ticket_subject_trgm_idx', index_names, index_names)
+        self.assertIn('BitmapOr', [node['Node Type'] for node in nodes])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        for i in range(3):
+            Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin)
+        self.client = APIClient()
+
+    def scrape(self, **headers):
+        return Client().get('/api/metrics/', **headers)
+
+    def test_fetch_tickets_is_recorded_per_action(self):
+        self.client.force_authenticate(user=self.agent)
+        self.client.get('/api/tickets/fetch-tickets/')
+        res = self.scrape(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+
+        labels = 'view="TicketViewSet",action="fetch_tickets",method="GET"'
+        self.assertIn(f'http_requests_total{{{labels},status="200"}}', body)
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}}', body)
+        self.assertIn(f'db_queries_per_request_sum{{{labels}}}', body)
+
+    def test_registry_merges_worker_snapshots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            worker = MetricsRegistry(directory)
+            worker.inc('http_requests_total', ('TicketViewSet', 'list', 'GET', '200'), 2)
+            worker.flush()
+            os.rename(os.path.join(directory, f'metrics_{os.getpid()}.json'), os.path.join(directory, 'metrics_1.json'))
+
+            scraper = MetricsRegistry(directory)
+            scraper.inc('http_requests_total', ('TicketViewSet', 'list', 'GET', '200'), 3)
+            counters, _ = scraper.collect()
+
+        self.assertEqual(counters[('http_requests_total', ('TicketViewSet', 'list', 'GET', '200'))], 5)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_scrape_is_denied_by_default(self):
+        self.assertEqual(self.scrape().status_code, 401)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.agent)}').status_code, 401)
+        client = Client()
+        client.force_login(self.agent)
+        self.assertEqual(client.get('/api/metrics/').status_code, 401)
+        client.force_login(self.admin)
+        self.assertEqual(client.get('/api/metrics/').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_scrape_with_metrics_token(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secre').status_code, 401)
+
+    def test_collect_folds_exited_workers_into_one_file(self):
+        labels = ('TicketViewSet', 'list', 'GET', '200')
+        with tempfile.TemporaryDirectory() as directory:
+            worker = MetricsRegistry(directory)
+            worker.inc('http_requests_total', labels, 2)
+            worker.flush()
+            own = os.path.join(directory, f'metrics_{os.getpid()}.json')
+            for pid in (2 ** 22 + 1, 2 ** 22 + 2):
+                shutil.copy(own, os.path.join(directory, f'metrics_{pid}.json'))
+            os.remove(own)
+
+            counters, _ = MetricsRegistry(directory).collect()
+            self.assertEqual(counters[('http_requests_total', labels)], 4)
+            self.assertEqual(sorted(name for name in os.listdir(directory) if name.endswith('.json')), ['metrics_dead.json'])
+
+            # The live worker's own samples are added on top of the folded totals.
+            counters, _ = worker.collect()
+            self.assertEqual(counters[('http_requests_total', labels)], 6)
+
+
+class LeanReadPathTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        for i in range(20):
+            Ticket.objects.create(subject=f"Ticket {i} é", description="line\u2028sep", created_by=self.admin)
+        Ticket.objects.create(subject="Orphan", description="desc")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.agent)
+
+    def test_read_serializer_output_is_byte_compatible(self):
+        assign_tickets_to_agent(self.agent)
+        tickets = list(Ticket.objects.select_related('created_by'))
+        expected = JSONRenderer().render(TicketSerializer(tickets, many=True).data)
+        actual = FastJSONRenderer().render(TicketReadSerializer(tickets, many=True).data)
+        self.assertEqual(actual, expected)
+
+    def test_fetch_and_list_query_count_does_not_grow_with_rows(self):
+        self.client.get('/api/tickets/fetch-tickets/')
+        # The compact default leaves out created_by, so there is no creator prefetch.
+        with self.assertNumQueries(1):
+            res = self.client.get('/api/tickets/fetch-tickets/')
+        self.assertEqual(len(res.data), 15)
+        with self.assertNumQueries(2):
+            res = self.client.get('/api/tickets/fetch-tickets/?omit=')
+        self.assertEqual(len(res.data), 15)
+        with self.assertNumQueries(1):
+            res = self.client.get('/api/tickets/')
+        self.assertEqual(len(res.data['results']), 15)
+
+
+class FetchTicketsETagTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        for i in range(20):
+            Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.agent)
+        cache.clear()
+
+    def full_batch_etag(self):
+        self.client.get('/api/tickets/fetch-tickets/')
+        res = self.client.get('/api/tickets/fetch-tickets/')
+        self.assertIn('ETag', res)
+        return res['ETag']
+
+    def test_unchanged_full_batch_returns_304_without_queries(self):
+        etag = self.full_batch_etag()
+        with self.assertNumQueries(0):
+            res = self.client.get('/api/tickets/fetch-tickets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+    def test_sell_invalidates_etag(self):
+        etag = self.full_batch_etag()
+        ticket = Ticket.objects.filter(assigned_to=self.agent).first()
+        self.client.post(f'/api/tickets/{ticket.id}/sell/')
+
+        res = self.client.get('/api/tickets/fetch-tickets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn(ticket.id, {t['id'] for t in res.data})
+
+    def test_admin_update_invalidates_etag(self):
+        etag = self.full_batch_etag()
+        ticket = Ticket.objects.filter(assigned_to=self.agent).first()
+        self.client.force_authenticate(user=self.admin)
+        self.client.patch(f'/api/tickets/{ticket.id}/', {'subject': 'Changed'})
+
+        self.client.force_authenticate(user=self.agent)
+        res = self.client.get('/api/tickets/fetch-tickets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Changed', {t['subject'] for t in res.data})
+
+    def test_partial_batch_has_no_etag(self):
+        Ticket.objects.filter(id__in=Ticket.objects.values('id')[:10]).delete()
+        res = self.client.get('/api/tickets/fetch-tickets/')
+        self.assertEqual(len(res.data), 10)
+        self.assertNotIn('ETag', res)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        for i in range(20):
+            Ticket.objects.create(subject=f"Ticket {i}", description="x" * 2000, created_by=self.admin)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.agent)
+        cache.clear()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200, res.content)
+        return res, ' '.join(query['sql'] for query in queries)
+
+    def test_fields_and_omit_limit_the_columns_read(self):
+        assign_tickets_to_agent(self.agent)
+        res, sql = self.get('/api/tickets/?fields=id,subject&page_size=5')
+        self.assertEqual([set(t) for t in res.data['results']], [{'id', 'subject'}] * 5)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('users_user', sql)
+
+        res, sql = self.get('/api/tickets/?omit=description,updated_at&page_size=5')
+        self.assertEqual(set(res.data['results'][0]), set(TICKET_FIELDS) - {'description', 'updated_at'})
+        self.assertEqual(res.data['results'][0]['created_by'], {'id': self.admin.id, 'username': 'admin'})
+        self.assertNotIn('"description"', sql)
+
+        # Pagination keeps working on the ordering fields even when they aren't rendered.
+        ids, url = [], '/api/tickets/?fields=subject&page_size=7'
+        while url:
+            res, _ = self.get(url)
+            ids += [t['subject'] for t in res.data['results']]
+            url = res.data['next']
+        self.assertEqual(len(ids), 15)
+
+        ticket = Ticket.objects.filter(assigned_to=self.agent).first()
+        res, sql = self.get(f'/api/tickets/{ticket.id}/?fields=id,created_by')
+        self.assertEqual(res.data, {'id': ticket.id, 'created_by': {'id': self.admin.id, 'username': 'admin'}})
+        self.assertNotIn('"description"', sql)
+
+    def test_bad_field_lists_are_rejected(self):
+        for query in ('fields=id,nope', 'omit=nope', 'fields=', 'fields=id&omit=subject', 'omit=' + ','.join(TICKET_FIELDS)):
+            self.assertEqual(self.client.get(f'/api/tickets/?{query}').status_code, 400, query)
+
+    def test_fetch_tickets_defaults_to_the_compact_projection(self):
+        res, sql = self.get('/api/tickets/fetch-tickets/')
+        self.assertEqual([list(t) for t in res.data], [list(settings.TICKET_FETCH_FIELDS)] * 15)
+        self.assertNotIn('"description"', sql)
+        compact_etag = self.get('/api/tickets/fetch-tickets/')[0]['ETag']
+        self.assertEqual(self.client.get('/api/tickets/fetch-tickets/', HTTP_IF_NONE_MATCH=compact_etag).status_code, 304)
+
+        res, sql = self.get('/api/tickets/fetch-tickets/?omit=')
+        self.assertEqual(list(res.data[0]), list(TICKET_FIELDS))
+        self.assertEqual(res.data[0]['description'], "x" * 2000)
+        # The full rendering is a different body, so the compact batch's ETag doesn't match it.
+        self.assertNotEqual(res['ETag'], compact_etag)
+        self.assertEqual(self.client.get('/api/tickets/fetch-tickets/?omit=', HTTP_IF_NONE_MATCH=compact_etag).status_code, 200)
+
+        with override_settings(TICKET_FETCH_FIELDS=[]):
+            res, _ = self.get('/api/tickets/fetch-tickets/')
+        self.assertEqual(list(res.data[0]), list(TICKET_FIELDS))
+
+    @override_settings(TICKET_ASSIGNMENT_ENGINE='orm')
+    def test_claims_load_only_the_requested_fields(self):
+        tickets = assign_tickets_to_agent(self.agent, fields=('subject',))
+        self.assertEqual(len(tickets), 15)
+        self.assertEqual(tickets[0].get_deferred_fields() & {'subject', 'created_at', 'creation_order'}, set())
+        self.assertIn('description', tickets[0].get_deferred_fields())
+        # The PostgreSQL claim selects the same columns by name.
+        self.assertEqual(_read_columns(('id', 'created_at', 'creation_order', 'assigned_to')), ('id', 'assigned_to_id', 'created_at', 'creation_order'))
+
+
+class LocalRedis:
+    """Stand-in for a redis client: runs the GCRA script's logic against a dict."""
+
+    def __init__(self):
+        self.values = {}
+
+    def register_script(self, source):
+        def script(keys, args):
+            now, interval, period = (float(arg) for arg in args)
+            tat = max(self.values.get(keys[0], now), now) + interval
+            if tat - now > period:
+                return [0, str(tat - period - now)]
+            self.values[keys[0]] = tat
+            return [1, '0']
+        return script
+
+
+class ThrottleTests(TestCase):
+    def test_gcra_allows_a_burst_then_one_request_per_interval(self):
+        store = MemoryThrottleStore()
+        results = [store.hit('k', 3, 60, now=1000.0) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+        self.assertAlmostEqual(results[-1][1], 20.0)
+        self.assertTrue(store.hit('k', 3, 60, now=1020.0)[0])
+        self.assertFalse(store.hit('k', 3, 60, now=1020.0)[0])
+
+    def test_sqlite_store_is_shared_between_workers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'throttle.sqlite3')
+            workers = [SQLiteThrottleStore(path), SQLiteThrottleStore(path)]
+            results = [workers[i % 2].hit('user_1', 3, 60, now=1000.0) for i in range(4)]
+            self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+            self.assertAlmostEqual(results[-1][1], 20.0)
+            self.assertTrue(workers[0].hit('user_2', 3, 60, now=1000.0)[0])
+
+    def test_redis_store_matches_gcra(self):
+        store = RedisThrottleStore(client=LocalRedis())
+        tat = None
+        for _ in range(5):
+            expected, tat, wait = gcra(tat, 1000.0, 3, 60)
+            self.assertEqual(store.hit('k', 3, 60, now=1000.0), (expected, wait))
+
+    def test_burst_caps_back_to_back_requests(self):
+        store = MemoryThrottleStore()
+        results = [store.hit('k', 4, 60, now=1000.0, burst=2)[0] for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        # One request per interval (15s) afterwards, as without a burst cap.
+        self.assertTrue(store.hit('k', 4, 60, now=1015.0, burst=2)[0])
+        self.assertFalse(store.hit('k', 4, 60, now=1015.0, burst=2)[0])
+
+    def test_stores_agree_on_burst(self):
+        with tempfile.TemporaryDirectory() as directory:
+            stores = [MemoryThrottleStore(), SQLiteThrottleStore(os.path.join(directory, 'throttle.sqlite3')), RedisThrottleStore(client=LocalRedis())]
+            for store in stores:
+                self.assertEqual([store.hit('k', 4, 60, now=1000.0, burst=2)[0] for _ in range(3)], [True, True, False])
+
+    def test_default_sqlite_path_is_per_deployment(self):
+        path = default_sqlite_path()
+        self.assertRegex(os.path.basename(path), r'^support_system_throttle-[0-9a-f]{16}\.sqlite3$')
+        with override_settings(BASE_DIR='/srv/other-checkout'):
+            self.assertNotEqual(default_sqlite_path(), path)
+
+    @override_settings(THROTTLE_STORE='memory')
+    def test_failing_store_limits_per_process(self):
+        agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        client = APIClient()
+        client.force_authenticate(user=agent)
+        with mock.patch.dict(UserRateThrottle.THROTTLE_RATES, {'user': '2/min'}), \
+                mock.patch('support_system.throttling.get_throttle_store', return_value=mock.Mock(**{'hit.side_effect': ThrottleStoreError('database is locked')})):
+            with self.assertLogs('support_system.throttling', 'WARNING'):
+                statuses = [client.get('/api/tickets/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    @override_settings(THROTTLE_STORE='memory')
+    def test_api_returns_429_with_retry_after(self):
+        agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        client = APIClient()
+        client.force_authenticate(user=agent)
+        with mock.patch.dict(UserRateThrottle.THROTTLE_RATES, {'user': '2/min'}):
+            statuses = [client.get('/api/tickets/').status_code for _ in range(3)]
+            res = client.get('/api/tickets/')
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(res.status_code, 429)
+        self.assertIn('Retry-After', res)
+
+
+class TicketSellTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.other = User.objects.create_user(username='agent2', password='agentpass', role='agent')
+        self.mine = [Ticket.objects.create(subject=f"Mine {i}", description="desc", created_by=self.admin, assigned_to=self.agent) for i in range(3)]
+        self.sold = Ticket.objects.create(subject="Sold", description="desc", created_by=self.admin, assigned_to=self.agent, is_sold=True)
+        self.theirs = Ticket.objects.create(subject="Theirs", description="desc", created_by=self.admin, assigned_to=self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.agent)
+
+    def test_bulk_sell_reports_per_id_outcomes(self):
+        ids = [self.mine[0].id, self.sold.id, self.theirs.id, self.mine[1].id, 999999]
+        res = self.client.post('/api/tickets/sell/', {'ids': ids}, format='json')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['sold'], 2)
+        self.assertEqual(res.data['results'], [
+            {'id': self.mine[0].id, 'outcome': 'sold'},
+            {'id': self.sold.id, 'outcome': 'already_sold'},
+            {'id': self.theirs.id, 'outcome': 'not_yours'},
+            {'id': self.mine[1].id, 'outcome': 'sold'},
+            {'id': 999999, 'outcome': 'not_yours'},
+        ])
+        self.assertEqual(set(Ticket.objects.filter(is_sold=True).values_list('id', flat=True)), {self.mine[0].id, self.mine[1].id, self.sold.id})
+
+    def test_bulk_sell_validates_ids(self):
+        self.assertEqual(self.client.post('/api/tickets/sell/', {'ids': []}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/tickets/sell/', {'ids': ['x']}, format='json').status_code, 400)
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.post('/api/tickets/sell/', {'ids': [self.mine[0].id]}, format='json').status_code, 403)
+
+    def test_single_sell_uses_the_same_outcomes(self):
+        url = f'/api/tickets/{self.mine[2].id}/sell/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.post('/api/tickets/999999/sell/').status_code, 404)
+        self.assertEqual(self.client.post('/api/tickets/abc/sell/').status_code, 404)
+
+    def test_single_sell_of_another_agents_ticket_is_forbidden(self):
+        res = self.client.post(f'/api/tickets/{self.theirs.id}/sell/')
+        self.assertEqual((res.status_code, res.data), (403, {"detail": "Unauthorized"}))
+        self.assertFalse(Ticket.objects.get(id=self.theirs.id).is_sold)
+
+    def test_selling_twice_reports_already_sold(self):
+        first = sell_tickets(self.agent, [t.id for t in self.mine])
+        second = sell_tickets(self.agent, [t.id for t in self.mine])
+        self.assertEqual(set(first.values()), {'sold'})
+        self.assertEqual(set(second.values()), {'already_sold'})
+
+    @skipUnless(connection.vendor == 'postgresql', "UPDATE ... RETURNING path requires PostgreSQL")
+    def test_sql_sell_only_touches_own_unsold_tickets(self):
+        sold = _sell_tickets_sql(self.agent, [self.mine[0].id, self.sold.id, self.theirs.id], timezone.now(), 'default')
+        self.assertEqual(set(sold), {self.mine[0].id})
+
+
+class TicketArchiveTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.old_sold = [Ticket.objects.create(subject=f"Old {i}", description="desc", created_by=self.admin, assigned_to=self.agent, is_sold=True) for i in range(5)]
+        self.open = Ticket.objects.create(subject="Open", description="desc", created_by=self.admin, assigned_to=self.agent)
+        self.cutoff = timezone.now()
+        self.recent_sold = Ticket.objects.create(subject="Recent", description="desc", created_by=self.admin, assigned_to=self.agent, is_sold=True)
+
+    def test_archives_old_sold_tickets_in_batches(self):
+        report = archive_sold_tickets(self.cutoff, batch_size=2)
+
+        self.assertEqual(report['tickets'], 5)
+        self.assertEqual(report['batches'], 3)
+        self.assertEqual(set(Ticket.objects.values_list('id', flat=True)), {self.open.id, self.recent_sold.id})
+        archived = ArchivedTicket.objects.get(id=self.old_sold[0].id)
+        self.assertEqual((archived.subject, archived.creation_order, archived.assigned_to_id),
+                         (self.old_sold[0].subject, self.old_sold[0].creation_order, self.agent.id))
+        self.assertEqual(archive_sold_tickets(self.cutoff)['tickets'], 0)
+
+    def test_new_tickets_never_reuse_archived_creation_order(self):
+        archive_sold_tickets(timezone.now())
+        ticket = Ticket.objects.create(subject="New", description="desc", created_by=self.admin)
+        self.assertGreater(ticket.creation_order, max(t.creation_order for t in self.old_sold + [self.recent_sold]))
+
+    def test_command_reports_counts(self):
+        out = io.StringIO()
+        call_command('archive_tickets', '--days', '0', '--batch-size', '4', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['tickets'], 6)
+
+    def test_admins_read_archived_tickets_through_the_api(self):
+        archive_sold_tickets(self.cutoff)
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+
+        res = client.get('/api/tickets/archived/?page_size=3')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([t['id'] for t in res.data['results']], [t.id for t in self.old_sold[:3]])
+        self.assertTrue(res.data['results'][0]['is_sold'])
+        self.assertIn('archived_at', res.data['results'][0])
+
+        res = client.get(f'/api/tickets/archived/{self.old_sold[0].id}/')
+        self.assertEqual(res.data['subject'], self.old_sold[0].subject)
+        self.assertEqual(len(client.get(f'/api/tickets/archived/?assigned_to={self.agent.id}').data['results']), 5)
+        self.assertEqual(client.get('/api/tickets/archived/?assigned_to=x').status_code, 400)
+
+        client.force_authenticate(user=self.agent)
+        self.assertEqual(client.get('/api/tickets/archived/').status_code, 403)
+
+    @skipUnless(connection.vendor == 'postgresql', "DELETE ... RETURNING archival requires PostgreSQL")
+    def test_sql_batch_moves_rows(self):
+        self.assertEqual(_archive_batch_sql(self.cutoff, 3, 'default'), 3)
+        self.assertEqual(ArchivedTicket.objects.count(), 3)
+
+
+class StaleAssignmentReaperTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.gone = User.objects.create_user(username='agent2', password='agentpass', role='agent', is_active=False)
+        self.other = User.objects.create_user(username='agent3', password='agentpass', role='agent')
+        now = timezone.now()
+        old = now - timedelta(hours=5)
+        self.stale = [Ticket.objects.create(subject=f"Stale {i}", description="desc", created_by=self.admin, assigned_to=self.agent, assigned_at=old) for i in range(2)]
+        self.fresh = Ticket.objects.create(subject="Fresh", description="desc", created_by=self.admin, assigned_to=self.agent, assigned_at=now)
+        self.sold = Ticket.objects.create(subject="Sold", description="desc", created_by=self.admin, assigned_to=self.agent, assigned_at=old, is_sold=True)
+        self.abandoned = Ticket.objects.create(subject="Abandoned", description="desc", created_by=self.admin, assigned_to=self.gone, assigned_at=now)
+        self.queued = Ticket.objects.create(subject="Queued", description="desc", created_by=self.admin)
+
+    def test_reclaims_expired_and_inactive_assignments_in_batches(self):
+        report = reclaim_stale_assignments(timedelta(hours=4), batch_size=1)
+
+        self.assertEqual((report['tickets'], report['batches'], report['agents']), (3, 3, 2))
+        self.assertIn('max_batch_seconds', report)
+        reclaimed = Ticket.objects.filter(assigned_to__isnull=True)
+        self.assertEqual(set(reclaimed.values_list('id', flat=True)), {self.stale[0].id, self.stale[1].id, self.abandoned.id, self.queued.id})
+        self.assertFalse(reclaimed.exclude(assigned_at=None).exists())
+        self.assertEqual(Ticket.objects.get(id=self.sold.id).assigned_to_id, self.agent.id)
+        self.assertEqual(Ticket.objects.get(id=self.fresh.id).assigned_to_id, self.agent.id)
+
+    def test_reclaimed_tickets_keep_their_queue_position(self):
+        reclaim_stale_assignments(timedelta(hours=4))
+        tickets = assign_tickets_to_agent(self.other, 4)
+        self.assertEqual([t.id for t in tickets], [self.stale[0].id, self.stale[1].id, self.abandoned.id, self.queued.id])
+        self.assertEqual(Ticket.objects.get(id=self.stale[0].id).creation_order, self.stale[0].creation_order)
+
+    def test_lease_only(self):
+        report = reclaim_stale_assignments(timedelta(hours=4), include_inactive=False)
+        self.assertEqual(report['tickets'], 2)
+        self.assertEqual(Ticket.objects.get(id=self.abandoned.id).assigned_to_id, self.gone.id)
+
+    def test_command_reports_counts(self):
+        out = io.StringIO()
+        call_command('reclaim_tickets', '--lease', '14400', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['tickets'], 3)
+
+    def test_periodic_job_runs_until_stopped(self):
+        reaper = StaleAssignmentReaper()
+        with mock.patch('tickets.reaper.reclaim_stale_assignments', return_value={'tickets': 0}) as reclaim:
+            reaper.start(interval=0.01)
+            deadline = time.monotonic() + 5
+            while reclaim.call_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            reaper.stop()
+            reaper._thread.join(1)
+        self.assertGreaterEqual(reclaim.call_count, 2)
+        self.assertEqual(reaper.last_report, {'tickets': 0})
+
+    @skipUnless(connection.vendor == 'postgresql', "UPDATE ... FROM reclaim requires PostgreSQL")
+    def test_sql_batch_returns_previous_agents(self):
+        agent_ids = _reclaim_batch_sql(timezone.now() - timedelta(hours=4), 10, True, 'default')
+        self.assertEqual(sorted(agent_ids), sorted([self.agent.id, self.agent.id, self.gone.id]))
+
+
+class TicketSearchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin', is_staff=True, is_superuser=True)
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        texts = [
+            ("Printer jammed", "Paper stuck in tray 2"),
+            ("Refund request", "Customer wants a refund for the printer"),
+            ("Login issue", "Cannot sign in"),
+            ("Printer offline", "Shows offline after update"),
+            ("Billing", "Invoice for printer toner"),
+        ]
+        self.tickets = [Ticket.objects.create(subject=subject, description=description, created_by=self.admin, assigned_to=self.agent) for subject, description in texts]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.agent)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            ids.extend(t['id'] for t in res.data['results'])
+            url = res.data['next']
+        return ids
+
+    def test_q_returns_ranked_matches_across_cursor_pages(self):
+        ids = self.walk('/api/tickets/?q=printer&page_size=1')
+
+        subject_matches = [self.tickets[0].id, self.tickets[3].id]
+        description_matches = [self.tickets[1].id, self.tickets[4].id]
+        self.assertEqual(ids, subject_matches + description_matches)
+
+    def test_previous_link_on_ranked_results(self):
+        first = self.client.get('/api/tickets/?q=printer&page_size=2')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([t['id'] for t in back.data['results']], [t['id'] for t in first.data['results']])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.walk('/api/tickets/?q=printer%20offline'), [self.tickets[3].id])
+        self.assertEqual(self.walk('/api/tickets/?q=%20'), [t.id for t in self.tickets])
+
+    def test_admin_search_uses_full_text_search(self):
+        self.client.force_login(self.admin)
+        with mock.patch('tickets.admin.search_condition', wraps=search_condition) as search:
+            res = self.client.get('/admin/tickets/ticket/?q=refund')
+        self.assertEqual(res.status_code, 200)
+        search.assert_called_once()
+        self.assertContains(res, 'Refund request')
+        self.assertNotContains(res, 'Login issue')
+
+    def test_search_vector_is_not_loaded_with_tickets(self):
+        self.assertIn('search_vector', Ticket.objects.first().get_deferred_fields())
+
+    @skipUnless(connection.vendor == 'postgresql', "tsvector search requires PostgreSQL")
+    def test_trigger_maintains_search_vector(self):
+        ticket = self.tickets[2]
+        self.assertEqual(list(search_tickets(Ticket.objects.all(), 'sign').values_list('id', flat=True)), [ticket.id])
+        ticket.description = "Password reset loops"
+        ticket.save()
+        self.assertFalse(search_tickets(Ticket.objects.all(), 'sign').exists())
+        self.assertTrue(search_tickets(Ticket.objects.all(), 'passwords').exists())
+
+
+class TicketExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.tickets = [
+            Ticket.objects.create(subject=f"Ticket {i}", description='line one\nline, "two"', created_by=self.admin,
+                                  assigned_to=self.agent if i % 2 else None)
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def body(self, res):
+        self.assertEqual(res.status_code, 200)
+        return b''.join(res.streaming_content)
+
+    def test_csv_export_streams_every_ticket_with_usernames(self):
+        with self.assertNumQueries(1):
+            res = self.client.get('/api/tickets/export/?format=csv')
+            rows = list(csv.DictReader(io.StringIO(self.body(res).decode())))
+        self.assertTrue(res.streaming)
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        self.assertEqual([int(row['id']) for row in rows], [t.id for t in self.tickets])
+        self.assertEqual(rows[0]['description'], 'line one\nline, "two"')
+        self.assertEqual(rows[0]['created_by_username'], 'admin')
+        self.assertEqual((rows[0]['assigned_to_username'], rows[1]['assigned_to_username']), ('', 'agent1'))
+        self.assertEqual(rows[0]['is_sold'], 'false')
+
+    def test_ndjson_matches_list_representation(self):
+        res = self.client.get('/api/tickets/export/?format=ndjson')
+        lines = [json.loads(line) for line in self.body(res).splitlines()]
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        expected = TicketReadSerializer(Ticket.objects.order_by('created_at', 'creation_order'), many=True).data
+        self.assertEqual(lines, json.loads(JSONRenderer().render(expected)))
+
+    def test_gzip_when_accepted(self):
+        res = self.client.get('/api/tickets/export/?format=ndjson', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(len(gzip.decompress(self.body(res)).splitlines()), 5)
+
+    def test_search_filter_applies(self):
+        res = self.client.get('/api/tickets/export/?format=ndjson&q=Ticket%203')
+        self.assertEqual([json.loads(line)['id'] for line in self.body(res).splitlines()], [self.tickets[3].id])
+
+    def test_chunks_are_bounded(self):
+        with mock.patch('tickets.export.FLUSH_SIZE', 100):
+            chunks = list(export_csv(Ticket.objects.order_by('id'), chunk_size=2))
+        self.assertGreater(len(chunks), 2)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(user=self.agent)
+        res = self.client.get('/api/tickets/export/?format=csv')
+        self.assertEqual(res.status_code, 403)
+        self.assertIn(b'detail', res.content)
+
+
+class TicketCounterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.agent2 = User.objects.create_user(username='agent2', password='agentpass', role='agent')
+        for i in range(20):
+            Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin)
+        self.client = APIClient()
+
+    def counters(self):
+        counts = {}
+        for scope, open_tickets, sold in TicketCounter.objects.values_list('scope', 'open_tickets', 'sold_tickets'):
+            total = counts.setdefault(scope, [0, 0])
+            total[0] += open_tickets
+            total[1] += sold
+        return {scope: total for scope, total in counts.items() if total != [0, 0]}
+
+    def assertCountersMatchTickets(self):
+        actual = {scope: total for scope, total in actual_counts().items() if total != [0, 0]}
+        self.assertEqual(self.counters(), actual)
+
+    def test_counters_follow_every_write_path(self):
+        self.assertEqual(queue_depth(), 20)
+        tickets = assign_tickets_to_agent(self.agent)
+        self.assertEqual(len(tickets), 15)
+        self.assertEqual(dispatch_ticket_assignments(agent_limit=5), {'tickets': 5, 'agents': 1})
+        sell_tickets(self.agent, [t.id for t in tickets[:4]])
+        self.assertCountersMatchTickets()
+        self.assertEqual(self.counters()[self.agent.id], [11, 4])
+
+        Ticket.objects.filter(id=tickets[5].id).update(assigned_at=timezone.now() - timedelta(days=1))
+        reclaim_stale_assignments(timedelta(hours=1))
+        self.assertCountersMatchTickets()
+
+        ticket = Ticket.objects.get(id=tickets[6].id)
+        ticket.assigned_to = self.agent2
+        ticket.save()
+        Ticket.objects.get(id=tickets[7].id).delete()
+        Ticket.objects.filter(id__in=[t.id for t in tickets[8:10]]).delete()
+        self.assertCountersMatchTickets()
+
+        archive_sold_tickets(timezone.now())
+        self.agent2.delete()
+        self.assertEqual(self.counters()[TicketCounter.GLOBAL_SCOPE], [queue_depth(), 4])
+        self.assertEqual(queue_depth(), Ticket.objects.filter(assigned_to__isnull=True, is_sold=False).count())
+
+    def test_deleting_sold_tickets_matches_reconcile(self):
+        tickets = assign_tickets_to_agent(self.agent)
+        sell_tickets(self.agent, [t.id for t in tickets[:4]])
+        archive_sold_tickets(timezone.now(), batch_size=1)
+        sell_tickets(self.agent, [t.id for t in tickets[4:7]])
+        Ticket.objects.get(id=tickets[4].id).delete()
+        Ticket.objects.filter(id__in=[t.id for t in tickets[5:6]]).delete()
+
+        self.assertEqual(self.counters()[self.agent.id], [8, 5])
+        self.assertEqual(reconcile_counters()['drifted'], 0)
+
+    @override_settings(TICKET_COUNTER_RECHECK_SECONDS=3600)
+    def test_fetch_skips_claim_when_queue_counter_is_empty(self):
+        queue_recheck.reset()
+        self.addCleanup(queue_recheck.reset)
+        TicketCounter.objects.all().delete()
+        Ticket.objects.update(is_sold=True)
+        with mock.patch('tickets.utils._assign_tickets_orm') as claim:
+            self.assertEqual(assign_tickets_to_agent(self.agent), [])
+            # Until the next re-check the confirmed answer is reused.
+            Ticket.objects.update(is_sold=False)
+            self.assertEqual(assign_tickets_to_agent(self.agent), [])
+        claim.assert_not_called()
+
+    @override_settings(TICKET_COUNTER_RECHECK_SECONDS=0)
+    def test_fetch_claims_despite_counter_drift(self):
+        queue_recheck.reset()
+        self.addCleanup(queue_recheck.reset)
+        TicketCounter.objects.all().delete()
+        with self.assertLogs('tickets.stats', 'WARNING'):
+            self.assertEqual(len(assign_tickets_to_agent(self.agent)), 15)
+
+        report = reconcile_counters()
+        self.assertEqual(report['queue_depth'], 5)
+        self.assertEqual(reconcile_counters()['drifted'], 0)
+
+    def test_migration_fills_the_same_counts(self):
+        tickets = assign_tickets_to_agent(self.agent)
+        sell_tickets(self.agent, [t.id for t in tickets[:4]])
+        archive_sold_tickets(timezone.now())
+        sell_tickets(self.agent, [t.id for t in tickets[4:6]])
+        migration = importlib.import_module('tickets.migrations.0006_ticket_counters')
+        TicketCounter.objects.all().delete()
+        migration.fill_counters(django_apps, SimpleNamespace(connection=connection))
+        self.assertCountersMatchTickets()
+
+    def test_reconcile_command(self):
+        TicketCounter.objects.update(open_tickets=0)
+        out = io.StringIO()
+        call_command('reconcile_counters', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['queue_depth'], 20)
+        self.assertEqual(queue_depth(), 20)
+
+    def test_stats_endpoint(self):
+        tickets = assign_tickets_to_agent(self.agent)
+        sell_tickets(self.agent, [t.id for t in tickets[:3]])
+        self.client.force_authenticate(user=self.admin)
+
+        res = self.client.get('/api/stats/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['queue_depth'], res.data['sold']), (5, 3))
+        hour = res.data['hourly'][-1]
+        self.assertEqual((hour['assigned'], hour['sold']), (15, 3))
+        self.assertIsNotNone(hour['avg_sale_latency_seconds'])
+        self.assertEqual(self.client.get('/api/stats/?hours=0').status_code, 400)
+
+        res = self.client.get(f'/api/stats/agents/?agent={self.agent.id}')
+        self.assertEqual(res.data['results'], [{'agent': self.agent.id, 'open': 12, 'sold': 3}])
+
+        self.client.force_authenticate(user=self.agent)
+        self.assertEqual(self.client.get('/api/stats/').status_code, 403)
+
+
+class TicketAdminChangeListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.tickets = [
+            Ticket.objects.create(subject=f"Ticket {i}", description="desc", created_by=self.admin, assigned_to=self.agent if i % 2 else None)
+            for i in range(7)
+        ]
+        self.client.force_login(self.admin)
+
+    def test_pages_follow_the_keyset_cursor(self):
+        with mock.patch.object(TicketAdmin, 'list_per_page', 3):
+            res = self.client.get('/admin/tickets/ticket/')
+            self.assertEqual(res.status_code, 200)
+            cl = res.context['cl']
+            self.assertTrue(cl.keyset)
+            self.assertIsNone(cl.previous_url)
+            seen = [ticket.id for ticket in cl.result_list]
+            pages = [seen]
+            while cl.next_url:
+                cl = self.client.get(f'/admin/tickets/ticket/{cl.next_url}').context['cl']
+                pages.append([ticket.id for ticket in cl.result_list])
+            back = self.client.get(f'/admin/tickets/ticket/{cl.previous_url}').context['cl']
+        expected = [ticket.id for ticket in sorted(self.tickets, key=lambda t: (t.created_at, t.creation_order), reverse=True)]
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([ticket.id for ticket in back.result_list], pages[1])
+        self.assertIsNotNone(back.first_url)
+
+    def test_changelist_does_not_count_or_list_every_agent(self):
+        for i in range(20):
+            User.objects.create_user(username=f'filler{i}', password='agentpass', role='agent')
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get('/admin/tickets/ticket/')
+        self.assertEqual(res.status_code, 200)
+        self.assertNotContains(res, 'filler')
+        self.assertContains(res, 'name="assigned_to"')
+        user_queries = [query['sql'] for query in queries if 'FROM "users_user"' in query['sql'].split('INNER JOIN')[0]]
+        # The session user only; row users come from the select_related join.
+        self.assertLessEqual(len(user_queries), 1)
+        self.assertFalse([query['sql'] for query in queries if 'COUNT(' in query['sql'] and 'LIMIT' not in query['sql']])
+
+    def test_assigned_to_filter_takes_an_id_or_username(self):
+        assigned = sorted(ticket.id for ticket in self.tickets if ticket.assigned_to_id)
+        for value in (self.agent.username, str(self.agent.id)):
+            cl = self.client.get('/admin/tickets/ticket/', {'assigned_to': value}).context['cl']
+            self.assertEqual(sorted(ticket.id for ticket in cl.result_list), assigned)
+        cl = self.client.get('/admin/tickets/ticket/', {'assigned_to': 'nobody'}).context['cl']
+        self.assertEqual(list(cl.result_list), [])
+
+    def test_search_matches_text_or_assignee(self):
+        assigned = sorted(ticket.id for ticket in self.tickets if ticket.assigned_to_id)
+        cl = self.client.get('/admin/tickets/ticket/', {'q': 'agent1'}).context['cl']
+        self.assertEqual(sorted(ticket.id for ticket in cl.result_list), assigned)
+        cl = self.client.get('/admin/tickets/ticket/', {'q': 'Ticket 2'}).context['cl']
+        self.assertEqual([ticket.id for ticket in cl.result_list], [self.tickets[2].id])
+
+    def test_only_indexed_columns_are_sortable(self):
+        # Column 3 is assigned_to, which is not in sortable_by, so the indexed default order stays.
+        res = self.client.get('/admin/tickets/ticket/', {'o': '3'})
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.context['cl'].keyset)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_counts_are_estimated_above_the_limit(self):
+        queryset = Ticket.objects.all()
+        self.assertEqual(EstimatedCountPaginator(queryset.filter(assigned_to=self.agent), 2).count, 3)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Ticket._meta.db_table}')
+            self.assertEqual(planner_estimate(queryset), 7)
+            with override_settings(ADMIN_EXACT_COUNT_LIMIT=5):
+                paginator = EstimatedCountPaginator(queryset, 2)
+                self.assertEqual((paginator.count, paginator.estimated), (7, True))
+        else:
+            # No planner statistics off PostgreSQL: count exactly.
+            self.assertIsNone(planner_estimate(queryset))
+            with override_settings(ADMIN_EXACT_COUNT_LIMIT=5):
+                paginator = EstimatedCountPaginator(queryset, 2)
+                self.assertEqual((paginator.count, paginator.estimated), (7, False))
+        with mock.patch('support_system.changelist.planner_estimate', return_value=1000):
+            paginator = EstimatedCountPaginator(queryset, 2)
+            self.assertEqual((paginator.count, paginator.estimated), (1000, True))
+            res = self.client.get('/admin/tickets/ticket/')
+        self.assertContains(res, '~1000 tickets')
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        token = db_router._state.set({'pinned': False, 'wrote': False})
+        self.addCleanup(db_router._state.reset, token)
+        self.router = PrimaryReplicaRouter()
+        patcher = mock.patch.object(replica_health, 'is_healthy', return_value=True)
+        self.is_healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_reads_go_to_replicas_until_the_request_writes(self):
+        execute = mock.Mock()
+        self.assertEqual(self.router.db_for_read(Ticket), 'replica_1')
+        # Picking the write alias, plain reads and row locks don't pin.
+        self.assertEqual(self.router.db_for_write(Ticket), 'default')
+        record_writes(execute, 'SELECT 1', None, False, {})
+        record_writes(execute, 'WITH head AS (SELECT id FROM t FOR UPDATE SKIP LOCKED) SELECT id FROM head', None, False, {})
+        self.assertEqual(self.router.db_for_read(Ticket), 'replica_1')
+        record_writes(execute, 'WITH picked AS MATERIALIZED (SELECT id FROM t) UPDATE t SET x = 1 FROM picked', None, False, {})
+        self.assertEqual(self.router.db_for_read(Ticket), 'default')
+        self.assertEqual(execute.call_count, 3)
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_use_primary_and_unhealthy_replicas(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Ticket), 'default')
+        self.assertEqual(self.router.db_for_read(Ticket), 'replica_1')
+        self.is_healthy.return_value = False
+        self.assertEqual(self.router.db_for_read(Ticket), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Ticket), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'tickets'))
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_1', 'tickets'))
+
+    def test_check_requires_a_shared_pin_cache_with_replicas(self):
+        with override_settings(DEBUG=False, TESTING=False, DATABASE_REPLICAS=['replica_1']):
+            self.assertEqual([error.id for error in check_replica_pin_cache(None)], ['support_system.E001'])
+        with override_settings(DEBUG=False, TESTING=False, DATABASE_REPLICAS=[]):
+            self.assertEqual(check_replica_pin_cache(None), [])
+
+    def test_write_tracking_is_installed_once_on_the_primary(self):
+        # A reconnect inside an execute_wrapper() block must not end up last in the list.
+        primary = SimpleNamespace(alias='default', execute_wrappers=['timer'])
+        replica = SimpleNamespace(alias='replica_1', execute_wrappers=[])
+        with override_settings(DATABASE_REPLICAS=['replica_1']):
+            for connection_ in (primary, primary, replica):
+                track_writes(None, connection_)
+        self.assertEqual((primary.execute_wrappers, replica.execute_wrappers), ([record_writes, 'timer'], []))
+
+        unreplicated = SimpleNamespace(alias='default', execute_wrappers=[])
+        with override_settings(DATABASE_REPLICAS=[]):
+            track_writes(None, unreplicated)
+        self.assertEqual(unreplicated.execute_wrappers, [])
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'], DATABASE_REPLICA_PIN_SECONDS=5)
+    def test_client_that_wrote_is_pinned_on_its_next_requests(self):
+        cache.clear()
+        seen = []
+
+        def view(request):
+            self.router.db_for_write(Ticket)
+            if request.method == 'POST':
+                record_writes(mock.Mock(), 'INSERT INTO tickets_ticket DEFAULT VALUES', None, False, {})
+            seen.append(self.router.db_for_read(Ticket))
+            return HttpResponse()
+
+        middleware = PrimaryPinningMiddleware(view)
+        factory = RequestFactory()
+        middleware(factory.get('/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.get('/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.post('/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.get('/', HTTP_AUTHORIZATION='Bearer a'))
+        middleware(factory.get('/', HTTP_AUTHORIZATION='Bearer b'))
+        self.assertEqual(seen, ['replica_1', 'replica_1', 'default', 'default', 'replica_1'])
+
+    @override_settings(DATABASE_REPLICA_CHECK_INTERVAL=60)
+    def test_health_check_drops_unreachable_replica(self):
+        health = ReplicaHealth()
+        with mock.patch.object(health, 'check', return_value=False) as check:
+            self.assertFalse(health.is_healthy('replica_1'))
+            self.assertFalse(health.is_healthy('replica_1'))
+        check.assert_called_once_with('replica_1')
+        health.reset()
+        with mock.patch('support_system.db_router.connections') as connections:
+            connections.__getitem__.return_value.ensure_connection.side_effect = OperationalError
+            with self.assertLogs('support_system.db_router', 'WARNING'):
+                self.assertFalse(health.check('replica_1'))
+            connections.__getitem__.return_value.ensure_connection.side_effect = None
+            connections.__getitem__.return_value.vendor = 'sqlite'
+            self.assertTrue(health.check('replica_1'))
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "needs a replica alias, e.g. DB_REPLICAS=<DB_HOST>")
+class ReplicaAliasTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        replica_health.reset()
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin')
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.client = APIClient()
+
+    def test_reads_use_the_replica_and_writes_the_primary(self):
+        ticket = Ticket.objects.create(subject="Replica", description="desc", created_by=self.admin, assigned_to=self.agent)
+        self.client.force_authenticate(user=self.agent)
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[settings.DATABASE_REPLICAS[0]]) as replica:
+            self.assertEqual(self.client.get(f'/api/tickets/{ticket.id}/').status_code, 200)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse(primary.captured_queries)
+
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[settings.DATABASE_REPLICAS[0]]) as replica:
+            self.assertEqual(len(self.client.get('/api/tickets/fetch-tickets/').data), 1)
+        self.assertTrue(primary.captured_queries)
+        self.assertFalse(replica.captured_queries)
@@ -1,10 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TicketViewSet
+from .async_views import fetch_tickets_long_poll, ticket_events
+from .views import ArchivedTicketViewSet, TicketStatsViewSet, TicketViewSet
 
 router = DefaultRouter()
+# Registered before 'tickets' so tickets/archived/ isn't read as a ticket id.
+router.register(r'tickets/archived', ArchivedTicketViewSet, basename='archived-ticket')
 router.register(r'tickets', TicketViewSet, basename='ticket')
+router.register(r'stats', TicketStatsViewSet, basename='stats')
 
 urlpatterns = [
+    path('tickets/fetch-tickets/long-poll/', fetch_tickets_long_poll, name='ticket-fetch-tickets-long-poll'),
+    path('events/', ticket_events, name='ticket-events'),
     path('', include(router.urls)),
 ]
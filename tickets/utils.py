@@ -1,17 +1,159 @@
-from django.db import transaction
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.db.models import Count, Q
 from django.utils import timezone
-from .models import Ticket
+from .batch_cache import evict_batch_versions
+from .events import record_events
+from .lanes import LANES, agent_lanes
+from .models import Ticket, TicketEvent
+from .stats import queue_is_empty, record_assigned, record_sold
+
+MAX_TICKETS_PER_AGENT = 15
+
+SOLD = 'sold'
+ALREADY_SOLD = 'already_sold'
+NOT_YOURS = 'not_yours'
+
 
-def assign_tickets_to_agent(agent, max_tickets=15):
+def _use_sql(using):
+    engine = getattr(settings, 'TICKET_ASSIGNMENT_ENGINE', 'auto')
+    return engine == 'sql' or (engine == 'auto' and connections[using].vendor == 'postgresql')
+
+
+def assign_tickets_to_agent(agent, max_tickets=MAX_TICKETS_PER_AGENT, fields=None):
     """
     Assign up to max_tickets unassigned tickets to the agent,
     avoiding race conditions using select_for_update(skip_locked=True).
-    Returns a queryset of assigned tickets.
+    Returns a list of the agent's open tickets ordered by (created_at, creation_order).
+
+    Missing tickets are claimed from the agent's queue lanes in priority order:
+    the next lane is only read when the higher ones can't fill the batch.
+
+    Agents that already hold max_tickets are answered by a plain read that takes
+    no row locks, and so are all agents while the queue-depth counter says there
+    is nothing to claim (stats.queue_is_empty). Otherwise PostgreSQL claims the missing tickets with one
+    UPDATE ... RETURNING statement per lane visited; other backends use the ORM
+    implementation.
+
+    `fields` limits the Ticket fields read (the rest are deferred); the pk and
+    the ordering fields are always loaded.
     """
+    if fields is not None:
+        fields = tuple(dict.fromkeys(('id', 'created_at', 'creation_order', *fields)))
+    # Everything, including the lock-free read, runs on the primary: a lagging
+    # replica would hand out a stale batch.
+    using = router.db_for_write(Ticket)
+    current = _only(Ticket.objects.using(using).filter(assigned_to=agent, is_sold=False), fields)
+    current = list(current.order_by('created_at', 'creation_order')[:max_tickets])
+    if len(current) == max_tickets:
+        return current
+
+    if getattr(settings, 'TICKET_ASSIGNMENT_USE_COUNTERS', True) and queue_is_empty(using):
+        return current
+    lanes = agent_lanes(agent)
+    if _use_sql(using):
+        tickets = _assign_tickets_sql(agent, max_tickets, using, lanes, fields)
+    else:
+        tickets = _assign_tickets_orm(agent, max_tickets, lanes, fields)
+    evict_batch_versions(agent.pk, using=using)
+    return tickets
+
+
+def _only(queryset, fields):
+    return queryset if fields is None else queryset.only(*fields)
+
+
+def _read_columns(fields):
+    if fields is None:
+        return Ticket.READ_COLUMNS
+    columns = {Ticket._meta.get_field(name).column for name in fields}
+    return tuple(column for column in Ticket.READ_COLUMNS if column in columns)
 
+
+def _pick_sql(table, limit):
+    # Each lane's head is served by its own partial index (ticket_queue_<lane>_idx).
+    # Callers put this in a MATERIALIZED CTE and UPDATE ... FROM it: as a plain
+    # IN (subquery) PostgreSQL may rescan it, SKIP LOCKED then passes over the rows
+    # the statement already claimed and locks the next ones, and LIMIT caps nothing.
+    return f"""
+        SELECT id, created_at, creation_order FROM {table}
+        WHERE assigned_to_id IS NULL AND is_sold = false AND lane = %(lane)s
+        ORDER BY created_at, creation_order
+        LIMIT {limit}
+        FOR UPDATE SKIP LOCKED
+    """
+
+
+def _claim_sql(table, columns):
+    return f"""
+        WITH picked AS MATERIALIZED ({_pick_sql(table, '%(missing)s')})
+        UPDATE {table} t
+        SET assigned_to_id = %(agent)s, assigned_at = %(now)s, updated_at = %(now)s
+        FROM picked
+        WHERE t.id = picked.id
+        RETURNING {_qualified(columns, 't')}, true AS claimed
+    """
+
+
+def _qualified(columns, alias):
+    return ', '.join(f'{alias}.{column}' for column in columns)
+
+
+def _assign_tickets_sql(agent, max_tickets, using, lanes=LANES, fields=None):
+    # The outer SELECT reads the statement snapshot, so `current` never contains the
+    # rows claimed by the UPDATE and the two halves of the UNION cannot overlap.
+    # Columns left out of `fields` come back deferred on the raw instances.
+    table = Ticket._meta.db_table
+    read_columns = _read_columns(fields)
+    columns = ', '.join(read_columns)
+    sql = f"""
+        WITH current AS (
+            SELECT {columns} FROM {table}
+            WHERE assigned_to_id = %(agent)s AND is_sold = false
+            ORDER BY created_at, creation_order
+            LIMIT %(max)s
+        ),
+        picked AS MATERIALIZED ({_pick_sql(table, 'GREATEST(%(max)s - (SELECT count(*) FROM current), 0)')}),
+        claimed AS (
+            UPDATE {table} t
+            SET assigned_to_id = %(agent)s, assigned_at = %(now)s, updated_at = %(now)s
+            FROM picked
+            WHERE t.id = picked.id
+            RETURNING {_qualified(read_columns, 't')}
+        )
+        SELECT * FROM (
+            SELECT *, false AS claimed FROM current
+            UNION ALL
+            SELECT *, true AS claimed FROM claimed
+        ) batch
+        ORDER BY created_at, creation_order
+        LIMIT %(max)s
+    """
+    now = timezone.now()
+    params = {'agent': agent.pk, 'max': max_tickets, 'now': now, 'lane': lanes[0]}
+    with transaction.atomic(using=using):
+        tickets = list(Ticket.objects.raw(sql, params).using(using))
+        # Lower-priority lanes top up whatever the first lane couldn't fill.
+        for lane in lanes[1:]:
+            if len(tickets) >= max_tickets:
+                break
+            params.update(lane=lane, missing=max_tickets - len(tickets))
+            tickets += Ticket.objects.raw(_claim_sql(table, read_columns), params).using(using)
+        claimed = [ticket.id for ticket in tickets if ticket.claimed]
+        record_assigned({agent.pk: len(claimed)}, now, using=using)
+        record_events([(TicketEvent.ASSIGNED, ticket_id, agent.pk) for ticket_id in claimed], using=using)
+    if len(lanes) > 1:
+        tickets.sort(key=lambda t: (t.created_at, t.creation_order))
+    return tickets
+
+
+def _assign_tickets_orm(agent, max_tickets, lanes=LANES, fields=None):
     with transaction.atomic():
         # Get tickets currently assigned to agent (not sold), limit max_tickets
-        assigned_qs = Ticket.objects.select_for_update().filter(assigned_to=agent, is_sold=False).order_by('created_at', 'creation_order')[:max_tickets]
+        assigned_qs = _only(Ticket.objects, fields).select_for_update().filter(assigned_to=agent, is_sold=False).order_by('created_at', 'creation_order')[:max_tickets]
         assigned_tickets = list(assigned_qs)
         assigned_count = len(assigned_tickets)
 
@@ -20,16 +162,190 @@ def assign_tickets_to_agent(agent, max_tickets=15):
 
         needed = max_tickets - assigned_count
 
-        unassigned_qs = Ticket.objects.select_for_update(skip_locked=True).filter(assigned_to__isnull=True, is_sold=False).order_by('created_at', 'creation_order')[:needed]
+        ticket_ids = []
+        for lane in lanes:
+            if len(ticket_ids) >= needed:
+                break
+            unassigned_qs = Ticket.objects.select_for_update(skip_locked=True).filter(assigned_to__isnull=True, is_sold=False, lane=lane).order_by('created_at', 'creation_order')[:needed - len(ticket_ids)]
+            ticket_ids += unassigned_qs.values_list('id', flat=True)
         now = timezone.now()
-        ticket_ids = list(unassigned_qs.values_list('id', flat=True))
 
         if ticket_ids:
             Ticket.objects.filter(id__in=ticket_ids).update(assigned_to=agent, assigned_at=now, updated_at=now)
-            unassigned_qs = Ticket.objects.filter(id__in=ticket_ids)
+            record_assigned({agent.pk: len(ticket_ids)}, now)
+            record_events([(TicketEvent.ASSIGNED, ticket_id, agent.pk) for ticket_id in ticket_ids])
 
-        all_tickets = assigned_tickets + list(unassigned_qs)
+        all_tickets = assigned_tickets + list(_only(Ticket.objects, fields).filter(id__in=ticket_ids))
         all_tickets.sort(key=lambda t: (t.created_at, t.creation_order))
         return all_tickets[:max_tickets]
 
         # return list(Ticket.objects.filter(assigned_to=agent, is_sold=False).order_by('created_at')[:max_tickets])
+
+
+def needy_agents(max_tickets, agent_limit=None):
+    agents = (
+        get_user_model().objects.filter(role='agent', is_active=True)
+        .annotate(open_tickets=Count('tickets', filter=Q(tickets__is_sold=False)))
+        .filter(open_tickets__lt=max_tickets)
+        .order_by('id')
+    )
+    if agent_limit:
+        agents = agents[:agent_limit]
+    return agents
+
+
+def dispatch_ticket_assignments(max_tickets=MAX_TICKETS_PER_AGENT, agent_limit=None):
+    """
+    Fill every active agent below max_tickets from the FIFO lane queues in one transaction.
+
+    Lanes are filled in priority order, each from the agents that serve it (agents
+    without lanes serve every lane), and within a lane agents are served round-robin
+    (everyone gets their first missing ticket before anyone gets a second) so a short
+    queue is shared fairly. agent_limit caps the agents considered per lane. Returns
+    a dict with the number of tickets assigned and agents that received tickets.
+    """
+    using = router.db_for_write(Ticket)
+    if getattr(settings, 'TICKET_ASSIGNMENT_USE_COUNTERS', True) and queue_is_empty(using):
+        return {'tickets': 0, 'agents': 0}
+    if _use_sql(using):
+        return _dispatch_sql(max_tickets, agent_limit, using)
+    return _dispatch_orm(max_tickets, agent_limit)
+
+
+def _dispatch_sql(max_tickets, agent_limit, using):
+    table = Ticket._meta.db_table
+    user_table = get_user_model()._meta.db_table
+    # One statement per lane; each sees the tickets claimed by the lanes before it.
+    sql = f"""
+        WITH needy AS (
+            SELECT u.id AS agent_id, %(max)s - count(t.id) AS missing
+            FROM {user_table} u
+            LEFT JOIN {table} t ON t.assigned_to_id = u.id AND t.is_sold = false
+            WHERE u.role = 'agent' AND u.is_active
+                AND (u.queue_lanes = '[]'::jsonb OR u.queue_lanes ? %(lane)s)
+            GROUP BY u.id
+            HAVING count(t.id) < %(max)s
+            ORDER BY u.id
+            LIMIT %(agents)s
+        ),
+        slots AS (
+            SELECT agent_id, row_number() OVER (ORDER BY slot, agent_id) AS rn
+            FROM needy, generate_series(1, needy.missing) AS slot
+        ),
+        picked AS MATERIALIZED ({_pick_sql(table, '(SELECT COALESCE(sum(missing), 0) FROM needy)')}),
+        queue AS (
+            SELECT id, row_number() OVER (ORDER BY created_at, creation_order) AS rn
+            FROM picked
+        ),
+        claimed AS (
+            UPDATE {table} t
+            SET assigned_to_id = slots.agent_id, assigned_at = %(now)s, updated_at = %(now)s
+            FROM queue JOIN slots ON slots.rn = queue.rn
+            WHERE t.id = queue.id
+            RETURNING t.id, t.assigned_to_id
+        )
+        SELECT id, assigned_to_id FROM claimed
+    """
+    params = {'max': max_tickets, 'agents': agent_limit, 'now': timezone.now()}
+    rows = []
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for lane in LANES:
+            cursor.execute(sql, {**params, 'lane': lane})
+            rows += cursor.fetchall()
+        claimed = Counter(agent_id for _, agent_id in rows)
+        record_assigned(claimed, params['now'], using=using)
+        record_events([(TicketEvent.ASSIGNED, ticket_id, agent_id) for ticket_id, agent_id in rows], using=using)
+        evict_batch_versions(*claimed, using=using)
+    return {'tickets': sum(claimed.values()), 'agents': len(claimed)}
+
+
+def _dispatch_orm(max_tickets, agent_limit):
+    with transaction.atomic():
+        agents = list(needy_agents(max_tickets))
+        missing = {agent.id: max_tickets - agent.open_tickets for agent in agents}
+        batches = {}
+        for lane in LANES:
+            needy = [agent.id for agent in agents if missing[agent.id] > 0 and lane in agent_lanes(agent)][:agent_limit]
+            total = sum(missing[agent_id] for agent_id in needy)
+            if not total:
+                continue
+            ticket_ids = list(
+                Ticket.objects.select_for_update(skip_locked=True)
+                .filter(assigned_to__isnull=True, is_sold=False, lane=lane)
+                .order_by('created_at', 'creation_order')
+                .values_list('id', flat=True)[:total]
+            )
+
+            taken = dict.fromkeys(needy, 0)
+            queue = iter(ticket_ids)
+            for slot in range(max_tickets):
+                for agent_id in needy:
+                    if slot >= missing[agent_id]:
+                        continue
+                    ticket_id = next(queue, None)
+                    if ticket_id is None:
+                        break
+                    batches.setdefault(agent_id, []).append(ticket_id)
+                    taken[agent_id] += 1
+            for agent_id, count in taken.items():
+                missing[agent_id] -= count
+
+        now = timezone.now()
+        for agent_id, ids in batches.items():
+            Ticket.objects.filter(id__in=ids).update(assigned_to_id=agent_id, assigned_at=now, updated_at=now)
+        record_assigned({agent_id: len(ids) for agent_id, ids in batches.items()}, now)
+        record_events([(TicketEvent.ASSIGNED, ticket_id, agent_id) for agent_id, ids in batches.items() for ticket_id in ids])
+        evict_batch_versions(*batches)
+
+    return {'tickets': sum(len(ids) for ids in batches.values()), 'agents': len(batches)}
+
+
+def sell_tickets(agent, ticket_ids):
+    """
+    Mark the agent's unsold tickets among ticket_ids as sold with one conditional
+    UPDATE (UPDATE ... RETURNING on PostgreSQL), so there is no window between the
+    ownership check and the write. Returns {ticket_id: outcome} in request order,
+    with outcome SOLD, ALREADY_SOLD or NOT_YOURS. Ids that don't exist are reported
+    as NOT_YOURS, so agents can't probe for other agents' tickets.
+    """
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    if not ticket_ids:
+        return {}
+    using = router.db_for_write(Ticket)
+    now = timezone.now()
+    with transaction.atomic(using=using):
+        if _use_sql(using):
+            sold = _sell_tickets_sql(agent, ticket_ids, now, using)
+        else:
+            sold = _sell_tickets_orm(agent, ticket_ids, now)
+        record_sold(agent.pk, list(sold.values()), now, using=using)
+        record_events([(TicketEvent.SOLD, ticket_id, agent.pk) for ticket_id in sold], using=using)
+
+    outcomes = {ticket_id: SOLD if ticket_id in sold else NOT_YOURS for ticket_id in ticket_ids}
+    unsold = [ticket_id for ticket_id in ticket_ids if ticket_id not in sold]
+    if unsold:
+        already_sold = Ticket.objects.using(using).filter(id__in=unsold, assigned_to=agent, is_sold=True).values_list('id', flat=True)
+        outcomes.update(dict.fromkeys(already_sold, ALREADY_SOLD))
+    if sold:
+        evict_batch_versions(agent.pk, using=using)
+    return outcomes
+
+
+def _sell_tickets_sql(agent, ticket_ids, now, using):
+    table = Ticket._meta.db_table
+    sql = f"""
+        UPDATE {table}
+        SET is_sold = true, updated_at = %(now)s
+        WHERE id = ANY(%(ids)s) AND assigned_to_id = %(agent)s AND is_sold = false
+        RETURNING id, assigned_at
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, {'ids': ticket_ids, 'agent': agent.pk, 'now': now})
+        return dict(cursor.fetchall())
+
+
+def _sell_tickets_orm(agent, ticket_ids, now):
+    with transaction.atomic():
+        sellable = dict(Ticket.objects.select_for_update().filter(id__in=ticket_ids, assigned_to=agent, is_sold=False).values_list('id', 'assigned_at'))
+        Ticket.objects.filter(id__in=sellable, is_sold=False).update(is_sold=True, updated_at=now)
+    return sellable
@@ -1,33 +1,110 @@
+import io
+
 from rest_framework import viewsets, status
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, UnsupportedMediaType, ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from django.conf import settings
 from django.db import transaction
-from .models import Ticket
-from .serializers import TicketSerializer
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from .models import ArchivedTicket, Ticket, TicketCounter
+from .serializers import (
+    TICKET_FIELDS, AgentCounterSerializer, ArchivedTicketReadSerializer, TicketReadSerializer, TicketSellSerializer,
+    TicketSerializer, _datetime, parse_ticket_fields, ticket_load_fields,
+)
 from .permissions import IsAdmin, IsAgent
 from rest_framework.permissions import IsAuthenticated
+from support_system.pagination import TicketCounterPagination, TicketPagination
+from support_system.renderers import CSVRenderer, NDJSONRenderer
+
+from .batch_cache import batch_etag, evict_batch_versions, matches_current_batch, reserve_batch_version
+from .export import export_csv, export_ndjson, gzip_accepted, gzip_stream
+from .ingest import ingest_tickets, iter_json_array, iter_ndjson
+from .notify import notify_tickets_created
+from .search import search_tickets
+from .stats import global_counts, hourly_stats
+from .utils import ALREADY_SOLD, MAX_TICKETS_PER_AGENT, SOLD, assign_tickets_to_agent, sell_tickets
 
-from .utils import assign_tickets_to_agent
+NDJSON_MEDIA_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Actions rendered by TicketReadSerializer; they take ?fields= / ?omit=.
+READ_ACTIONS = ('list', 'retrieve', 'fetch_tickets')
 
 
 class TicketViewSet(viewsets.ModelViewSet):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TicketPagination
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'bulk_create_tickets', 'export_tickets']:
             return [IsAdmin()]
-        elif self.action in ['retrieve', 'list', 'fetch_tickets', 'sell_ticket']:
+        elif self.action in ['retrieve', 'list', 'fetch_tickets', 'sell_ticket', 'bulk_sell_tickets']:
             return [IsAgent()]
         return super().get_permissions()
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.ticket_fields = None
+        if self.action in READ_ACTIONS:
+            default = getattr(settings, 'TICKET_FETCH_FIELDS', None) if self.action == 'fetch_tickets' else None
+            self.ticket_fields = parse_ticket_fields(request.query_params, default)
+
     def get_queryset(self):
         user = self.request.user
         if user.role == 'agent':
-            return Ticket.objects.filter(assigned_to=user)
-        return super().get_queryset()
+            queryset = Ticket.objects.filter(assigned_to=user).select_related('created_by')
+        else:
+            queryset = super().get_queryset().select_related('created_by')
+        q = self.request.query_params.get('q', '').strip()
+        if q and self.action in ('list', 'export_tickets'):
+            # Ranked; TicketPagination pages through it best match first.
+            queryset = search_tickets(queryset, q)
+        fields = getattr(self, 'ticket_fields', None)
+        if fields is not None and self.action in ('list', 'retrieve'):
+            queryset = self.project_queryset(queryset, fields)
+        return queryset
+
+    def project_queryset(self, queryset, fields):
+        # Columns that aren't rendered are never read: ?omit= defers them, ?fields= and the
+        # fetch-tickets default load just the listed ones. The pk and ordering always load.
+        if 'created_by' not in fields:
+            queryset = queryset.select_related(None)
+        if 'omit' in self.request.query_params:
+            return queryset.defer(*(set(TICKET_FIELDS) - set(ticket_load_fields(fields))))
+        load = ticket_load_fields(fields)
+        if 'created_by' in fields:
+            load += ('created_by__username',)
+        return queryset.only(*load)
+
+    def get_serializer_class(self):
+        if self.action in READ_ACTIONS:
+            return TicketReadSerializer
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is TicketReadSerializer:
+            kwargs.setdefault('fields', getattr(self, 'ticket_fields', None))
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+            notify_tickets_created(1)
+
+    def perform_update(self, serializer):
+        previous_agent_id = serializer.instance.assigned_to_id
+        with transaction.atomic():
+            ticket = serializer.save()
+            evict_batch_versions(previous_agent_id, ticket.assigned_to_id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            evict_batch_versions(instance.assigned_to_id)
+            instance.delete()
 
     @action(detail=False, methods=['get'], url_path='fetch-tickets')
     def fetch_tickets(self, request):
@@ -35,23 +112,134 @@ class TicketViewSet(viewsets.ModelViewSet):
         if user.role != 'agent':
             return Response({"detail": "Not authorized."}, status=403)
 
-        tickets = assign_tickets_to_agent(user)
+        # A full agent whose batch hasn't changed since its last fetch gets a 304
+        # without touching the database.
+        fields = self.ticket_fields
+        etag = matches_current_batch(user.pk, request.headers.get('If-None-Match'), fields)
+        if etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        token = reserve_batch_version(user.pk)
+        tickets = assign_tickets_to_agent(user, fields=None if fields is None else ticket_load_fields(fields))
+        if fields is None or 'created_by' in fields:
+            prefetch_related_objects(tickets, 'created_by')
         serializer = self.get_serializer(tickets, many=True)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        etag = batch_etag(user.pk, token, fields) if len(tickets) == MAX_TICKETS_PER_AGENT else None
+        if etag:
+            response['ETag'] = etag
+        return response
 
     @action(detail=True, methods=['post'], url_path='sell')
     def sell_ticket(self, request, pk=None):
-        ticket = self.get_object()
+        try:
+            ticket_id = int(pk)
+        except ValueError:
+            raise NotFound()
 
-        if ticket.assigned_to != request.user:
+        outcome = sell_tickets(request.user, [ticket_id])[ticket_id]
+        if outcome == SOLD:
+            return Response({"detail": "Ticket marked as sold."}, status=status.HTTP_200_OK)
+        if outcome == ALREADY_SOLD:
+            return Response({"detail": "Ticket already sold."}, status=status.HTTP_400_BAD_REQUEST)
+        # The UPDATE matched nothing: someone else's ticket keeps its 403, a missing one is a 404.
+        if Ticket.objects.filter(id=ticket_id).exists():
             return Response({"detail": "Unauthorized"}, status=403)
+        raise NotFound()
 
-        if ticket.is_sold:
-            return Response({"detail": "Ticket already sold."}, status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=False, methods=['post'], url_path='sell')
+    def bulk_sell_tickets(self, request):
+        serializer = TicketSellSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        outcomes = sell_tickets(request.user, serializer.validated_data['ids'])
+        return Response({
+            "sold": sum(outcome == SOLD for outcome in outcomes.values()),
+            "results": [{"id": ticket_id, "outcome": outcome} for ticket_id, outcome in outcomes.items()],
+        }, status=status.HTTP_200_OK)
 
-        with transaction.atomic():
-            ticket.is_sold = True
-            ticket.save(update_fields=['is_sold', 'updated_at'])
+    @action(detail=False, methods=['get'], url_path='export', renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export_tickets(self, request):
+        # Streamed straight from a server-side cursor in list order, so worker memory
+        # stays flat however many rows match.
+        queryset = self.get_queryset()
+        queryset = queryset.order_by(*self.pagination_class().get_ordering(queryset))
+        if request.accepted_renderer.format == 'ndjson':
+            chunks, extension = export_ndjson(queryset), 'ndjson'
+        else:
+            chunks, extension = export_csv(queryset), 'csv'
+
+        compress = gzip_accepted(request.headers.get('Accept-Encoding', ''))
+        response = StreamingHttpResponse(
+            gzip_stream(chunks) if compress else chunks,
+            content_type=request.accepted_renderer.media_type + ('; charset=utf-8' if extension == 'csv' else ''),
+        )
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = f'attachment; filename="tickets.{extension}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create_tickets(self, request):
+        # Read the raw stream instead of request.data so the upload is never held in memory.
+        media_type = request.content_type.split(';')[0].strip().lower()
+        stream = request.stream or io.BytesIO()
+        if media_type in NDJSON_MEDIA_TYPES:
+            rows = iter_ndjson(stream)
+        elif media_type == 'application/json':
+            rows = iter_json_array(stream)
+        else:
+            raise UnsupportedMediaType(media_type)
+
+        result = ingest_tickets(rows, request.user)
+        if 'detail' in result:
+            # Chunks before the broken part are committed; say so rather than fail the whole request.
+            code = status.HTTP_207_MULTI_STATUS if result['created'] else status.HTTP_400_BAD_REQUEST
+            return Response(result, status=code)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class ArchivedTicketViewSet(viewsets.ReadOnlyModelViewSet):
+    """Sold tickets moved out of the hot table by archive_tickets. Admins only."""
+    queryset = ArchivedTicket.objects.select_related('created_by')
+    serializer_class = ArchivedTicketReadSerializer
+    permission_classes = [IsAdmin]
+    pagination_class = TicketPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        assigned_to = self.request.query_params.get('assigned_to')
+        if assigned_to is not None:
+            if not assigned_to.isdigit():
+                raise ValidationError({"assigned_to": "Must be a user id."})
+            queryset = queryset.filter(assigned_to_id=int(assigned_to))
+        return queryset
+
+
+class TicketStatsViewSet(viewsets.GenericViewSet):
+    """Queue depth, sales and hourly rollups read from the counter tables, never from tickets. Admins only."""
+    queryset = TicketCounter.objects.exclude(scope=TicketCounter.GLOBAL_SCOPE)
+    serializer_class = AgentCounterSerializer
+    permission_classes = [IsAdmin]
+    pagination_class = TicketCounterPagination
+    max_hours = 24 * 7
 
-        return Response({"detail": "Ticket marked as sold."}, status=status.HTTP_200_OK)
+    def list(self, request):
+        hours = request.query_params.get('hours', '24')
+        if not hours.isdigit() or not 1 <= int(hours) <= self.max_hours:
+            raise ValidationError({"hours": f"Must be between 1 and {self.max_hours}."})
+        hourly = hourly_stats(int(hours))
+        for row in hourly:
+            row['hour'] = _datetime(row['hour'])
+        return Response({**global_counts(), "hourly": hourly})
 
+    @action(detail=False, methods=['get'])
+    def agents(self, request):
+        queryset = self.get_queryset()
+        agent = request.query_params.get('agent')
+        if agent is not None:
+            if not agent.isdigit():
+                raise ValidationError({"agent": "Must be a user id."})
+            queryset = queryset.filter(scope=int(agent))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
@@ -1,7 +1,12 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 
+from support_system.changelist import ScalableAdminMixin
+from tickets.lanes import LANE_CHOICES
+
+from .authentication import CLAIM_FIELDS, full_user_cache, revoke_user_tokens
 from .models import User
 
 class CustomUserCreationForm(UserCreationForm):
@@ -10,25 +15,33 @@ class CustomUserCreationForm(UserCreationForm):
         fields = ("username", "email", "role")
 
 class CustomUserChangeForm(UserChangeForm):
+    queue_lanes = forms.MultipleChoiceField(
+        choices=LANE_CHOICES, required=False, widget=forms.CheckboxSelectMultiple,
+        help_text="Leave empty to serve every lane.",
+    )
+
     class Meta:
         model = User
-        fields = ("username", "email", "role", "is_active", "is_staff", "is_superuser", "groups", "user_permissions")
+        fields = ("username", "email", "role", "queue_lanes", "is_active", "is_staff", "is_superuser", "groups", "user_permissions")
 
 # Custom admin view for the User model
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(ScalableAdminMixin, BaseUserAdmin):
     add_form = CustomUserCreationForm
     form = CustomUserChangeForm
     model = User
 
     list_display = ("username", "email", "role", "is_staff", "is_active")
     list_filter = ("role", "is_staff", "is_active")
-    search_fields = ("username", "email")
+    # Searches use the username index; see get_search_results().
+    search_fields = ("username",)
+    search_help_text = "A user ID or the start of a username."
     ordering = ("username",)
+    sortable_by = ("username",)
 
     fieldsets = (
         (None, {"fields": ("username", "password")}),
         ("Personal info", {"fields": ("email",)}),
-        ("Role", {"fields": ("role",)}),
+        ("Role", {"fields": ("role", "queue_lanes")}),
         ("Permissions", {"fields": ("is_active", "is_staff", "is_superuser", "groups", "user_permissions")}),
         ("Important dates", {"fields": ("last_login", "date_joined")}),
     )
@@ -40,4 +53,31 @@ class CustomUserAdmin(BaseUserAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        # A prefix match can use the username index (its varchar_pattern_ops twin on PostgreSQL);
+        # icontains scans the whole table.
+        return queryset.filter(username__startswith=search_term), False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and set(form.changed_data) & set(CLAIM_FIELDS):
+            revoke_user_tokens(obj.pk)
+        elif change:
+            full_user_cache.evict(obj.pk)
+
+    def delete_model(self, request, obj):
+        user_id = obj.pk
+        super().delete_model(request, obj)
+        revoke_user_tokens(user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
+        revoke_user_tokens(*user_ids)
+
 admin.site.register(User, CustomUserAdmin)
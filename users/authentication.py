@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+User = get_user_model()
+
+# User fields copied into every token; enough for the permission checks on the API.
+CLAIM_FIELDS = ('username', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+
+def user_claims(user):
+    return {field: getattr(user, field) for field in CLAIM_FIELDS}
+
+
+def user_from_claims(token):
+    """
+    Build a User from the token claims without touching the database. The other
+    fields are deferred, so the rare code path that reads one loads it on access
+    and a save() only writes the fields that came from the token.
+    """
+    values = {jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM], **{field: token[field] for field in CLAIM_FIELDS}}
+    field_names = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    return User.from_db(router.db_for_read(User), field_names, [values[name] for name in field_names])
+
+
+def _cache():
+    return caches[getattr(settings, 'AUTH_REVOCATION_CACHE', 'default')]
+
+
+def _revocation_key(user_id):
+    return f'auth:revoked:{user_id}'
+
+
+def revoke_user_tokens(*user_ids):
+    """
+    Reject every token issued to the given users up to now. The marker lives as long
+    as the longest-lived token, so it needs a cache shared by all workers (REDIS_URL)
+    to take effect everywhere.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    timeout = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME).total_seconds()
+    now = time.time()
+    _cache().set_many({_revocation_key(user_id): now for user_id in user_ids}, timeout)
+    full_user_cache.evict(*user_ids)
+
+
+def is_revoked(token):
+    revoked_at = _cache().get(_revocation_key(token[jwt_settings.USER_ID_CLAIM]))
+    # iat has one-second resolution; a token issued in the same second is rejected too.
+    return revoked_at is not None and token.get('iat', 0) <= revoked_at
+
+
+class UserRowCache:
+    """
+    Bounded per-process LRU of full user rows with a TTL, for the views that need
+    more than the claims. A size of 0 disables it.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._rows = OrderedDict()
+
+    def get(self, user_id):
+        if not self.maxsize:
+            return User.objects.get(pk=user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._rows.move_to_end(user_id)
+                return entry[1]
+        user = User.objects.get(pk=user_id)
+        with self._lock:
+            self._rows[user_id] = (now + self.ttl, user)
+            self._rows.move_to_end(user_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+        return user
+
+    def evict(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._rows.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+full_user_cache = UserRowCache(getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024), getattr(settings, 'AUTH_USER_CACHE_TTL', 60))
+
+
+def get_full_user(user):
+    """Fully loaded row for a (claims) user, served from the per-process cache while fresh."""
+    return full_user_cache.get(user.pk)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts the role/is_active claims instead of loading the
+    user row on every request. The only per-request lookup is the revocation marker
+    in the cache. Tokens issued before the claims existed fall back to the database.
+    """
+
+    def get_user(self, validated_token):
+        if any(field not in validated_token for field in CLAIM_FIELDS):
+            return super().get_user(validated_token)
+        if is_revoked(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code='token_revoked')
+        user = user_from_claims(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code='user_inactive')
+        return user
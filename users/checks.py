@@ -0,0 +1,5 @@
+from support_system.checks import shared_cache_errors
+
+
+def check_revocation_cache(app_configs, **kwargs):
+    return shared_cache_errors('AUTH_REVOCATION_CACHE', 'default', 'users.E001', "token revocations")
@@ -0,0 +1,75 @@
+"""
+Password hashing in a process pool. PBKDF2 is CPU-bound and holds the GIL, so
+threads don't help; worker processes do. This module imports no models: pool
+workers import it before Django is set up.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _hash(algorithm, password):
+    from django.contrib.auth.hashers import make_password
+
+    return make_password(password, hasher=algorithm)
+
+
+def _pool_for(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # forkserver/spawn rather than fork: web workers run threads (notifiers, pools)
+            # that a forked child would inherit mid-lock.
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    make_password() for each password, in order, spread over `workers` processes
+    (default USER_BULK_HASH_WORKERS; 0 there means one per CPU). The pool is started
+    on first use and shared by later calls in this process; with one worker or one
+    password it hashes inline.
+    """
+    from django.conf import settings
+    from django.contrib.auth.hashers import get_hasher
+
+    passwords = list(passwords)
+    if workers is None:
+        workers = getattr(settings, 'USER_BULK_HASH_WORKERS', None) or os.cpu_count() or 1
+    # Workers read the settings module, not overrides in this process; name the hasher.
+    hash_one = partial(_hash, get_hasher().algorithm)
+    if workers <= 1 or len(passwords) <= 1:
+        return [hash_one(password) for password in passwords]
+
+    pool = _pool_for(workers)
+    try:
+        return list(pool.map(hash_one, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.11 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='queue_lanes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
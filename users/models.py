@@ -4,6 +4,8 @@ from django.db import models
 class User(AbstractUser):
     ROLE_CHOICES = (('admin', 'Admin'),('agent', 'Agent'))
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    # Queue lanes (tickets.lanes.LANES) this agent is served from; empty means every lane.
+    queue_lanes = models.JSONField(default=list, blank=True)
 
     def __str__(self):
         return self.username
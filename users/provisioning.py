@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+
+from .hashing import hash_passwords
+from .models import User
+from .serializers import UserSerializer
+
+
+class BulkUserSerializer(UserSerializer):
+    """UserSerializer without the per-row username query; provision_users() checks a whole chunk at once."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['username'].validators = [
+            validator for validator in fields['username'].validators if not isinstance(validator, UniqueValidator)
+        ]
+        return fields
+
+
+def provision_users(rows, workers=None, chunk_size=None, max_errors=None):
+    """
+    Validate every row as POST /api/users/ would, then create the valid ones chunk
+    by chunk: passwords are hashed in a process pool (hashing.hash_passwords) and
+    the users inserted with one bulk_create per chunk. Invalid rows, and usernames
+    that are taken or repeated in the upload, are reported by their index and never
+    abort the batch, as in tickets.ingest.
+    """
+    chunk_size = chunk_size or getattr(settings, 'USER_BULK_CHUNK_SIZE', 1000)
+    max_errors = max_errors if max_errors is not None else getattr(settings, 'USER_BULK_MAX_ERRORS', 1000)
+
+    validator = BulkUserSerializer()
+    errors, valid, seen = [], [], set()
+    unique_message = User._meta.get_field('username').error_messages['unique']
+    # Everything is validated before any password is hashed, so a bad upload costs no CPU.
+    for index, row in enumerate(rows):
+        try:
+            validated_data = validator.run_validation(row)
+        except serializers.ValidationError as e:
+            errors.append((index, e.detail))
+            continue
+        if validated_data['username'] in seen:
+            errors.append((index, {'username': [unique_message]}))
+            continue
+        seen.add(validated_data['username'])
+        valid.append((index, validated_data))
+
+    created = []
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        taken = _taken_usernames([data['username'] for _, data in chunk])
+        errors.extend((index, {'username': [unique_message]}) for index, data in chunk if data['username'] in taken)
+        chunk = [(index, data) for index, data in chunk if data['username'] not in taken]
+        if not chunk:
+            continue
+        hashes = hash_passwords([data['password'] for _, data in chunk], workers=workers)
+        users = [
+            User(password=password, **{key: value for key, value in data.items() if key != 'password'})
+            for (_, data), password in zip(chunk, hashes)
+        ]
+        for (index, _), user in zip(chunk, _insert_users(users, errors, [index for index, _ in chunk], unique_message)):
+            if user is not None:
+                created.append({'row': index, 'id': user.pk, 'username': user.username})
+
+    errors.sort(key=lambda error: error[0])
+    return {
+        'created': len(created),
+        'failed': len(errors),
+        'users': created,
+        'errors': [{'row': index, 'errors': detail} for index, detail in errors[:max_errors]],
+        'errors_truncated': len(errors) > max_errors,
+    }
+
+
+def _taken_usernames(usernames):
+    return set(User.objects.using(router.db_for_write(User)).filter(username__in=usernames).values_list('username', flat=True))
+
+
+def _insert_users(users, errors, indexes, unique_message):
+    """
+    bulk_create `users`; returns them with None for rows that couldn't be inserted.
+    Usernames taken in the meantime are dropped and the rest retried until the
+    insert goes through. If it fails for any other reason the rows are inserted
+    one at a time, so one bad row only fails itself.
+    """
+    using = router.db_for_write(User)
+    pending = list(zip(indexes, users))
+    failed = set()
+    while pending:
+        try:
+            with transaction.atomic(using=using):
+                User.objects.using(using).bulk_create([user for _, user in pending])
+            return [None if index in failed else user for index, user in zip(indexes, users)]
+        except IntegrityError:
+            # Another request created some of these usernames since the check.
+            taken = _taken_usernames([user.username for _, user in pending])
+            if not taken:
+                break
+            for index, user in pending:
+                if user.username in taken:
+                    errors.append((index, {'username': [unique_message]}))
+                    failed.add(index)
+            pending = [(index, user) for index, user in pending if user.username not in taken]
+
+    for index, user in pending:
+        user.pk = None
+        try:
+            with transaction.atomic(using=using):
+                user.save(using=using, force_insert=True)
+        except IntegrityError:
+            taken = _taken_usernames([user.username])
+            errors.append((index, {'username': [unique_message]} if taken else {'non_field_errors': ["The user could not be saved."]}))
+            failed.add(index)
+    return [None if index in failed else user for index, user in zip(indexes, users)]
@@ -1,7 +1,15 @@
 import re
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import router
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from tickets.lanes import LANES
+
+from .authentication import is_revoked, user_claims
 from .models import User
 
 
@@ -18,10 +26,11 @@ class CustomRoleField(serializers.ChoiceField):
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, min_length=8)
     role = CustomRoleField(required=True)
+    queue_lanes = serializers.ListField(child=serializers.ChoiceField(choices=LANES), required=False, max_length=len(LANES))
 
     class Meta:
         model = User
-        fields = ['id', 'username','password', 'role']
+        fields = ['id', 'username','password', 'role', 'is_active', 'queue_lanes']
         read_only_fields = ['id']
 
     def validate_password(self, value):
@@ -61,4 +70,47 @@ class UserSerializer(serializers.ModelSerializer):
             self._set_user_password(instance, password)
         else:
             instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that reloads the user row: missing and inactive users are refused, and
+    the new tokens carry the current claims rather than those copied at login.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_revoked(refresh):
+            raise AuthenticationFailed("Token has been revoked", code='token_revoked')
+        # The primary: a replica may not have the role change that prompted the refresh yet.
+        user = User.objects.using(router.db_for_write(User)).filter(
+            **{jwt_settings.USER_ID_FIELD: refresh[jwt_settings.USER_ID_CLAIM]}
+        ).first()
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], code='no_active_account')
+        for claim, value in user_claims(user).items():
+            refresh[claim] = value
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            if jwt_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The token_blacklist app isn't installed.
+                    pass
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
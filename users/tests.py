@@ -1,3 +1,280 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from support_system.throttling import get_throttle_store
+
+from . import provisioning
+from .admin import CustomUserAdmin
+from .authentication import full_user_cache, get_full_user
+from .checks import check_revocation_cache
+from .hashing import hash_passwords
+from .models import User
+
+
+class UserPaginationTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin', is_staff=True)
+        for i in range(7):
+            User.objects.create_user(username=f'agent{i}', password='agentpass', role='agent')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_users_are_paginated_by_id(self):
+        ids = []
+        url = '/api/users/?page_size=3'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            self.assertLessEqual(len(res.data['results']), 3)
+            ids.extend(u['id'] for u in res.data['results'])
+            url = res.data['next']
+
+        self.assertEqual(ids, list(User.objects.order_by('id').values_list('id', flat=True)))
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Token requests are anonymous and share the 10/min anon bucket.
+        get_throttle_store().clear()
+        full_user_cache.clear()
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin', is_staff=True)
+        self.agent = User.objects.create_user(username='agent1', password='agentpass', role='agent')
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(user=self.admin)
+
+    def tearDown(self):
+        cache.clear()
+
+    def obtain(self, username, password):
+        res = APIClient().post('/api/token/', {'username': username, 'password': password}, format='json')
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def client_for(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return client
+
+    def test_tokens_carry_role_and_active_claims(self):
+        tokens = self.obtain('agent1', 'agentpass')
+        access = AccessToken(tokens['access'])
+        self.assertEqual(access['role'], 'agent')
+        self.assertTrue(access['is_active'])
+        self.assertFalse(access['is_staff'])
+
+    def test_request_does_not_load_the_user_row(self):
+        client = self.client_for(self.obtain('agent1', 'agentpass')['access'])
+        # Only the (empty) ticket page query; no users_user lookup for authentication.
+        with self.assertNumQueries(1):
+            res = client.get('/api/tickets/')
+        self.assertEqual(res.status_code, 200)
+
+    def test_legacy_tokens_without_claims_still_authenticate(self):
+        client = self.client_for(AccessToken.for_user(self.agent))
+        self.assertEqual(client.get('/api/tickets/').status_code, 200)
+
+    def test_role_change_revokes_tokens(self):
+        tokens = self.obtain('agent1', 'agentpass')
+        client = self.client_for(tokens['access'])
+        self.assertEqual(client.get('/api/tickets/').status_code, 200)
+
+        res = self.admin_client.patch(f'/api/users/{self.agent.id}/', {'role': 'admin'}, format='json')
+        self.assertEqual(res.status_code, 200)
+
+        self.assertEqual(client.get('/api/tickets/').status_code, 401)
+        res = APIClient().post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(res.status_code, 401)
+
+    def test_deactivation_revokes_tokens(self):
+        client = self.client_for(self.obtain('agent1', 'agentpass')['access'])
+        res = self.admin_client.patch(f'/api/users/{self.agent.id}/', {'is_active': False}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(client.get('/api/tickets/').status_code, 401)
+
+    def test_password_only_update_keeps_tokens(self):
+        client = self.client_for(self.obtain('agent1', 'agentpass')['access'])
+        res = self.admin_client.patch(f'/api/users/{self.agent.id}/', {'password': 'N3w-Passw0rd!'}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(client.get('/api/tickets/').status_code, 200)
+
+    def test_queue_lane_update_keeps_tokens_and_refreshes_row(self):
+        client = self.client_for(self.obtain('agent1', 'agentpass')['access'])
+        get_full_user(self.agent)
+        res = self.admin_client.patch(f'/api/users/{self.agent.id}/', {'queue_lanes': ['urgent', 'nope']}, format='json')
+        self.assertEqual(res.status_code, 400)
+        res = self.admin_client.patch(f'/api/users/{self.agent.id}/', {'queue_lanes': ['urgent']}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['queue_lanes'], ['urgent'])
+        self.assertEqual(client.get('/api/tickets/').status_code, 200)
+        self.assertEqual(get_full_user(self.agent).queue_lanes, ['urgent'])
+
+    def test_full_user_cache_serves_rows_until_evicted(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_full_user(self.agent).username, 'agent1')
+            self.assertEqual(get_full_user(self.agent).username, 'agent1')
+        full_user_cache.evict(self.agent.pk)
+        with self.assertNumQueries(1):
+            get_full_user(self.agent)
+
+    def test_refresh_restamps_claims_from_the_user_row(self):
+        tokens = self.obtain('agent1', 'agentpass')
+        # Changed behind the API's back, so no revocation marker is set.
+        User.objects.filter(pk=self.agent.pk).update(role='admin', is_staff=True)
+        res = APIClient().post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(res.status_code, 200)
+        access = AccessToken(res.data['access'])
+        self.assertEqual(access['role'], 'admin')
+        self.assertTrue(access['is_staff'])
+
+    def test_refresh_refuses_inactive_and_missing_users(self):
+        tokens = self.obtain('agent1', 'agentpass')
+        User.objects.filter(pk=self.agent.pk).update(is_active=False)
+        res = APIClient().post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(res.status_code, 401)
+
+        User.objects.filter(pk=self.agent.pk).delete()
+        res = APIClient().post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(res.status_code, 401)
+
+    def test_check_requires_a_shared_revocation_cache(self):
+        with override_settings(DEBUG=False, TESTING=False):
+            errors = check_revocation_cache(None)
+        self.assertEqual([error.id for error in errors], ['users.E001'])
+        with override_settings(DEBUG=True):
+            self.assertEqual(check_revocation_cache(None), [])
+
+
+class UserAdminChangeListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass', role='admin')
+        self.agents = [User.objects.create_user(username=f'agent{i}', password='agentpass', role='agent') for i in range(5)]
+        self.client.force_login(self.admin)
+
+    def test_search_matches_an_id_or_a_username_prefix(self):
+        cl = self.client.get('/admin/users/user/', {'q': str(self.agents[2].id)}).context['cl']
+        self.assertEqual(list(cl.result_list), [self.agents[2]])
+        cl = self.client.get('/admin/users/user/', {'q': 'agent'}).context['cl']
+        self.assertEqual(list(cl.result_list), self.agents)
+        cl = self.client.get('/admin/users/user/', {'q': 'gent'}).context['cl']
+        self.assertEqual(list(cl.result_list), [])
+
+    def test_pages_by_username(self):
+        with mock.patch.object(CustomUserAdmin, 'list_per_page', 4):
+            cl = self.client.get('/admin/users/user/').context['cl']
+            self.assertTrue(cl.keyset)
+            names = [user.username for user in cl.result_list]
+            cl = self.client.get(f'/admin/users/user/{cl.next_url}').context['cl']
+        names += [user.username for user in cl.result_list]
+        self.assertEqual(names, sorted(user.username for user in [self.admin, *self.agents]))
+        self.assertIsNone(cl.next_url)
+
+
+@override_settings(USER_BULK_HASH_WORKERS=1)
+class BulkUserProvisioningTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='adminpass', role='admin', is_staff=True)
+        User.objects.create_user(username='taken', password='agentpass', role='agent')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_bulk_endpoint_creates_valid_rows_and_reports_the_rest(self):
+        rows = [
+            {'username': 'site-1', 'password': 'Str0ng#Pass', 'role': 'agent', 'queue_lanes': ['urgent']},
+            {'username': 'site-2', 'password': 'weak', 'role': 'agent'},
+            {'username': 'taken', 'password': 'Str0ng#Pass', 'role': 'agent'},
+            {'username': 'site-1', 'password': 'Str0ng#Pass', 'role': 'agent'},
+            'not an object',
+            {'username': 'site-3', 'password': 'Str0ng#Pass', 'role': 'admin'},
+        ]
+        res = self.client.post('/api/users/bulk/', rows, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['created'], res.data['failed']), (2, 4))
+        self.assertEqual([error['row'] for error in res.data['errors']], [1, 2, 3, 4])
+        self.assertIn('password', res.data['errors'][0]['errors'])
+        self.assertIn('username', res.data['errors'][1]['errors'])
+        self.assertIn('username', res.data['errors'][2]['errors'])
+        self.assertEqual([(user['row'], user['username']) for user in res.data['users']], [(0, 'site-1'), (5, 'site-3')])
+
+        user = User.objects.get(username='site-1')
+        self.assertEqual(user.pk, res.data['users'][0]['id'])
+        self.assertTrue(user.check_password('Str0ng#Pass'))
+        self.assertEqual((user.role, user.queue_lanes), ('agent', ['urgent']))
+        self.assertEqual(User.objects.get(username='site-3').role, 'admin')
+
+    def test_bulk_endpoint_rejects_bad_payloads(self):
+        self.assertEqual(self.client.post('/api/users/bulk/', {'username': 'x'}, format='json').status_code, 400)
+        with override_settings(USER_BULK_MAX_ROWS=1):
+            res = self.client.post('/api/users/bulk/', [{}, {}], format='json')
+        self.assertEqual(res.status_code, 400)
+        agent = APIClient()
+        agent.force_authenticate(user=User.objects.get(username='taken'))
+        self.assertEqual(agent.post('/api/users/bulk/', [], format='json').status_code, 403)
+
+    def test_invalid_uploads_hash_nothing(self):
+        with mock.patch('users.provisioning.hash_passwords') as hashed:
+            res = self.client.post('/api/users/bulk/', [{'username': 'taken', 'password': 'Str0ng#Pass', 'role': 'agent'}], format='json')
+        self.assertEqual(res.data['failed'], 1)
+        hashed.assert_not_called()
+
+    def test_insert_retries_through_repeated_username_races(self):
+        real_taken = provisioning._taken_usernames
+        calls = []
+
+        def taken(usernames):
+            calls.append(usernames)
+            if len(calls) == 1:
+                # Two usernames are created by someone else right after the check...
+                User.objects.create_user(username='race-1', password='agentpass', role='agent')
+                User.objects.create_user(username='race-2', password='agentpass', role='agent')
+                return set()
+            if len(calls) == 2:
+                # ...and the retry only learns about one of them at first.
+                return {'race-1'}
+            return real_taken(usernames)
+
+        rows = [{'username': name, 'password': 'Str0ng#Pass', 'role': 'agent'} for name in ('race-1', 'ok-1', 'race-2')]
+        with mock.patch('users.provisioning._taken_usernames', side_effect=taken):
+            report = provisioning.provision_users(rows, workers=1)
+        self.assertEqual((report['created'], report['failed']), (1, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [0, 2])
+        self.assertEqual([user['username'] for user in report['users']], ['ok-1'])
+
+    def test_insert_falls_back_to_single_rows(self):
+        rows = [{'username': f'single-{i}', 'password': 'Str0ng#Pass', 'role': 'agent'} for i in range(3)]
+        with mock.patch('django.db.models.query.QuerySet.bulk_create', side_effect=IntegrityError('check constraint')):
+            report = provisioning.provision_users(rows, workers=1)
+        self.assertEqual((report['created'], report['failed']), (3, 0))
+        self.assertEqual(User.objects.filter(username__startswith='single-').count(), 3)
+
+    def test_passwords_hash_in_a_process_pool(self):
+        passwords = [f'Str0ng#Pass{i}' for i in range(4)]
+        hashes = hash_passwords(passwords, workers=2)
+        user = User(username='check')
+        for password, encoded in zip(passwords, hashes):
+            user.password = encoded
+            self.assertTrue(user.check_password(password))
+        self.assertEqual(len(set(hashes)), 4)
+
+    def test_provision_users_command_reads_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as handle:
+            handle.write("username,password,queue_lanes\nagent-a,Str0ng#Pass,urgent;billing\nagent-b,weak,\nagent-c,Str0ng#Pass,\n")
+        self.addCleanup(os.unlink, handle.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('provision_users', handle.name, '--workers', '2', '--json', stdout=out, stderr=err)
+        report = json.loads(out.getvalue())
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+        self.assertEqual(report['errors'][0]['row'], 1)
+        self.assertEqual(User.objects.get(username='agent-a').queue_lanes, ['urgent', 'billing'])
+        self.assertEqual(User.objects.get(username='agent-c').role, 'agent')
+        self.assertTrue(User.objects.get(username='agent-c').check_password('Str0ng#Pass'))
@@ -1,5 +1,10 @@
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .authentication import full_user_cache, revoke_user_tokens, user_claims
+from .provisioning import provision_users
 from .serializers import UserSerializer
 from rest_framework import viewsets
 
@@ -9,4 +14,29 @@ User = get_user_model()
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAdminUser]
\ No newline at end of file
+    permission_classes = [permissions.IsAdminUser]
+
+    def perform_update(self, serializer):
+        claims = user_claims(serializer.instance)
+        user = serializer.save()
+        if user_claims(user) != claims:
+            revoke_user_tokens(user.pk)
+        else:
+            # Queue lanes aren't in the token; drop the cached row so fetches see the change.
+            full_user_cache.evict(user.pk)
+
+    def perform_destroy(self, instance):
+        user_id = instance.pk
+        instance.delete()
+        revoke_user_tokens(user_id)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create_users(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            return Response({"detail": "Expected a JSON array."}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, 'USER_BULK_MAX_ROWS', 1000)
+        if len(rows) > max_rows:
+            return Response({"detail": f"At most {max_rows} users per request."}, status=status.HTTP_400_BAD_REQUEST)
+        # Password hashing runs in a process pool, so this worker mostly waits instead of burning CPU.
+        return Response(provision_users(rows), status=status.HTTP_200_OK)